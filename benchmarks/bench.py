@@ -0,0 +1,281 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""PyFitBark benchmarks.
+
+Measures, against :mod:`pyfitbark.fake_server` serving the test fixtures:
+
+* the latency of one call per endpoint, with and without a response cache
+* the throughput of fleet wide fetches of 10, 100 and 1000 dogs
+* the memory used per activity record as dicts, models, series and in the store
+* the startup time of the CLI
+
+and writes the metrics as JSON so runs can be compared between releases::
+
+    python benchmarks/bench.py -o before.json
+    python benchmarks/bench.py -o after.json --compare before.json
+"""
+import argparse
+import asyncio
+import datetime
+import gc
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+# pylint: disable=unused-import
+from typing import Tuple, List, Optional, Union, Callable, Dict, Any  # NOQA
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, ROOT)
+
+# The fake server serves plain HTTP on localhost.
+os.environ.setdefault("OAUTHLIB_INSECURE_TRANSPORT", "1")
+
+# pylint: disable=wrong-import-position
+from pyfitbark import __version__, codec  # NOQA
+from pyfitbark.api import FitbarkApi  # NOQA
+from pyfitbark.async_api import aiohttp, AsyncFitbarkApi  # NOQA
+from pyfitbark.cache import MemoryCache  # NOQA
+from pyfitbark.fake_server import FakeFitbark, FakeServer  # NOQA
+from pyfitbark.models import ActivityRecord  # NOQA
+from pyfitbark.series import ActivitySeries, numpy  # NOQA
+from pyfitbark.store import ActivityStore  # NOQA
+
+FIXTURES = os.path.join(ROOT, "pyfitbark_tests", "json")
+SLUG = "21d131d5-9616-4e95-bbb2-02c631ef4268"
+TOKEN = {"access_token": "bench", "token_type": "Bearer"}
+
+Metrics = Dict[str, float]
+
+
+def _timings(func: Callable[[], Any], calls: int) -> List[float]:
+    """Return the seconds taken by each of several calls of func."""
+    func()  # warm up connections and caches
+    timings = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def _summary(prefix: str, timings: List[float]) -> Metrics:
+    """Return the median, 95th percentile and mean of timings, in ms."""
+    ordered = sorted(timings)
+    return {
+        f"{prefix}.median_ms": statistics.median(ordered) * 1000,
+        f"{prefix}.p95_ms": ordered[int(0.95 * (len(ordered) - 1))] * 1000,
+        f"{prefix}.mean_ms": statistics.mean(ordered) * 1000,
+    }
+
+
+def bench_latency(base_url: str, calls: int) -> Metrics:
+    """Time single calls of every endpoint."""
+    metrics: Metrics = {}
+    for cached in (False, True):
+        api = FitbarkApi(
+            "bench",
+            "bench",
+            token=TOKEN,
+            base_url=base_url,
+            cache=MemoryCache() if cached else None,
+        )
+        endpoints = {
+            "get_user_profile": api.get_user_profile,
+            "get_user_related_dogs": api.get_user_related_dogs,
+            "get_dog": lambda: api.get_dog(SLUG),
+            "get_dog_picture": lambda: api.get_dog_picture(SLUG),
+            "get_daily_goal": lambda: api.get_daily_goal(SLUG),
+            "get_activity_series": lambda: api.get_activity_series(SLUG),
+            "get_activity_totals": lambda: api.get_activity_totals(SLUG),
+            "get_time_breakdown": lambda: api.get_time_breakdown(SLUG),
+            "get_dog_similar_stats": lambda: api.get_dog_similar_stats(SLUG),
+        }
+        for name, func in endpoints.items():
+            prefix = f"latency.{'cached' if cached else 'uncached'}.{name}"
+            metrics.update(_summary(prefix, _timings(func, calls)))
+        api.close()
+    return metrics
+
+
+def bench_fleet(base_url: str, dogs: List[str], sizes: List[int]) -> Metrics:
+    """Time fetching every dog of fleets of several sizes."""
+    metrics: Metrics = {}
+    with FitbarkApi("bench", "bench", token=TOKEN, base_url=base_url) as api:
+        for size in sizes:
+            slugs = dogs[:size]
+            start = time.perf_counter()
+            results = api.get_dogs(slugs)
+            elapsed = time.perf_counter() - start
+            assert all(result.error is None for result in results)
+            metrics[f"fleet.threads.{size}.seconds"] = elapsed
+            metrics[f"fleet.threads.{size}.dogs_per_s"] = size / elapsed
+
+    if aiohttp is None:
+        return metrics
+
+    async def fetch(api: AsyncFitbarkApi, slugs: List[str]) -> float:
+        start = time.perf_counter()
+        results = await api.get_dogs(slugs)
+        elapsed = time.perf_counter() - start
+        assert all(result.error is None for result in results)
+        return elapsed
+
+    async def run() -> None:
+        async with AsyncFitbarkApi(
+            "bench", "bench", token=TOKEN, base_url=base_url
+        ) as api:
+            for size in sizes:
+                elapsed = await fetch(api, dogs[:size])
+                metrics[f"fleet.async.{size}.seconds"] = elapsed
+                metrics[f"fleet.async.{size}.dogs_per_s"] = size / elapsed
+
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(run())
+    finally:
+        loop.close()
+    return metrics
+
+
+def _allocated(build: Callable[[], Any]) -> int:
+    """Return the bytes still allocated by what build returns."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        kept = build()
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del kept
+    return after - before
+
+
+def bench_memory(count: int) -> Metrics:
+    """Measure the memory used per activity record."""
+    start = datetime.datetime(2019, 1, 1)
+    records = [
+        {
+            "date": (start + datetime.timedelta(hours=i)).strftime("%Y-%m-%d %H:%M:%S"),
+            "activity_value": i * 7 % 5000,
+            "min_play": i % 60,
+            "min_active": i % 45,
+            "min_rest": 60 - i % 60,
+            "daily_target": 1091,
+            "has_trophy": i % 2,
+        }
+        for i in range(count)
+    ]
+    document = codec.dumps(records)
+
+    # Each is built from freshly decoded records, so the strings count too.
+    metrics = {
+        "memory.dict.bytes_per_record": _allocated(lambda: codec.loads(document)),
+        "memory.model.bytes_per_record": _allocated(
+            lambda: [
+                ActivityRecord.from_dict(record) for record in codec.loads(document)
+            ]
+        ),
+        "memory.series.bytes_per_record": _allocated(
+            lambda: ActivitySeries.from_records(codec.loads(document))
+        ),
+    }
+    metrics = {key: value / count for key, value in metrics.items()}
+
+    store = ActivityStore()
+    store.add_records(SLUG, records, "HOURLY")
+    # pylint: disable=protected-access
+    pages = store._conn.execute("PRAGMA page_count").fetchone()[0]
+    page_size = store._conn.execute("PRAGMA page_size").fetchone()[0]
+    store.close()
+    metrics["memory.store.bytes_per_record"] = pages * page_size / count
+    return metrics
+
+
+def bench_startup(runs: int) -> Metrics:
+    """Time starting the CLI and importing the client in new interpreters."""
+    env = dict(
+        os.environ, PYTHONPATH=os.pathsep.join([ROOT, os.environ.get("PYTHONPATH", "")])
+    )
+    commands = {
+        "help": [sys.executable, "-m", "pyfitbark", "--help"],
+        "import_api": [sys.executable, "-c", "import pyfitbark.api"],
+        "python": [sys.executable, "-c", "pass"],
+    }
+    metrics: Metrics = {}
+    for name, command in commands.items():
+        timings = _timings(
+            lambda: subprocess.run(
+                command, env=env, stdout=subprocess.DEVNULL, check=True
+            ),
+            runs,
+        )
+        metrics[f"startup.{name}.median_ms"] = statistics.median(timings) * 1000
+    return metrics
+
+
+def compare(metrics: Metrics, baseline: Metrics) -> None:
+    """Print the change of every metric found in both runs."""
+    for key in sorted(set(metrics).intersection(baseline)):
+        before, after = baseline[key], metrics[key]
+        change = (after - before) / before * 100 if before else 0.0
+        print(f"{key:60} {before:12.3f} {after:12.3f} {change:+8.1f}%")
+
+
+def main(args: List[str]) -> None:
+    """Run the benchmarks."""
+    parser = argparse.ArgumentParser(
+        prog="bench.py", description=__doc__.split("\n")[0]
+    )
+    parser.add_argument("-o", "--output", help="Write the metrics to a JSON file.")
+    parser.add_argument("--compare", help="Compare with the metrics of a JSON file.")
+    parser.add_argument(
+        "--quick", action="store_true", help="Fewer calls and fleets up to 100 dogs."
+    )
+    opts = parser.parse_args(args)
+
+    calls, sizes, runs = (
+        (20, [10, 100], 3) if opts.quick else (200, [10, 100, 1000], 10)
+    )
+    metrics: Metrics = {}
+    fake = FakeFitbark(dogs=max(sizes), fixtures=FIXTURES)
+    with FakeServer(fake) as server:
+        metrics.update(bench_latency(server.base_url, calls))
+        metrics.update(bench_fleet(server.base_url, list(fake.dogs), sizes))
+    metrics.update(bench_memory(10000 if opts.quick else 100000))
+    metrics.update(bench_startup(runs))
+
+    result = {
+        "meta": {
+            "version": __version__,
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "json": codec.backend(),
+            "numpy": numpy is not None,
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "quick": opts.quick,
+        },
+        "metrics": metrics,
+    }
+
+    if opts.compare:
+        with open(opts.compare, "r") as baseline:
+            compare(metrics, codec.loads(baseline.read())["metrics"])
+    else:
+        for key in sorted(metrics):
+            print(f"{key:60} {metrics[key]:12.3f}")
+
+    if opts.output:
+        with open(opts.output, "w") as out:
+            out.write(codec.dumps(result, indent=True) + "\n")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
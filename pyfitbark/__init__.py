@@ -5,8 +5,44 @@ FitBark API Library.
 :copyright: 2012-2017 ORCAS.
 :license: BSD, see LICENSE for more details.
 """
+import sys
 
-from .api import FitbarkApi  # NOQA
+# pylint: disable=unused-import
+from typing import Tuple, List, Optional, Union, Callable, Dict, Any  # NOQA
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .api import FitbarkApi  # NOQA
+    from .models import BulkResult  # NOQA
+    from .async_api import AsyncFitbarkApi  # NOQA
+
+if sys.version_info >= (3, 7):
+    # The clients import requests and aiohttp, which take most of the startup
+    # time of the CLI. Load them on first access instead (PEP 562).
+    import importlib
+
+    _LAZY = {
+        "BulkResult": ".models",
+        "FitbarkApi": ".api",
+        "AsyncFitbarkApi": ".async_api",
+    }
+
+    def __getattr__(name: str) -> Any:
+        """Import the clients on first access."""
+        if name not in _LAZY:
+            raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+        value = getattr(importlib.import_module(_LAZY[name], __name__), name)
+        globals()[name] = value
+        return value
+
+    def __dir__() -> List[str]:
+        """List the lazily imported names with the module attributes."""
+        return sorted(list(globals()) + list(_LAZY))
+
+else:  # pragma: no cover
+    from .api import FitbarkApi  # NOQA
+    from .models import BulkResult  # NOQA
+    from .async_api import AsyncFitbarkApi  # NOQA
 
 # Meta.
 
@@ -9,9 +9,20 @@ from argparse import ArgumentParser, Namespace
 
 # pylint: disable=unused-import
 from typing import Tuple, List, Optional, Union, Callable, Dict, Any  # NOQA
+from typing import IO, TYPE_CHECKING, Iterator, TypeVar, cast
 
 # pylint: disable=relative-beyond-top-level
-from .api import FitbarkApi
+from . import codec
+from .const import RESOLUTIONS
+from .models import BulkResult, DogRelation, Picture, User
+from .pictures import PictureCache
+
+if TYPE_CHECKING:  # pragma: no cover
+    # The client pulls in requests and oauthlib; it is imported on first use so
+    # --help and argument errors return without loading them.
+    from .api import FitbarkApi
+
+T = TypeVar("T")
 
 # Test Accounts
 # email: fake_001@fitbark.com
@@ -21,6 +32,7 @@ from .api import FitbarkApi
 REDIRECT_URI = "urn:ietf:wg:oauth:2.0:oob"
 TOKEN_FILE = "fitbark_auth.json"
 SECRETS_FILE = "secrets.json"
+SOCKET_FILE = "pyfitbark.sock"
 CALLBACK_URL = "http://192.168.1.10:8123"
 # CALLBACK_URL = "http://domain.test.com"
 
@@ -84,29 +96,132 @@ def argparser(args: List[str]) -> Namespace:
         default=False,
         action="store_true",
     )
-    return parser.parse_args(args)
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        help="Number of dogs, or export windows, to fetch concurrently.",
+        type=int,
+        default=1,
+    )
+    parser.add_argument(
+        "--pic-dir",
+        help="Save picture(s) in a directory and print their paths.",
+        default=None,
+    )
+    # Export
+    parser.add_argument(
+        "--export",
+        help="Export the activity of all dogs as newline-delimited JSON.",
+        default=False,
+        action="store_true",
+    )
+    parser.add_argument(
+        "--date-from", help="First day to export, defaults to yesterday.", default=None
+    )
+    parser.add_argument(
+        "--date-to", help="Last day to export, defaults to today.", default=None
+    )
+    parser.add_argument(
+        "--resolution",
+        help="Resolution of the exported activity series.",
+        choices=RESOLUTIONS,
+        default="DAILY",
+    )
+    parser.add_argument(
+        "-o", "--output", help="Export to a file instead of stdout.", default="-"
+    )
+    # Watch
+    parser.add_argument(
+        "--watch",
+        help="Poll all dogs, writing their activity as newline-delimited JSON "
+        "whenever it changes.",
+        default=False,
+        action="store_true",
+    )
+    parser.add_argument(
+        "--budget",
+        help="Most requests per hour sent by --watch.",
+        type=float,
+        default=None,
+    )
+    # Server
+    parser.add_argument(
+        "--serve",
+        help=f"Answer queries on a Unix socket or HOST:PORT (default {SOCKET_FILE}).",
+        nargs="?",
+        const=SOCKET_FILE,
+        default=None,
+        metavar="ADDRESS",
+    )
+    parser.add_argument(
+        "--connect",
+        help=f"Forward queries to a --serve process (default {SOCKET_FILE}).",
+        nargs="?",
+        const=SOCKET_FILE,
+        default=None,
+        metavar="ADDRESS",
+    )
+    opts = parser.parse_args(args)
+    if opts.connect and (
+        opts.get or opts.reset or opts.add or opts.remove or opts.pic_dir or opts.serve
+    ):
+        parser.error("--connect only forwards user, dog and export queries")
+    return opts
+
+
+def _required(value: Optional[T], name: str) -> T:
+    """Return a field of a response, raising ValueError when it is missing."""
+    if value is None:
+        raise ValueError(f"The response has no {name}")
+    return value
+
+
+def _line(kind: str, slug: str, data: Dict[str, Any]) -> str:
+    """Return an export line."""
+    return codec.dumps({"type": kind, "slug": slug, "data": data}) + "\n"
 
 
 class MainClass:
     """Main PyFitbark class."""
 
-    def __init__(self) -> None:
-        """Init."""
-        self.client_id, self.client_secret = self.load_file()
-
-        # mypy ERROR:
-        # error: Argument "token_updater" to "FitbarkApi" has incompatible type
-        # "Callable[[Dict[str, str]], None]"; expected "Optional[Callable[[str], None]]"
-        self.api = FitbarkApi(
-            self.client_id,
-            self.client_secret,
-            REDIRECT_URI,
-            token=self.get_token(),
-            token_updater=self.set_token,  # type: ignore
-            callback_url=CALLBACK_URL,
-        )
+    def __init__(self, auth: bool = True, connect: Optional[str] = None) -> None:
+        """Init.
 
-        self.do_auth()
+        Secrets, token and client are loaded when :attr:`api` is first used.
+
+        :param auth: authorize the user if there is no token yet, not needed by
+            the redirect url commands which use a client credentials token
+        :param connect: address of a server to forward the queries to instead
+        """
+        self.auth = auth
+        self.connect = connect
+        self._api: Optional["FitbarkApi"] = None
+        # Dogs whose requests failed, reported by main once all output is written.
+        self.errors: List[BulkResult] = []
+
+    @property
+    def api(self) -> "FitbarkApi":
+        """Return the client, creating and authorizing it on first use."""
+        if self._api is None and self.connect is not None:
+            from .server import QueryClient  # pylint: disable=import-outside-toplevel
+
+            # The client has the query methods of FitbarkApi used by the commands.
+            self._api = cast("FitbarkApi", QueryClient(self.connect))
+        if self._api is None:
+            from .api import FitbarkApi  # pylint: disable=import-outside-toplevel
+
+            self.client_id, self.client_secret = self.load_file()
+            self._api = FitbarkApi(
+                self.client_id,
+                self.client_secret,
+                REDIRECT_URI,
+                token=self.get_token() if os.path.isfile(TOKEN_FILE) else None,
+                token_updater=self.set_token,
+                callback_url=CALLBACK_URL,
+            )
+            if self.auth:
+                self.do_auth()
+        return self._api
 
     def load_file(self) -> Tuple[str, str]:
         """Load json from secrets file."""
@@ -164,33 +279,45 @@ class MainClass:
             cache.write(json.dumps(token))
 
     # COMMANDS
+    def serve(self, address: str) -> None:
+        """Answer queries on address with a cached client until interrupted."""
+        # pylint: disable=import-outside-toplevel
+        from .cache import MemoryCache
+        from .server import QueryServer
+
+        if self.api.cache is None:
+            self.api.cache = MemoryCache()
+        with QueryServer(self.api, address) as server:
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+
     def r_get(self) -> List[str]:
         """Get redirect urls."""
-        token = self.api.hass_get_token()
-        data = self.api.hass_get_redirect_urls(token)
+        data = self.api.hass_get_redirect_urls()
         return data
 
     def r_reset(self) -> Dict[str, str]:
         """Reset redirect urls."""
-        token = self.api.hass_get_token()
-        data = self.api.hass_add_redirect_urls("urn:ietf:wg:oauth:2.0:oob", token)
+        data = self.api.hass_add_redirect_urls("urn:ietf:wg:oauth:2.0:oob")
         return data
 
     def r_add(self) -> List[str]:
         """Add CALLBACK_URL."""
-        token = self.api.hass_get_token()
-        self.api.hass_add_url()
-        data = self.api.hass_get_redirect_urls(token)
+        data = self.api.hass_add_url()
+        if data is None:
+            data = self.api.hass_get_redirect_urls()
         return data
 
     def r_remove(self) -> List[str]:
         """Remove CALLBACK_URL."""
-        token = self.api.hass_get_token()
-        self.api.hass_remove_url()
-        data = self.api.hass_get_redirect_urls(token)
+        data = self.api.hass_remove_url()
+        if data is None:
+            data = self.api.hass_get_redirect_urls()
         return data
 
-    def u_profile(self) -> Dict[str, str]:
+    def u_profile(self) -> Dict[str, Any]:
         """Get various information about the specified user.
 
         This includes name, username (email address), profile picture and Facebook ID.
@@ -201,17 +328,27 @@ class MainClass:
     def u_slug(self) -> str:
         """Get user slug."""
         profile = self.u_profile()
-        data = profile["user"]["slug"]  # type: ignore
+        data = _required(User.from_response(profile).slug, "slug")
         return data
 
-    def u_pic(self) -> str:
-        """Get the Base64 encoded picture for a specified user."""
+    def u_pic(self, pic_dir: Optional[str] = None) -> str:
+        """Get the Base64 encoded picture for a specified user.
+
+        With ``pic_dir`` the decoded picture is saved there and its path returned.
+        """
+        if pic_dir is not None:
+            user = User.from_response(self.u_profile())
+            self.api.pictures = PictureCache(pic_dir)
+            return self.api.cached_user_picture(
+                _required(user.slug, "slug"), user.picture_hash or None
+            )
+
         user_slug = self.u_slug()
         user_pic = self.api.get_user_picture(user_slug)
-        data = user_pic["image"]["data"]  # type: ignore
+        data = _required(Picture.from_response(user_pic).data, "picture")
         return data
 
-    def u_dogs(self) -> Dict[str, str]:
+    def u_dogs(self) -> Dict[str, Any]:
         """Get user dogs."""
         data = self.api.get_user_related_dogs()
         return data
@@ -221,43 +358,161 @@ class MainClass:
         data = self.u_dogs()
         s_list = []
         # Loops all user dogs
-        for dog in data["dog_relations"]:
-            s_list.append(dog["dog"]["slug"])  # type: ignore
+        for relation in DogRelation.from_response(data):
+            dog = _required(relation.dog, "dog")
+            s_list.append(_required(dog.slug, "slug"))
         return s_list
 
-    def dog(self) -> List[Dict[str, Any]]:
+    def dog(self, jobs: int = 1) -> List[Dict[str, Any]]:
         """Get various information about a certain dog.
 
         This includes name, breed, gender, weight, birthday and picture.
         """
-        s_list = self.u_dog_slug()
-        d_list = []
-        # Loops all user dogs
-        for dog in s_list:
-            d_list.append(self.api.get_dog(dog))
-        return d_list
-
-    def d_pic(self) -> List[str]:
-        """Get the Base64 encoded picture for a specified dog."""
-        s_list = self.u_dog_slug()
-        d_list = []
-        # Loops all user dogs
-        for dog in s_list:
-            print(dog)
-            d = self.api.get_dog_picture(dog)
-            print(f"d: {d}")
-            s = d["image"]["data"]  # type: ignore
-            d_list.append(s)
-        return d_list
+        return self._each_dog(self.api.get_dog, self.u_dog_slug(), jobs)
+
+    def d_pic(self, pic_dir: Optional[str] = None, jobs: int = 1) -> List[str]:
+        """Get the Base64 encoded picture for a specified dog.
+
+        With ``pic_dir`` the decoded pictures are saved there and their paths
+        returned.
+        """
+        if pic_dir is not None:
+            self.api.pictures = PictureCache(pic_dir)
+            hashes = {}
+            for relation in DogRelation.from_response(self.u_dogs()):
+                dog = _required(relation.dog, "dog")
+                hashes[_required(dog.slug, "slug")] = dog.picture_hash or None
+            return self._each_dog(
+                lambda slug: self.api.cached_dog_picture(slug, hashes[slug]),
+                list(hashes),
+                jobs,
+            )
+
+        pictures = self._each_dog(self.api.get_dog_picture, self.u_dog_slug(), jobs)
+        return [
+            _required(Picture.from_response(picture).data, "picture")
+            for picture in pictures
+        ]
+
+    def _each_dog(
+        self, func: Callable[[str], Any], slugs: List[str], jobs: int
+    ) -> List[Any]:
+        """Call func for every dog on ``jobs`` threads, recording failures.
+
+        :return: the results of the dogs which succeeded, in the order given
+        """
+        results = self.api.map_slugs(func, slugs, jobs)
+        self.errors.extend(result for result in results if result.error is not None)
+        return [result.data for result in results if result.error is None]
+
+    def export(
+        self,
+        out: IO[str],
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+        resolution: str = "DAILY",
+        jobs: int = 1,
+    ) -> int:
+        """Write the activity of all dogs as newline-delimited JSON.
+
+        Each line holds the ``type`` of the data, the dog ``slug`` and the ``data``:
+        one line per activity_series record, then the activity_totals and the
+        time_breakdown of the range. Lines are written as the records arrive, so
+        memory use does not grow with the range and a dog failing midway leaves its
+        first lines; ``jobs`` windows of a dog's range are fetched concurrently.
+
+        :return: number of lines written
+        """
+
+        def lines(slug: str) -> Iterator[str]:
+            for record in self.api.iter_activity_records(
+                slug, date_from, date_to, resolution, max_workers=jobs
+            ):
+                yield _line("activity_series", slug, record)
+            yield _line(
+                "activity_totals",
+                slug,
+                self.api.get_activity_totals(slug, date_from, date_to),
+            )
+            yield _line(
+                "time_breakdown",
+                slug,
+                self.api.get_time_breakdown(slug, date_from, date_to),
+            )
+
+        written = 0
+        for slug in self.u_dog_slug():
+            try:
+                for text in lines(slug):
+                    out.write(text)
+                    written += 1
+            except Exception as err:  # pylint: disable=broad-except
+                self.errors.append(BulkResult(slug, None, err))
+            out.flush()
+        return written
+
+    def watch(
+        self,
+        out: IO[str],
+        resolution: str = "HOURLY",
+        budget: Optional[float] = None,
+        polls: Optional[int] = None,
+        **options: Any,
+    ) -> int:
+        """Poll all dogs, writing their activity whenever it changes.
+
+        The lines are those of :meth:`export` for yesterday and today, with only
+        the activity records which are new or changed since the previous polls.
+        Failed polls are logged and retried later.
+
+        :param polls: stop after this many polls, run until interrupted by default
+        :param options: passed to :class:`pyfitbark.watch.Watcher`
+        :return: number of lines written
+        """
+        from .watch import Watcher  # pylint: disable=import-outside-toplevel
+
+        watcher = Watcher(
+            self.api,
+            self.u_dog_slug(),
+            budget=budget,
+            resolution=resolution,
+            **options,
+        )
+        written = 0
+        try:
+            for count, poll in enumerate(watcher, 1):
+                if poll.error is not None:
+                    _LOGGER.warning("Polling %s failed: %s", poll.slug, poll.error)
+                elif poll.changed and poll.data is not None:
+                    lines = [
+                        _line("activity_series", poll.slug, record)
+                        for record in poll.records
+                    ]
+                    lines.append(
+                        _line("time_breakdown", poll.slug, poll.data["time_breakdown"])
+                    )
+                    out.writelines(lines)
+                    out.flush()
+                    written += len(lines)
+                if polls is not None and count >= polls:
+                    break
+        except KeyboardInterrupt:
+            pass
+        return written
 
 
 def main(opts: List[str]) -> None:
     """Main."""
     args = argparser(opts)
 
-    api = MainClass()
+    api = MainClass(
+        auth=not (args.get or args.reset or args.add or args.remove),
+        connect=args.connect,
+    )
     r: Any = None
-    if args.get:
+    if args.serve:
+        api.serve(args.serve)
+    elif args.get:
         r = api.r_get()
     elif args.reset:
         r = api.r_reset()
@@ -271,16 +526,32 @@ def main(opts: List[str]) -> None:
     elif args.user_slug:
         r = api.u_slug()
     elif args.user_pic:
-        r = api.u_pic()
+        r = api.u_pic(args.pic_dir)
 
     elif args.dogs:
         r = api.u_dogs()
     elif args.dog_slug:
         r = api.u_dog_slug()
     elif args.dog:
-        r = api.dog()
+        r = api.dog(args.jobs)
     elif args.dog_pic:
-        r = api.d_pic()
+        r = api.d_pic(args.pic_dir, args.jobs)
+
+    elif args.watch:
+        if args.output == "-":
+            api.watch(sys.stdout, args.resolution, args.budget)
+        else:
+            with open(args.output, "a") as out:
+                api.watch(out, args.resolution, args.budget)
+
+    elif args.export:
+        export_args = (args.date_from, args.date_to, args.resolution, args.jobs)
+        if args.output == "-":
+            lines = api.export(sys.stdout, *export_args)
+        else:
+            with open(args.output, "w") as out:
+                lines = api.export(out, *export_args)
+        _LOGGER.debug("Exported %s lines", lines)
 
     # Get a list of users currently associated with a specified dog,
     # together with the type of relationship (Owner or Friend) and privacy
@@ -315,9 +586,15 @@ def main(opts: List[str]) -> None:
     # _LOGGER.debug("\nDog %s Time Breakdown: \n%s\n", x, response)
 
     if r:
-        r = json.dumps(r, indent=2, separators=(",", ": "))
+        r = codec.dumps(r, indent=True)
         print(r)
 
+    if api.errors:
+        for result in api.errors:
+            _LOGGER.error("Dog %s failed: %s", result.slug, result.error)
+        _LOGGER.error("%s dog(s) failed", len(api.errors))
+        sys.exit(1)
+
 
 if __name__ == "__main__":
     main(sys.argv[1:])
@@ -6,38 +6,156 @@ Code pieces borrowed from python-fitbark and pymfy.
 Source: https://github.com/alexhouse/python-fitbark
         https://github.com/tetienne/somfy-open-api
 """
+import collections
 import datetime
+import io
+import itertools
 
 # from dateutil.parser import parse
 import logging
 import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin, urlsplit
 
 import requests
 
 # pylint: disable=unused-import
 from typing import Tuple, List, Optional, Union, Callable, Dict, Any  # NOQA
+from typing import TYPE_CHECKING, Iterable, Iterator
 
 from requests import Response
+from requests.adapters import HTTPAdapter
 from requests_oauthlib import OAuth2Session
 from oauthlib.oauth2 import TokenExpiredError
 
+from . import codec
+from .cache import CachedResponse, CachePolicy, MemoryCache, SQLiteCache, cache_key
+from .const import (  # NOQA
+    API_VERSION,
+    BASE_URL,
+    FITBARK_OAUTH,
+    FITBARK_REFRESH,
+    FITBARK_TOKEN,
+    HASS_CALLBACK_PATH,
+    HASS_SCOPE,
+    HASS_TOKEN_MARGIN,
+    MAX_SERIES_DAYS,
+    PERIODS,
+    RESOLUTIONS,
+    WEEK_DAYS,
+    _endpoint_template,
+)
+from .metrics import RequestEvent
+from .models import BulkResult  # NOQA
+from .pictures import PictureCache, decode_picture, write_picture
+from .retry import RetryPolicy
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .store import ActivityStore  # NOQA
+
 _LOGGER = logging.getLogger(__name__)
 
-API_VERSION = "2"
-BASE_URL = f"https://app.fitbark.com/api/v{API_VERSION}"
-FITBARK_OAUTH = "https://app.fitbark.com/oauth/authorize"
-FITBARK_TOKEN = "https://app.fitbark.com/oauth/token"
-FITBARK_REFRESH = "https://app.fitbark.com/oauth/token"
-WEEK_DAYS = [
-    "SUNDAY",
-    "MONDAY",
-    "TUESDAY",
-    "WEDNESDAY",
-    "THURSDAY",
-    "FRIDAY",
-    "SATURDAY",
-]
-PERIODS = ["1d", "7d", "30d", "1w", "1m", "3m", "6m", "1y", "max"]
+# Bytes read at a time when streaming a picture.
+PICTURE_CHUNK_SIZE = 64 * 1024
+
+
+def _date_string(date: Optional[str]) -> Optional[str]:
+    # if date is not None:
+    #     date = parse(date)
+    if not isinstance(date, str) and date is not None:
+        return date.strftime("%Y-%m-%d")
+    return date
+
+
+def _date_range(date_from: Optional[str], date_to: Optional[str]) -> Tuple[str, str]:
+    """Normalize a date range, defaulting to yesterday through today."""
+    today = datetime.date.today()
+    date_from = _date_string(date_from)
+    date_to = _date_string(date_to)
+
+    if date_from is None:
+        date_from = (today - datetime.timedelta(days=1)).strftime("%Y-%m-%d")
+
+    if date_to is None:
+        date_to = today.strftime("%Y-%m-%d")
+
+    if date_to < date_from:
+        raise ValueError("The to date must be after the from date")
+
+    return date_from, date_to
+
+
+def _parse_date(date: str) -> Optional[datetime.date]:
+    """Return the date of a YYYY-MM-DD string, None for any other format."""
+    try:
+        return datetime.datetime.strptime(date, "%Y-%m-%d").date()
+    except ValueError:
+        return None
+
+
+def _date_windows(
+    date_from: str, date_to: str, resolution: str
+) -> List[Tuple[str, str]]:
+    """Split a date range into consecutive windows the API accepts.
+
+    A range not given as YYYY-MM-DD dates is passed to the API unsplit.
+    """
+    start = _parse_date(date_from)
+    end = _parse_date(date_to)
+    if start is None or end is None:
+        return [(date_from, date_to)]
+    step = datetime.timedelta(days=MAX_SERIES_DAYS[resolution] - 1)
+
+    windows = []
+    while start <= end:
+        stop = min(start + step, end)
+        windows.append((start.strftime("%Y-%m-%d"), stop.strftime("%Y-%m-%d")))
+        start = stop + datetime.timedelta(days=1)
+    return windows
+
+
+def _merge_series(slug: str, responses: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Merge activity_series responses, de-duplicating records by date."""
+    records: Dict[str, Dict[str, Any]] = {}
+    for response in responses:
+        for record in response["activity_series"]["records"]:
+            records[record["date"]] = record
+
+    return {
+        "activity_series": {
+            "slug": slug,
+            "records": [records[date] for date in sorted(records)],
+        }
+    }
+
+
+def _update_redirect_urls(
+    current: List[str], add: Iterable[str], remove: Iterable[str]
+) -> Optional[List[str]]:
+    """Return the redirect URLs after adding and removing some, None if unchanged.
+
+    The order of the current URLs is kept and new ones are appended. Duplicate and
+    empty entries are dropped, but alone they are no reason to write the list.
+    """
+    add = list(add)
+    remove = set(remove)
+    if remove.intersection(add):
+        raise ValueError("A redirect url can not be both added and removed")
+
+    normalized = list(dict.fromkeys(url for url in current if url))
+    urls = dict.fromkeys(url for url in normalized if url not in remove)
+    urls.update(dict.fromkeys(url for url in add if url))
+    updated = list(urls)
+    return None if updated == normalized else updated
+
+
+def _resolution(resolution: Optional[str]) -> str:
+    """Return a resolution the API understands, falling back to DAILY."""
+    if resolution is None or resolution not in RESOLUTIONS:
+        return "DAILY"
+    return resolution
 
 
 class FitbarkApi:
@@ -49,14 +167,68 @@ class FitbarkApi:
         client_secret: str,
         redirect_uri: Optional[str] = None,
         token: Optional[Dict[str, str]] = None,
-        token_updater: Optional[Callable[[str], None]] = None,
+        token_updater: Optional[Callable[[Dict[str, Any]], None]] = None,
         callback_url: Optional[str] = None,
+        *,
+        max_workers: int = 8,
+        cache: Optional[Union[MemoryCache, SQLiteCache]] = None,
+        cache_policy: Optional[CachePolicy] = None,
+        store: Optional["ActivityStore"] = None,
+        store_max_age: float = 300,
+        refresh_margin: Optional[float] = None,
+        retry: Optional[RetryPolicy] = None,
+        pictures: Optional[PictureCache] = None,
+        base_url: str = BASE_URL,
+        before_request: Optional[Callable[[RequestEvent], None]] = None,
+        after_request: Optional[Callable[[RequestEvent], None]] = None,
     ):
-        """Init."""
+        """Init.
+
+        :param max_workers: maximum number of requests made concurrently when a
+            call fans out, e.g. a long activity series
+        :param cache: optional response cache, see :mod:`pyfitbark.cache`
+        :param cache_policy: how long each endpoint may be cached, defaults to
+            :class:`pyfitbark.cache.CachePolicy`
+        :param store: optional :class:`pyfitbark.store.ActivityStore`, activity
+            series fetched from the API are written to it and activity totals and
+            time breakdowns are computed from it when it covers the requested range
+        :param store_max_age: seconds stored records of days which may still change
+            are considered current
+        :param refresh_margin: refresh the token this many seconds before it
+            expires, instead of waiting for a request to fail
+        :param retry: retry 429, 5xx and connection errors, see
+            :class:`pyfitbark.retry.RetryPolicy`
+        :param pictures: optional :class:`pyfitbark.pictures.PictureCache` used by
+            ``cached_dog_picture`` and ``cached_user_picture``
+        :param base_url: root of the FitBark API, the OAuth endpoints are found
+            at ``/oauth`` of its host
+        :param before_request: called with a :class:`pyfitbark.metrics.RequestEvent`
+            before each request
+        :param after_request: called with the completed
+            :class:`pyfitbark.metrics.RequestEvent` after each request, e.g.
+            ``pyfitbark.metrics.Metrics.observe``
+        """
         self.client_id = client_id
         self.client_secret = client_secret
         self.token_updater = token_updater
         self._callback_url = callback_url
+        self._base_url = base_url
+        self._token_url = urljoin(base_url, "/oauth/token")
+        self._authorize_url = urljoin(base_url, "/oauth/authorize")
+        self.max_workers = max_workers
+        self.cache = cache
+        self.cache_policy = cache_policy or CachePolicy()
+        self.store = store
+        self.store_max_age = store_max_age
+        self.refresh_margin = refresh_margin
+        self._refresh_lock = threading.Lock()
+        self.retry = retry
+        self.pictures = pictures
+        self.before_request = before_request
+        self.after_request = after_request
+        # Client credentials tokens by (client_id, scope): (token, expires_at).
+        self._hass_tokens: Dict[Tuple[str, str], Tuple[str, float]] = {}
+        self._hass_token_lock = threading.Lock()
 
         extra = {"client_id": self.client_id, "client_secret": self.client_secret}
 
@@ -67,8 +239,24 @@ class FitbarkApi:
             auto_refresh_kwargs=extra,
             token_updater=token_updater,
         )
+        # Size the connection pool so concurrent calls reuse connections.
+        adapter = HTTPAdapter(pool_maxsize=max(max_workers, 10))
+        self._oauth.mount("https://", adapter)
+        self._oauth.mount("http://", adapter)
+
+    def close(self) -> None:
+        """Close the pooled connections of the session."""
+        self._oauth.close()
+
+    def __enter__(self) -> "FitbarkApi":
+        """Enter the context manager."""
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        """Exit the context manager."""
+        self.close()
 
-    def get_user_profile(self) -> Dict[str, str]:
+    def get_user_profile(self) -> Dict[str, Any]:
         """Get various information about the specified user.
 
         This including name, username (email address), profile picture and Facebook ID.
@@ -78,9 +266,9 @@ class FitbarkApi:
         """
         r = self.get("/user")
         r.raise_for_status()
-        return r.json()
+        return codec.loads(r.content)
 
-    def get_user_picture(self, slug: str) -> Dict[str, str]:
+    def get_user_picture(self, slug: str) -> Dict[str, Any]:
         """
         Get the Base64 encoded picture for a specified user.
 
@@ -91,9 +279,9 @@ class FitbarkApi:
         """
         r = self.get("/picture/user/" + slug)
         r.raise_for_status()
-        return r.json()
+        return codec.loads(r.content)
 
-    def get_user_related_dogs(self) -> Dict[str, str]:
+    def get_user_related_dogs(self) -> Dict[str, Any]:
         """
         Get the dogs related to the logged in user.
 
@@ -102,9 +290,9 @@ class FitbarkApi:
         """
         r = self.get("/dog_relations")
         r.raise_for_status()
-        return r.json()
+        return codec.loads(r.content)
 
-    def get_dog(self, slug: str) -> Dict[str, str]:
+    def get_dog(self, slug: str) -> Dict[str, Any]:
         """
         Get various information about a certain dog.
 
@@ -117,9 +305,9 @@ class FitbarkApi:
         """
         r = self.get("/dog/" + slug)
         r.raise_for_status()
-        return r.json()
+        return codec.loads(r.content)
 
-    def get_dog_picture(self, slug: str) -> Dict[str, str]:
+    def get_dog_picture(self, slug: str) -> Dict[str, Any]:
         """Get the Base64 encoded picture for a specified dog.
 
         :param slug: uuid of the dog to return
@@ -129,9 +317,9 @@ class FitbarkApi:
         """
         r = self.get("/picture/dog/" + slug)
         r.raise_for_status()
-        return r.json()
+        return codec.loads(r.content)
 
-    def get_dog_related_users(self, slug: str) -> Dict[str, str]:
+    def get_dog_related_users(self, slug: str) -> Dict[str, Any]:
         """Get a list of users currently associated with a specified dog.
 
         Additionally gets the type of relationship (Owner or Friend) and privacy
@@ -144,9 +332,9 @@ class FitbarkApi:
         """
         r = self.get("/user_relations/" + slug)
         r.raise_for_status()
-        return r.json()
+        return codec.loads(r.content)
 
-    def get_daily_goal(self, slug: str) -> Dict[str, str]:
+    def get_daily_goal(self, slug: str) -> Dict[str, Any]:
         """Get a dog’s current daily goal and future daily goals.
 
         Set by an authorized user (if any).
@@ -158,9 +346,9 @@ class FitbarkApi:
         """
         r = self.get("/daily_goal/" + slug)
         r.raise_for_status()
-        return r.json()
+        return codec.loads(r.content)
 
-    def set_daily_goal(self, slug: str, data: Dict[str, Any]) -> Dict[str, str]:
+    def set_daily_goal(self, slug: str, data: Dict[str, Any]) -> Dict[str, Any]:
         """Set the daily goal for a specified dog.
 
         Also get a response with future daily goals (if any). By default, a future
@@ -177,7 +365,168 @@ class FitbarkApi:
         """
         r = self.put("/daily_goal/" + slug, json=data)
         r.raise_for_status()
-        return r.json()
+        return codec.loads(r.content)
+
+    def get_dog_picture_bytes(self, slug: str) -> bytes:
+        """Get the decoded picture of a dog.
+
+        The picture is decoded while it downloads instead of holding the base64
+        text in memory.
+
+        :param slug: uuid of the dog
+        :type slug: uuid
+        :return: the image
+        :rtype: bytes
+        """
+        return self._picture_bytes("/picture/dog/" + slug)
+
+    def get_user_picture_bytes(self, slug: str) -> bytes:
+        """Get the decoded picture of a user.
+
+        :param slug: uuid of the user
+        :type slug: uuid
+        :return: the image
+        :rtype: bytes
+        """
+        return self._picture_bytes("/picture/user/" + slug)
+
+    def save_dog_picture(self, slug: str, path: str) -> str:
+        """Download the picture of a dog to a file, replacing it atomically.
+
+        :param slug: uuid of the dog
+        :type slug: uuid
+        :param path: file to write the image to
+        :type path: str
+        :return: sha256 hex digest of the image
+        :rtype: str
+        """
+        with self._stream_picture("/picture/dog/" + slug) as r:
+            return write_picture(r.iter_content(PICTURE_CHUNK_SIZE), path)
+
+    def save_user_picture(self, slug: str, path: str) -> str:
+        """Download the picture of a user to a file, replacing it atomically.
+
+        :param slug: uuid of the user
+        :type slug: uuid
+        :param path: file to write the image to
+        :type path: str
+        :return: sha256 hex digest of the image
+        :rtype: str
+        """
+        with self._stream_picture("/picture/user/" + slug) as r:
+            return write_picture(r.iter_content(PICTURE_CHUNK_SIZE), path)
+
+    def cached_dog_picture(self, slug: str, picture_hash: Optional[str] = None) -> str:
+        """Return the path of a dog's picture in the picture cache.
+
+        The picture is only downloaded when the cache does not hold it yet. Without
+        a ``picture_hash``, as found in ``get_dog``, the picture is downloaded and
+        stored under the sha256 of the image.
+
+        :param slug: uuid of the dog
+        :type slug: uuid
+        :param picture_hash: the dog's picture_hash
+        :type picture_hash: str
+        :return: path of the image
+        :rtype: str
+        """
+        return self._cached_picture("/picture/dog/", slug, picture_hash)
+
+    def cached_user_picture(self, slug: str, picture_hash: Optional[str] = None) -> str:
+        """Return the path of a user's picture in the picture cache.
+
+        :param slug: uuid of the user
+        :type slug: uuid
+        :param picture_hash: the user's picture_hash, see ``cached_dog_picture``
+        :type picture_hash: str
+        :return: path of the image
+        :rtype: str
+        """
+        return self._cached_picture("/picture/user/", slug, picture_hash)
+
+    def _stream_picture(self, path: str) -> Response:
+        """Request a picture without reading the body."""
+        r = self._request("get", path, stream=True)
+        r.raise_for_status()
+        return r
+
+    def _picture_bytes(self, path: str) -> bytes:
+        """Download and decode a picture into memory."""
+        out = io.BytesIO()
+        with self._stream_picture(path) as r:
+            decode_picture(r.iter_content(PICTURE_CHUNK_SIZE), out)
+        return out.getvalue()
+
+    def _cached_picture(
+        self, prefix: str, slug: str, picture_hash: Optional[str]
+    ) -> str:
+        """Return the path of a picture, downloading it into the cache if needed."""
+        if self.pictures is None:
+            raise ValueError("No picture cache configured")
+
+        path = self.pictures.get(slug, picture_hash)
+        if path is not None:
+            return path
+
+        with self._stream_picture(prefix + slug) as r:
+            return self.pictures.add(
+                slug, r.iter_content(PICTURE_CHUNK_SIZE), picture_hash
+            )
+
+    def get_dogs(
+        self, slugs: Iterable[str], max_workers: Optional[int] = None
+    ) -> List[BulkResult]:
+        """Get information about several dogs concurrently.
+
+        :param slugs: uuids of the dogs to look up
+        :type slugs: list
+        :param max_workers: number of concurrent requests, defaults to the client's
+        :type max_workers: int
+        :return: one result per slug, in the order given
+        :rtype: list
+        """
+        return self.map_slugs(self.get_dog, slugs, max_workers)
+
+    def get_dog_pictures(
+        self, slugs: Iterable[str], max_workers: Optional[int] = None
+    ) -> List[BulkResult]:
+        """Get the Base64 encoded pictures of several dogs concurrently.
+
+        :param slugs: uuids of the dogs to look up
+        :type slugs: list
+        :param max_workers: number of concurrent requests, defaults to the client's
+        :type max_workers: int
+        :return: one result per slug, in the order given
+        :rtype: list
+        """
+        return self.map_slugs(self.get_dog_picture, slugs, max_workers)
+
+    def map_slugs(
+        self,
+        func: Callable[[str], Any],
+        slugs: Iterable[str],
+        max_workers: Optional[int] = None,
+    ) -> List[BulkResult]:
+        """Call func for every slug concurrently, collecting failures.
+
+        :param func: called with each slug, e.g. ``api.get_dog``
+        :type func: callable
+        :param slugs: uuids to call func with
+        :type slugs: list
+        :param max_workers: number of concurrent calls, defaults to the client's
+        :type max_workers: int
+        :return: one result per slug, in the order given
+        :rtype: list
+        """
+
+        def call(slug: str) -> BulkResult:
+            try:
+                return BulkResult(slug, func(slug), None)
+            except Exception as err:  # pylint: disable=broad-except
+                _LOGGER.debug("Request for %s failed: %s", slug, err)
+                return BulkResult(slug, None, err)
+
+        return self._map(call, list(slugs), max_workers)
 
     # def _build_api_url(self, endpoint):
     #     return "{0}/v{1}/{endpoint}".format(
@@ -187,11 +536,7 @@ class FitbarkApi:
     #     return self.API_ENDPOINT, self.API_VERSION
 
     def _get_date_string(self, date: Optional[str]) -> Optional[str]:
-        # if date is not None:
-        #     date = parse(date)
-        if not isinstance(date, str) and date is not None:
-            return date.strftime("%Y-%m-%d")
-        return date
+        return _date_string(date)
 
     def get_activity_series(
         self,
@@ -199,11 +544,12 @@ class FitbarkApi:
         date_from: Optional[str] = None,
         date_to: Optional[str] = None,
         resolution: Optional[str] = "DAILY",
-    ) -> Dict[str, str]:
+    ) -> Dict[str, Any]:
         """Get historical series data between two specified date times.
 
-        The maximum range is 42 days with daily resolution, and 7 days with hourly
-        resolution.
+        The API accepts at most 42 days with daily resolution, and 7 days with
+        hourly resolution. Longer ranges are split into windows which are fetched
+        concurrently, then merged into a single date ordered list of records.
 
         :param slug: uuid of the dog to look up
         :type slug: uuid
@@ -216,22 +562,105 @@ class FitbarkApi:
         :return: list of records breaking activity down
         :rtype: json
         """
-        today = datetime.date.today()
-        date_from = self._get_date_string(date_from)
-        date_to = self._get_date_string(date_to)
-
-        if date_from is None:
-            date_from = (today - datetime.timedelta(days=1)).strftime("%Y-%m-%d")
+        date_from, date_to = _date_range(date_from, date_to)
+        resolution = _resolution(resolution)
+        windows = _date_windows(date_from, date_to, resolution)
+
+        if len(windows) == 1:
+            data = self._get_activity_window(slug, date_from, date_to, resolution)
+        else:
+            responses = self._map(
+                lambda window: self._get_activity_window(
+                    slug, window[0], window[1], resolution
+                ),
+                windows,
+            )
+            data = _merge_series(slug, responses)
+        return data
+
+    def iter_activity_records(
+        self,
+        slug: str,
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+        resolution: Optional[str] = "DAILY",
+        max_workers: int = 1,
+    ) -> Iterator[Dict[str, Any]]:
+        """Yield the activity records of a date range in date order.
 
-        if date_to is None:
-            date_to = today.strftime("%Y-%m-%d")
+        Unlike ``get_activity_series`` the records of each window are yielded as
+        they arrive, so memory use does not grow with the length of the range. With
+        ``max_workers`` above 1 that many windows are fetched ahead concurrently.
 
-        if resolution not in ["DAILY", "HOURLY"]:
-            resolution = "DAILY"
+        :param slug: uuid of the dog to look up
+        :type slug: uuid
+        :param date_from: the start of the date range to look up
+        :type date_from: datetime, date, str
+        :param date_to: the end of the date range to look up
+        :type date_to: datetime, date, str
+        :param resolution: DAILY or HOURLY breakdown
+        :type resolution: str
+        :param max_workers: number of windows fetched concurrently
+        :type max_workers: int
+        :return: generator of records
+        :rtype: iterator
+        """
+        date_from, date_to = _date_range(date_from, date_to)
+        resolution = _resolution(resolution)
+        windows = _date_windows(date_from, date_to, resolution)
+
+        last = ""
+        for data in self._iter_windows(slug, windows, resolution, max_workers):
+            records = data["activity_series"]["records"]
+            for record in sorted(records, key=lambda record: record["date"]):
+                if record["date"] > last:
+                    last = record["date"]
+                    yield record
+
+    def _iter_windows(
+        self,
+        slug: str,
+        windows: List[Tuple[str, str]],
+        resolution: str,
+        max_workers: int,
+    ) -> Iterator[Dict[str, Any]]:
+        """Yield the activity_series responses of windows in order.
 
-        if date_to < date_from:
-            raise ValueError("The to date must be after the from date")
+        At most ``max_workers`` responses are fetched ahead of the one yielded.
+        """
 
+        def fetch(window: Tuple[str, str]) -> Dict[str, Any]:
+            return self._get_activity_window(slug, window[0], window[1], resolution)
+
+        if max_workers <= 1 or len(windows) == 1:
+            for window in windows:
+                yield fetch(window)
+            return
+
+        remaining = iter(windows)
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(windows))) as pool:
+            pending = collections.deque(
+                pool.submit(fetch, window)
+                for window in itertools.islice(remaining, max_workers)
+            )
+            try:
+                while pending:
+                    data = pending.popleft().result()
+                    for window in itertools.islice(remaining, 1):
+                        pending.append(pool.submit(fetch, window))
+                    yield data
+            finally:
+                for future in pending:
+                    future.cancel()
+
+    def _get_activity_window(
+        self, slug: str, date_from: str, date_to: str, resolution: str
+    ) -> Dict[str, Any]:
+        """Post a single activity_series request, writing it through to the store.
+
+        Responses served from the cache may predate the day settling, so they are
+        not written: the store would stamp them as fetched now.
+        """
         data = {
             "activity_series": {
                 "slug": slug,
@@ -243,9 +672,39 @@ class FitbarkApi:
 
         r = self.post("/activity_series", json=data)
         r.raise_for_status()
-        return r.json()
+        series = codec.loads(r.content)
+        if self.store is not None and not getattr(r, "from_cache", False):
+            self.store.add_records(
+                slug, series["activity_series"]["records"], resolution
+            )
+        return series
+
+    def _stored_records(
+        self, slug: str, date_from: str, date_to: str
+    ) -> Optional[List[Dict[str, Any]]]:
+        """Return the stored daily records of a range, or None if not covered."""
+        if self.store is None or None in (_parse_date(date_from), _parse_date(date_to)):
+            return None
+        return self.store.covered(
+            slug,
+            date_from,
+            date_to,
+            self.store_max_age,
+            self.cache_policy.settle_days,
+        )
 
-    def get_dog_similar_stats(self, slug: str) -> Dict[str, str]:
+    def _map(
+        self,
+        func: Callable[[Any], Any],
+        items: List[Any],
+        max_workers: Optional[int] = None,
+    ) -> List[Any]:
+        """Call func for every item on a bounded thread pool, keeping order."""
+        workers = max(1, min(max_workers or self.max_workers, len(items)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(func, items))
+
+    def get_dog_similar_stats(self, slug: str) -> Dict[str, Any]:
         """Get this dogs, and similar dogs, statistics.
 
         :param slug: uuid of the dog to look up
@@ -255,14 +714,15 @@ class FitbarkApi:
         """
         r = self.post("/similar_dogs_stats", json={"slug": slug})
         r.raise_for_status()
-        return r.json()
+        return codec.loads(r.content)
 
     def get_activity_totals(
         self, slug: str, date_from: Optional[str] = None, date_to: Optional[str] = None
-    ) -> Dict[str, str]:
+    ) -> Dict[str, Any]:
         """Get historical activity data by totaling the historical series.
 
-        Between two specified date times.
+        Between two specified date times. With a store which covers the range, the
+        total is computed locally instead.
 
         :param slug: uuid of the dog to look up
         :type slug: uuid
@@ -273,31 +733,25 @@ class FitbarkApi:
         :return: list of records breaking activity down
         :rtype: json
         """
-        today = datetime.date.today()
-        date_from = self._get_date_string(date_from)
-        date_to = self._get_date_string(date_to)
+        date_from, date_to = _date_range(date_from, date_to)
 
-        if date_from is None:
-            date_from = (today - datetime.timedelta(days=1)).strftime("%Y-%m-%d")
-
-        if date_to is None:
-            date_to = today.strftime("%Y-%m-%d")
-
-        if date_to < date_from:
-            raise ValueError("The to date must be after the from date")
+        records = self._stored_records(slug, date_from, date_to)
+        if records is not None:
+            return {"activity_value": sum(r["activity_value"] for r in records)}
 
         data = {"dog": {"slug": slug, "from": date_from, "to": date_to}}
 
         r = self.post("/activity_totals", json=data)
         r.raise_for_status()
-        return r.json()
+        return codec.loads(r.content)
 
     def get_time_breakdown(
         self, slug: str, date_from: Optional[str] = None, date_to: Optional[str] = None
-    ) -> Dict[str, str]:
+    ) -> Dict[str, Any]:
         """Get the time (in minutes) spent at each activity level.
 
-        For a certain dog between two specified date times.
+        For a certain dog between two specified date times. With a store which covers
+        the range, the breakdown is computed locally instead.
 
         :param slug: uuid of the dog to look up
         :type slug: uuid
@@ -309,24 +763,19 @@ class FitbarkApi:
             period & dog
         :rtype: json
         """
-        today = datetime.date.today()
-        date_from = self._get_date_string(date_from)
-        date_to = self._get_date_string(date_to)
-
-        if date_from is None:
-            date_from = (today - datetime.timedelta(days=1)).strftime("%Y-%m-%d")
-
-        if date_to is None:
-            date_to = today.strftime("%Y-%m-%d")
+        date_from, date_to = _date_range(date_from, date_to)
 
-        if date_to < date_from:
-            raise ValueError("The to date must be after the from date")
+        records = self._stored_records(slug, date_from, date_to)
+        if records is not None:
+            levels = ("min_play", "min_active", "min_rest")
+            totals = {level: sum(r[level] for r in records) for level in levels}
+            return {"activity_level": totals}
 
         data = {"dog": {"slug": slug, "from": date_from, "to": date_to}}
 
         r = self.post("/time_breakdown", json=data)
         r.raise_for_status()
-        return r.json()
+        return codec.loads(r.content)
 
     def get(self, path: str) -> Response:
         """Fetch a URL from the Fitbark API."""
@@ -342,11 +791,11 @@ class FitbarkApi:
 
     def get_authorization_url(self, state: Optional[str] = None) -> Tuple[str, str]:
         """Get the authorization url."""
-        return self._oauth.authorization_url(FITBARK_OAUTH, state)
+        return self._oauth.authorization_url(self._authorize_url, state)
 
     def request_token(
         self, authorization_response: Optional[str] = None, code: Optional[str] = None
-    ) -> Dict[str, str]:
+    ) -> Dict[str, Any]:
         """Fetch a Fitbark access token.
 
         :param authorization_response: Authorization response URL, the callback
@@ -355,7 +804,7 @@ class FitbarkApi:
         :return: A token dict
         """
         return self._oauth.fetch_token(
-            FITBARK_TOKEN,
+            self._token_url,
             authorization_response=authorization_response,
             code=code,
             client_secret=self.client_secret,
@@ -363,7 +812,7 @@ class FitbarkApi:
 
     def refresh_tokens(self) -> Dict[str, Union[str, int]]:
         """Refresh and return new Fitbark tokens."""
-        token = self._oauth.refresh_token(FITBARK_REFRESH)
+        token = self._oauth.refresh_token(self._token_url)
 
         if self.token_updater is not None:
             self.token_updater(token)
@@ -371,91 +820,326 @@ class FitbarkApi:
         return token
 
     def _request(self, method: str, path: str, **kwargs: Any) -> Response:
-        """Make a request.
+        """Make a request, reporting it to the request hooks."""
+        event = None
+        if self.before_request is not None or self.after_request is not None:
+            event = RequestEvent(method, _endpoint_template(path))
+        return self._observe(
+            event, lambda: self._cached_request(method, path, event, **kwargs)
+        )
+
+    def _observe(
+        self, event: Optional[RequestEvent], send: Callable[[], Response]
+    ) -> Response:
+        """Send a request, calling the request hooks with its event if any."""
+        if event is None:
+            return send()
+
+        if self.before_request is not None:
+            self.before_request(event)
+        start = time.perf_counter()
+        try:
+            r = send()
+            event.status = r.status_code
+            return r
+        except Exception as err:
+            event.error = err
+            raise
+        finally:
+            event.latency = time.perf_counter() - start
+            if self.after_request is not None:
+                self.after_request(event)
+
+    def _cached_request(
+        self, method: str, path: str, event: Optional[RequestEvent], **kwargs: Any
+    ) -> Response:
+        """Make a request through the cache.
+
+        Responses are served from, and stored in, the cache when one is configured
+        and the cache policy allows it. Expired responses with an ETag or
+        Last-Modified header are revalidated, a 304 is answered from the cache.
+        """
+        url = self._base_url + path
+
+        if self.cache is None or kwargs.get("stream"):
+            return self._send_with_retry(method, url, event, **kwargs)
+
+        payload = kwargs.get("json")
+        key = cache_key(method, path, payload)
+        ttl = self.cache_policy.ttl(method, _endpoint_template(path), payload)
+
+        stale = None
+        if ttl is not None:
+            entry = self.cache.get(key, stale=True)
+            if entry is not None and not entry.expired:
+                if event is not None:
+                    event.cache = "hit"
+                return entry.to_response(url)
+            if (
+                entry is not None
+                and method == "get"
+                and self.cache_policy.revalidate
+                and entry.validators
+            ):
+                stale = entry
+                kwargs["headers"] = dict(kwargs.get("headers") or {})
+                kwargs["headers"].update(entry.validators)
+
+        r = self._send_with_retry(method, url, event, **kwargs)
+        if event is not None and ttl is not None:
+            event.cache = "miss"
+
+        if stale is not None and ttl is not None and r.status_code == 304:
+            if event is not None:
+                event.cache = "revalidated"
+            entry = stale.revalidated(r, ttl)
+            self.cache.set(key, entry)
+            return entry.to_response(url)
+
+        if ttl is not None and r.status_code == 200:
+            self.cache.set(key, CachedResponse.from_response(r, ttl))
+        elif method != "get":
+            # A write makes the cached read of the same resource stale.
+            self.cache.delete(cache_key("get", path))
+        return r
+
+    def _send_with_retry(
+        self, method: str, url: str, event: Optional[RequestEvent], **kwargs: Any
+    ) -> Response:
+        """Send a request, retrying transient failures as the retry policy allows."""
+        retries = 0
+        while True:
+            if event is not None:
+                event.retries = retries
+            try:
+                r = self._send(method, url, event, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as err:
+                if self.retry is None or not self.retry.allows(method, retries):
+                    raise
+                delay = self.retry.delay(retries)
+                _LOGGER.debug("Retrying %s %s after %s", method, url, err)
+            else:
+                if event is not None:
+                    event.add_response(r, bool(kwargs.get("stream")))
+                if (
+                    self.retry is None
+                    or not self.retry.retry_status(r.status_code)
+                    or not self.retry.allows(method, retries)
+                ):
+                    return r
+                delay = self.retry.delay(retries, r.headers.get("Retry-After"))
+                if delay is None:
+                    return r
+                r.close()
+                _LOGGER.debug("Retrying %s %s after %s", method, url, r.status_code)
+
+            retries += 1
+            time.sleep(delay or 0)
+
+    def _send(
+        self, method: str, url: str, event: Optional[RequestEvent], **kwargs: Any
+    ) -> Response:
+        """Send a request over the OAuth session.
 
         We don't use the built-in token refresh mechanism of OAuth2 session because
         we want to allow overriding the token refresh logic.
         """
-        url = BASE_URL + path
+        access_token = self._access_token()
+        if self._token_expiring():
+            if self._refresh_once(access_token) and event is not None:
+                event.token_refreshes += 1
+            access_token = self._access_token()
 
         try:
             return getattr(self._oauth, method)(url, **kwargs)
         except TokenExpiredError:
-            self._oauth.token = self.refresh_tokens()
+            if self._refresh_once(access_token) and event is not None:
+                event.token_refreshes += 1
 
             return getattr(self._oauth, method)(url, **kwargs)
 
-    def hass_add_url(self) -> None:
-        """Add callback url for auth."""
-        if self._callback_url:
-            callback_url = f"{self._callback_url}/auth/external/callback"
-            access_token = self.hass_get_token()
-            redirect_uri_list = self.hass_get_redirect_urls(access_token)
-
-            if callback_url not in redirect_uri_list:
-                redir_str = ""
-                for redir in redirect_uri_list:
-                    if redirect_uri_list.index(redir) == 0:
-                        redir_str += redir
-                    else:
-                        redir_str += f"\r{redir}"
-
-                redirect_uri = f"{redir_str}\r{callback_url}"
-                self.hass_add_redirect_urls(redirect_uri, access_token)
-                _LOGGER.debug("Added %s redirect url", callback_url)
-
-    def hass_remove_url(self) -> None:
-        """Remove the callback url for auth."""
-        if self._callback_url:
-            callback_url = f"{self._callback_url}/auth/external/callback"
-            access_token = self.hass_get_token()
-            redirect_uri_list = self.hass_get_redirect_urls(access_token)
-
-            # print(f"{callback_url} in {redirect_uri_list}")
-            if callback_url in redirect_uri_list:
-                redir_str = ""
-                for redir in redirect_uri_list:
-                    if redirect_uri_list.index(redir) == 0:
-                        redir_str += redir
-                    else:
-                        redir_str += f"\r{redir}"
-
-                redirect_uri = redir_str.replace(f"\r{callback_url}", "")
-                self.hass_add_redirect_urls(redirect_uri, access_token)
-                _LOGGER.debug("Removed %s redirect url", callback_url)
+    def _access_token(self) -> Optional[str]:
+        """Return the current access token."""
+        return (self._oauth.token or {}).get("access_token")
+
+    def _token_expiring(self) -> bool:
+        """Return True if the token expires within the refresh margin."""
+        if self.refresh_margin is None:
+            return False
+        expires_at = (self._oauth.token or {}).get("expires_at")
+        return expires_at is not None and expires_at - time.time() < self.refresh_margin
+
+    def _refresh_once(self, stale_token: Optional[str]) -> bool:
+        """Refresh the token unless another thread already replaced it.
+
+        Callers which fail with the same stale token wait for a single refresh
+        instead of each starting one.
+
+        :return: True if this call refreshed the token
+        """
+        with self._refresh_lock:
+            if self._access_token() != stale_token:
+                return False
+            self._oauth.token = self.refresh_tokens()
+            return True
+
+    def hass_add_url(self) -> Optional[List[str]]:
+        """Add callback url for auth.
+
+        :return: the redirect urls, None without a callback url
+        """
+        if not self._callback_url:
+            return None
+        return self.hass_update_urls(add=[self._callback_url + HASS_CALLBACK_PATH])
+
+    def hass_remove_url(self) -> Optional[List[str]]:
+        """Remove the callback url for auth.
+
+        :return: the redirect urls, None without a callback url
+        """
+        if not self._callback_url:
+            return None
+        return self.hass_update_urls(remove=[self._callback_url + HASS_CALLBACK_PATH])
+
+    def hass_update_urls(
+        self, add: Iterable[str] = (), remove: Iterable[str] = ()
+    ) -> List[str]:
+        """Add and remove redirect urls.
+
+        The redirect urls are read once and written at most once, not at all when
+        nothing changes.
+
+        :param add: urls to add unless already present
+        :type add: list
+        :param remove: urls to remove if present
+        :type remove: list
+        :return: the redirect urls after the update
+        :rtype: list
+        """
+        current = self.hass_get_redirect_urls()
+        updated = _update_redirect_urls(current, add, remove)
+        if updated is None:
+            return current
+
+        self.hass_add_redirect_urls("\r".join(updated))
+        _LOGGER.debug("Updated redirect urls to %s", updated)
+        return updated
 
     def hass_make_request(
         self, method: str, url: str, payload: Dict[str, str], headers: Dict[str, str]
-    ) -> Dict[str, str]:
-        """Wrap requests."""
-        response = requests.request(method, url, json=payload, headers=headers)
+    ) -> Dict[str, Any]:
+        """Wrap requests.
 
-        json_data = response.json()
+        The request reuses the pooled connections of the OAuth session, the user
+        token is withheld as these calls authenticate with client credentials.
+        """
+        response = self._hass_send(method, url, payload, headers)
+
+        json_data = codec.loads(response.content)
         return json_data
 
-    def hass_get_token(self) -> str:
-        """Get the token."""
-        json_data = self.hass_make_request(
-            "POST",
-            "https://app.fitbark.com/oauth/token",
-            {
-                "grant_type": "client_credentials",
-                "client_id": self.client_id,
-                "client_secret": self.client_secret,
-                "scope": "fitbark_open_api_2745H78RVS",
-            },
-            {"Content-Type": "application/json", "Cache-Control": "no-cache"},
+    def _hass_send(
+        self, method: str, url: str, payload: Dict[str, str], headers: Dict[str, str]
+    ) -> Response:
+        """Send a request over the OAuth session without the user token."""
+        event = None
+        if self.before_request is not None or self.after_request is not None:
+            event = RequestEvent(method, self._url_endpoint(url))
+
+        def send() -> Response:
+            r = self._oauth.request(
+                method, url, json=payload, headers=headers, withhold_token=True
+            )
+            if event is not None:
+                event.add_response(r)
+            return r
+
+        return self._observe(event, send)
+
+    def _url_endpoint(self, url: str) -> str:
+        """Return the endpoint of a URL, the path if it is not below the API root."""
+        if url.startswith(self._base_url + "/"):
+            return _endpoint_template(url[len(self._base_url) :])
+        return urlsplit(url).path
+
+    def _hass_authorized_request(
+        self,
+        method: str,
+        url: str,
+        payload: Dict[str, str],
+        access_token: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """Make a request with a client credentials token.
+
+        The cached token is used unless one is given. When the server rejects the
+        token it is dropped from the cache and the request is retried once with a
+        fresh token.
+        """
+        token = access_token or self.hass_get_token()
+        response = self._hass_send(
+            method, url, payload, {"Authorization": f"Bearer {token}"}
         )
-        access_token = json_data["access_token"]
-        return access_token
-
-    def hass_get_redirect_urls(self, access_token: str) -> List[str]:
-        """Get a list of redirect URLs."""
-        json_data = self.hass_make_request(
-            "GET",
-            "https://app.fitbark.com/api/v2/redirect_urls",
-            {},
-            {"Authorization": f"Bearer {access_token}"},
+
+        if response.status_code == 401:
+            self.hass_invalidate_token(token)
+            token = self.hass_get_token()
+            response = self._hass_send(
+                method, url, payload, {"Authorization": f"Bearer {token}"}
+            )
+
+        json_data = codec.loads(response.content)
+        return json_data
+
+    def hass_get_token(self) -> str:
+        """Get the token.
+
+        The client credentials token is cached until shortly before it expires.
+        """
+        key = (self.client_id, HASS_SCOPE)
+        with self._hass_token_lock:
+            cached = self._hass_tokens.get(key)
+            if cached is not None and cached[1] > time.time():
+                return cached[0]
+
+            json_data = self.hass_make_request(
+                "POST",
+                self._token_url,
+                {
+                    "grant_type": "client_credentials",
+                    "client_id": self.client_id,
+                    "client_secret": self.client_secret,
+                    "scope": HASS_SCOPE,
+                },
+                {"Content-Type": "application/json", "Cache-Control": "no-cache"},
+            )
+            access_token = json_data["access_token"]
+
+            expires_in = json_data.get("expires_in")
+            if expires_in is not None:
+                expires_at = time.time() + float(expires_in) - HASS_TOKEN_MARGIN
+            else:
+                expires_at = float("inf")
+            self._hass_tokens[key] = (access_token, expires_at)
+            return access_token
+
+    def hass_invalidate_token(self, access_token: Optional[str] = None) -> None:
+        """Drop the cached client credentials token.
+
+        :param access_token: only drop the cached token if it is this one
+        """
+        key = (self.client_id, HASS_SCOPE)
+        with self._hass_token_lock:
+            cached = self._hass_tokens.get(key)
+            if cached is not None and access_token in (None, cached[0]):
+                del self._hass_tokens[key]
+
+    def hass_get_redirect_urls(self, access_token: Optional[str] = None) -> List[str]:
+        """Get a list of redirect URLs.
+
+        :param access_token: client credentials token, defaults to the cached one
+        """
+        json_data = self._hass_authorized_request(
+            "GET", f"{self._base_url}/redirect_urls", {}, access_token
         )
         regex = re.compile(r"[\r]")
         s = regex.sub(",", json_data["redirect_uri"])
@@ -463,13 +1147,16 @@ class FitbarkApi:
         return s_list
 
     def hass_add_redirect_urls(
-        self, redirect_uri: str, access_token: str
-    ) -> Dict[str, str]:
-        """Add the redirect url."""
-        json_data = self.hass_make_request(
+        self, redirect_uri: str, access_token: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Add the redirect url.
+
+        :param access_token: client credentials token, defaults to the cached one
+        """
+        json_data = self._hass_authorized_request(
             "POST",
-            "https://app.fitbark.com/api/v2/redirect_urls",
+            f"{self._base_url}/redirect_urls",
             {"redirect_uri": redirect_uri},
-            {"Authorization": f"Bearer {access_token}"},
+            access_token,
         )
         return json_data
@@ -0,0 +1,602 @@
+# -*- coding: utf-8 -*-
+"""PyFitBark asyncio API.
+
+Mirrors :class:`pyfitbark.api.FitbarkApi` on top of aiohttp, so that many requests
+can be kept in flight from a single event loop over one pooled, keep-alive
+connection set.
+"""
+import asyncio
+import logging
+import re
+import time
+from urllib.parse import parse_qs, urljoin, urlparse
+
+# pylint: disable=unused-import
+from typing import Tuple, List, Optional, Union, Callable, Dict, Any  # NOQA
+from typing import Awaitable, Iterable
+
+from requests_oauthlib import OAuth2Session
+
+try:
+    import aiohttp
+except ImportError:  # pragma: no cover
+    aiohttp = None  # type: ignore
+
+from . import codec
+from .api import (
+    BASE_URL,
+    HASS_CALLBACK_PATH,
+    HASS_SCOPE,
+    BulkResult,
+    _date_range,
+    _date_windows,
+    _merge_series,
+    _resolution,
+    _update_redirect_urls,
+)
+from .retry import RetryPolicy
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class AsyncFitbarkApi:
+    """FitBark API implimentation for asyncio.
+
+    Use as an async context manager, or call :meth:`close` when done, so the pooled
+    connections are released.
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        client_id: str,
+        client_secret: str,
+        redirect_uri: Optional[str] = None,
+        token: Optional[Dict[str, str]] = None,
+        token_updater: Optional[Callable[[Dict[str, Any]], None]] = None,
+        callback_url: Optional[str] = None,
+        *,
+        session: Optional["aiohttp.ClientSession"] = None,
+        limit: int = 100,
+        base_url: str = BASE_URL,
+        refresh_margin: Optional[float] = None,
+        retry: Optional[RetryPolicy] = None,
+    ):
+        """Init.
+
+        :param session: an existing aiohttp session to share, it is not closed by
+            :meth:`close`
+        :param limit: maximum number of simultaneous pooled connections
+        :param base_url: root of the FitBark API
+        :param refresh_margin: refresh the token this many seconds before it
+            expires
+        :param retry: retry 429, 5xx and connection errors, see
+            :class:`pyfitbark.retry.RetryPolicy`
+        """
+        if aiohttp is None:
+            raise ImportError(
+                "AsyncFitbarkApi requires aiohttp, install pyfitbark[async]"
+            )
+
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.redirect_uri = redirect_uri
+        self.token: Dict[str, Any] = dict(token or {})
+        self.token_updater = token_updater
+        self._callback_url = callback_url
+        self._base_url = base_url
+        self._token_url = urljoin(base_url, "/oauth/token")
+        self._authorize_url = urljoin(base_url, "/oauth/authorize")
+        self._limit = limit
+        self._session = session
+        self._owns_session = session is None
+        self.refresh_margin = refresh_margin
+        self._refresh_lock: Optional[asyncio.Lock] = None
+        self.retry = retry
+
+    async def __aenter__(self) -> "AsyncFitbarkApi":
+        """Enter the context manager."""
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        """Exit the context manager."""
+        await self.close()
+
+    @property
+    def session(self) -> "aiohttp.ClientSession":
+        """Return the pooled session, creating it on first use."""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self._limit)
+            self._session = aiohttp.ClientSession(connector=connector)
+            self._owns_session = True
+        return self._session
+
+    async def close(self) -> None:
+        """Close the pooled connections owned by this client."""
+        if self._owns_session and self._session is not None:
+            await self._session.close()
+        self._session = None
+
+    async def get_user_profile(self) -> Dict[str, Any]:
+        """Get various information about the specified user.
+
+        :return: user details
+        :rtype: json
+        """
+        r = await self.get("/user")
+        r.raise_for_status()
+        return await r.json(loads=codec.loads)
+
+    async def get_user_picture(self, slug: str) -> Dict[str, Any]:
+        """Get the Base64 encoded picture for a specified user.
+
+        :param slug: uuid of the user to look up
+        :type slug: uuid
+        :return: base64 encoded string of image
+        :rtype: json
+        """
+        r = await self.get("/picture/user/" + slug)
+        r.raise_for_status()
+        return await r.json(loads=codec.loads)
+
+    async def get_user_related_dogs(self) -> Dict[str, Any]:
+        """Get the dogs related to the logged in user.
+
+        :return: list of dogs
+        :rtype: json
+        """
+        r = await self.get("/dog_relations")
+        r.raise_for_status()
+        return await r.json(loads=codec.loads)
+
+    async def get_dog(self, slug: str) -> Dict[str, Any]:
+        """Get various information about a certain dog.
+
+        :param slug: uuid of the dog to look up
+        :type slug: uuid
+        :return: dog's info
+        :rtype: json
+        """
+        r = await self.get("/dog/" + slug)
+        r.raise_for_status()
+        return await r.json(loads=codec.loads)
+
+    async def get_dog_picture(self, slug: str) -> Dict[str, Any]:
+        """Get the Base64 encoded picture for a specified dog.
+
+        :param slug: uuid of the dog to return
+        :type slug: uuid
+        :return: base64 encoded string of image
+        :rtype: json
+        """
+        r = await self.get("/picture/dog/" + slug)
+        r.raise_for_status()
+        return await r.json(loads=codec.loads)
+
+    async def get_dog_related_users(self, slug: str) -> Dict[str, Any]:
+        """Get a list of users currently associated with a specified dog.
+
+        :param slug: uuid of the dog to look up
+        :type slug: uuid
+        :return: list of users
+        :rtype: json
+        """
+        r = await self.get("/user_relations/" + slug)
+        r.raise_for_status()
+        return await r.json(loads=codec.loads)
+
+    async def get_daily_goal(self, slug: str) -> Dict[str, Any]:
+        """Get a dog’s current daily goal and future daily goals.
+
+        :param slug: uuid of the dog to look up
+        :type slug: uuid
+        :return: list of daily goals and dates set
+        :rtype: json
+        """
+        r = await self.get("/daily_goal/" + slug)
+        r.raise_for_status()
+        return await r.json(loads=codec.loads)
+
+    async def set_daily_goal(self, slug: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Set the daily goal for a specified dog.
+
+        :param slug: uuid of the dog to modify
+        :type slug: uuid
+        :param data: dictionary containing two values, `daily_goal` and `date`
+        :type data: dict
+        :return: list of all future daily goals
+        :rtype: json
+        """
+        r = await self.put("/daily_goal/" + slug, json=data)
+        r.raise_for_status()
+        return await r.json(loads=codec.loads)
+
+    async def get_dogs(
+        self, slugs: Iterable[str], max_concurrency: Optional[int] = None
+    ) -> List[BulkResult]:
+        """Get information about several dogs concurrently.
+
+        :param slugs: uuids of the dogs to look up
+        :type slugs: list
+        :param max_concurrency: number of requests in flight, defaults to the pool
+            limit
+        :type max_concurrency: int
+        :return: one result per slug, in the order given
+        :rtype: list
+        """
+        return await self.map_slugs(self.get_dog, slugs, max_concurrency)
+
+    async def get_dog_pictures(
+        self, slugs: Iterable[str], max_concurrency: Optional[int] = None
+    ) -> List[BulkResult]:
+        """Get the Base64 encoded pictures of several dogs concurrently.
+
+        :param slugs: uuids of the dogs to look up
+        :type slugs: list
+        :param max_concurrency: number of requests in flight, defaults to the pool
+            limit
+        :type max_concurrency: int
+        :return: one result per slug, in the order given
+        :rtype: list
+        """
+        return await self.map_slugs(self.get_dog_picture, slugs, max_concurrency)
+
+    async def map_slugs(
+        self,
+        func: Callable[[str], Awaitable[Any]],
+        slugs: Iterable[str],
+        max_concurrency: Optional[int] = None,
+    ) -> List[BulkResult]:
+        """Await func for every slug concurrently, collecting failures.
+
+        :param func: coroutine function called with each slug, e.g. ``api.get_dog``
+        :type func: callable
+        :param slugs: uuids to call func with
+        :type slugs: list
+        :param max_concurrency: number of concurrent calls, defaults to ``limit``
+        :type max_concurrency: int
+        :return: one result per slug, in the order given
+        :rtype: list
+        """
+        semaphore = asyncio.Semaphore(max_concurrency or self._limit)
+
+        async def call(slug: str) -> BulkResult:
+            async with semaphore:
+                try:
+                    return BulkResult(slug, await func(slug), None)
+                except Exception as err:  # pylint: disable=broad-except
+                    _LOGGER.debug("Request for %s failed: %s", slug, err)
+                    return BulkResult(slug, None, err)
+
+        return list(await asyncio.gather(*(call(slug) for slug in slugs)))
+
+    async def get_activity_series(
+        self,
+        slug: str,
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+        resolution: Optional[str] = "DAILY",
+    ) -> Dict[str, Any]:
+        """Get historical series data between two specified date times.
+
+        Ranges longer than the API accepts are split into windows which are
+        fetched concurrently, then merged into a single date ordered list.
+
+        :param slug: uuid of the dog to look up
+        :type slug: uuid
+        :param date_from: the start of the date range to look up
+        :type date_from: datetime, date, str
+        :param date_to: the end of the date range to look up
+        :type date_to: datetime, date, str
+        :param resolution: DAILY or HOURLY breakdown
+        :type resolution: str
+        :return: list of records breaking activity down
+        :rtype: json
+        """
+        date_from, date_to = _date_range(date_from, date_to)
+        resolution = _resolution(resolution)
+        windows = _date_windows(date_from, date_to, resolution)
+
+        if len(windows) == 1:
+            return await self._get_activity_window(slug, date_from, date_to, resolution)
+
+        responses = await asyncio.gather(
+            *(
+                self._get_activity_window(slug, start, stop, resolution)
+                for start, stop in windows
+            )
+        )
+        return _merge_series(slug, list(responses))
+
+    async def _get_activity_window(
+        self, slug: str, date_from: str, date_to: str, resolution: str
+    ) -> Dict[str, Any]:
+        """Post a single activity_series request."""
+        data = {
+            "activity_series": {
+                "slug": slug,
+                "from": date_from,
+                "to": date_to,
+                "resolution": resolution,
+            }
+        }
+
+        r = await self.post("/activity_series", json=data)
+        r.raise_for_status()
+        return await r.json(loads=codec.loads)
+
+    async def get_dog_similar_stats(self, slug: str) -> Dict[str, Any]:
+        """Get this dogs, and similar dogs, statistics.
+
+        :param slug: uuid of the dog to look up
+        :type slug: uuid
+        :return: statistics for dogs similar to the requested dog
+        :rtype: json
+        """
+        r = await self.post("/similar_dogs_stats", json={"slug": slug})
+        r.raise_for_status()
+        return await r.json(loads=codec.loads)
+
+    async def get_activity_totals(
+        self, slug: str, date_from: Optional[str] = None, date_to: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Get historical activity data by totaling the historical series.
+
+        :param slug: uuid of the dog to look up
+        :type slug: uuid
+        :param date_from: the start of the date range to look up
+        :type date_from: datetime, date, str
+        :param date_to: the end of the date range to look up
+        :type date_to: datetime, date, str
+        :return: list of records breaking activity down
+        :rtype: json
+        """
+        date_from, date_to = _date_range(date_from, date_to)
+        data = {"dog": {"slug": slug, "from": date_from, "to": date_to}}
+
+        r = await self.post("/activity_totals", json=data)
+        r.raise_for_status()
+        return await r.json(loads=codec.loads)
+
+    async def get_time_breakdown(
+        self, slug: str, date_from: Optional[str] = None, date_to: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Get the time (in minutes) spent at each activity level.
+
+        :param slug: uuid of the dog to look up
+        :type slug: uuid
+        :param date_from: the start of the date range to look up
+        :type date_from: datetime, date, str
+        :param date_to: the end of the date range to look up
+        :type date_to: datetime, date, str
+        :return: total minutes of each activity level (play, active, rest) for the
+            period & dog
+        :rtype: json
+        """
+        date_from, date_to = _date_range(date_from, date_to)
+        data = {"dog": {"slug": slug, "from": date_from, "to": date_to}}
+
+        r = await self.post("/time_breakdown", json=data)
+        r.raise_for_status()
+        return await r.json(loads=codec.loads)
+
+    async def get(self, path: str) -> "aiohttp.ClientResponse":
+        """Fetch a URL from the Fitbark API."""
+        return await self._request("get", path)
+
+    async def post(
+        self, path: str, *, json: Dict[str, Any]
+    ) -> "aiohttp.ClientResponse":
+        """Post data to the Fitbark API."""
+        return await self._request("post", path, json=json)
+
+    async def put(self, path: str, *, json: Dict[str, Any]) -> "aiohttp.ClientResponse":
+        """Put data to the Fitbark API."""
+        return await self._request("put", path, json=json)
+
+    def get_authorization_url(self, state: Optional[str] = None) -> Tuple[str, str]:
+        """Get the authorization url."""
+        oauth = OAuth2Session(client_id=self.client_id, redirect_uri=self.redirect_uri)
+        return oauth.authorization_url(self._authorize_url, state)
+
+    async def request_token(
+        self, authorization_response: Optional[str] = None, code: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Fetch a Fitbark access token.
+
+        :param authorization_response: Authorization response URL, the callback
+                                       URL of the request back to you.
+        :param code: Authorization code
+        :return: A token dict
+        """
+        if code is None and authorization_response is not None:
+            query = parse_qs(urlparse(authorization_response).query)
+            code = query.get("code", [None])[0]
+
+        data = {
+            "grant_type": "authorization_code",
+            "code": code,
+            "client_id": self.client_id,
+            "client_secret": self.client_secret,
+        }
+        if self.redirect_uri:
+            data["redirect_uri"] = self.redirect_uri
+
+        self.token = await self._fetch_token(data)
+        return self.token
+
+    async def refresh_tokens(self) -> Dict[str, Union[str, int]]:
+        """Refresh and return new Fitbark tokens."""
+        token = await self._fetch_token(
+            {
+                "grant_type": "refresh_token",
+                "refresh_token": self.token.get("refresh_token"),
+                "client_id": self.client_id,
+                "client_secret": self.client_secret,
+            }
+        )
+
+        if self.token_updater is not None:
+            self.token_updater(token)  # type: ignore
+
+        return token
+
+    async def _fetch_token(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Post an OAuth grant to the token endpoint."""
+        async with self.session.post(self._token_url, data=data) as r:
+            r.raise_for_status()
+            token = await r.json(loads=codec.loads)
+
+        if "expires_in" in token and "expires_at" not in token:
+            token["expires_at"] = time.time() + int(token["expires_in"])
+        return token
+
+    def _token_expired(self) -> bool:
+        """Return True if the token has expired, or is within the refresh margin."""
+        expires_at = self.token.get("expires_at")
+        margin = self.refresh_margin or 0
+        return expires_at is not None and float(expires_at) - margin < time.time()
+
+    async def _refresh_once(self) -> None:
+        """Refresh an expired token, a single time for all waiting requests."""
+        if self._refresh_lock is None:
+            self._refresh_lock = asyncio.Lock()
+
+        async with self._refresh_lock:
+            # Another request may have refreshed it while we waited.
+            if self._token_expired():
+                self.token = await self.refresh_tokens()
+
+    async def _request(
+        self, method: str, path: str, **kwargs: Any
+    ) -> "aiohttp.ClientResponse":
+        """Make a request.
+
+        The body is read before the connection is handed back to the pool, so the
+        returned response can still be decoded with ``await r.json()``.
+        """
+        url = self._base_url + path
+        retries = 0
+        while True:
+            if self._token_expired():
+                await self._refresh_once()
+
+            headers = {"Authorization": f"Bearer {self.token.get('access_token')}"}
+            try:
+                async with self.session.request(
+                    method, url, headers=headers, **kwargs
+                ) as r:
+                    await r.read()
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as err:
+                if self.retry is None or not self.retry.allows(method, retries):
+                    raise
+                delay = self.retry.delay(retries)
+                _LOGGER.debug("Retrying %s %s after %s", method, url, err)
+            else:
+                if (
+                    self.retry is None
+                    or not self.retry.retry_status(r.status)
+                    or not self.retry.allows(method, retries)
+                ):
+                    return r
+                delay = self.retry.delay(retries, r.headers.get("Retry-After"))
+                if delay is None:
+                    return r
+                _LOGGER.debug("Retrying %s %s after %s", method, url, r.status)
+
+            retries += 1
+            await asyncio.sleep(delay or 0)
+
+    async def hass_add_url(self) -> Optional[List[str]]:
+        """Add callback url for auth.
+
+        :return: the redirect urls, None without a callback url
+        """
+        if not self._callback_url:
+            return None
+        return await self.hass_update_urls(
+            add=[self._callback_url + HASS_CALLBACK_PATH]
+        )
+
+    async def hass_remove_url(self) -> Optional[List[str]]:
+        """Remove the callback url for auth.
+
+        :return: the redirect urls, None without a callback url
+        """
+        if not self._callback_url:
+            return None
+        return await self.hass_update_urls(
+            remove=[self._callback_url + HASS_CALLBACK_PATH]
+        )
+
+    async def hass_update_urls(
+        self, add: Iterable[str] = (), remove: Iterable[str] = ()
+    ) -> List[str]:
+        """Add and remove redirect urls with one read and at most one write.
+
+        :param add: urls to add unless already present
+        :type add: list
+        :param remove: urls to remove if present
+        :type remove: list
+        :return: the redirect urls after the update
+        :rtype: list
+        """
+        access_token = await self.hass_get_token()
+        current = await self.hass_get_redirect_urls(access_token)
+        updated = _update_redirect_urls(current, add, remove)
+        if updated is None:
+            return current
+
+        await self.hass_add_redirect_urls("\r".join(updated), access_token)
+        _LOGGER.debug("Updated redirect urls to %s", updated)
+        return updated
+
+    async def hass_make_request(
+        self, method: str, url: str, payload: Dict[str, str], headers: Dict[str, str]
+    ) -> Dict[str, Any]:
+        """Wrap requests."""
+        async with self.session.request(
+            method, url, json=payload, headers=headers
+        ) as r:
+            json_data = await r.json(content_type=None, loads=codec.loads)
+        return json_data
+
+    async def hass_get_token(self) -> str:
+        """Get the token."""
+        json_data = await self.hass_make_request(
+            "POST",
+            self._token_url,
+            {
+                "grant_type": "client_credentials",
+                "client_id": self.client_id,
+                "client_secret": self.client_secret,
+                "scope": HASS_SCOPE,
+            },
+            {"Content-Type": "application/json", "Cache-Control": "no-cache"},
+        )
+        access_token = json_data["access_token"]
+        return access_token
+
+    async def hass_get_redirect_urls(self, access_token: str) -> List[str]:
+        """Get a list of redirect URLs."""
+        json_data = await self.hass_make_request(
+            "GET",
+            self._base_url + "/redirect_urls",
+            {},
+            {"Authorization": f"Bearer {access_token}"},
+        )
+        regex = re.compile(r"[\r]")
+        s = regex.sub(",", json_data["redirect_uri"])
+        s_list = s.split(",")
+        return s_list
+
+    async def hass_add_redirect_urls(
+        self, redirect_uri: str, access_token: str
+    ) -> Dict[str, Any]:
+        """Add the redirect url."""
+        json_data = await self.hass_make_request(
+            "POST",
+            self._base_url + "/redirect_urls",
+            {"redirect_uri": redirect_uri},
+            {"Authorization": f"Bearer {access_token}"},
+        )
+        return json_data
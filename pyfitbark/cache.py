@@ -0,0 +1,292 @@
+# -*- coding: utf-8 -*-
+"""PyFitBark response cache.
+
+The cache sits around :meth:`pyfitbark.api.FitbarkApi._request`. A
+:class:`CachePolicy` decides how long the response of an endpoint may be reused,
+and a backend (:class:`MemoryCache` or :class:`SQLiteCache`) stores it. Expired
+responses carrying an ``ETag`` or ``Last-Modified`` are revalidated with a
+conditional request instead of being downloaded again.
+"""
+import datetime
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# pylint: disable=unused-import
+from typing import Tuple, List, Optional, Union, Callable, Dict, Any  # NOQA
+from typing import NamedTuple
+
+from requests import Response
+from requests.structures import CaseInsensitiveDict
+
+# Responses cached with this TTL never expire.
+FOREVER = float("inf")
+
+DEFAULT_TTLS: Dict[Tuple[str, str], float] = {
+    ("get", "/user"): 3600,
+    ("get", "/picture/user/{slug}"): 86400,
+    ("get", "/dog_relations"): 3600,
+    ("get", "/dog/{slug}"): 3600,
+    ("get", "/picture/dog/{slug}"): 86400,
+    ("get", "/user_relations/{slug}"): 3600,
+    ("get", "/daily_goal/{slug}"): 300,
+    ("post", "/similar_dogs_stats"): 3600,
+}
+
+# Endpoints whose results are immutable once the requested range is over.
+ACTIVITY_ENDPOINTS = ("/activity_series", "/activity_totals", "/time_breakdown")
+# Headers which no longer apply once the content is stored decoded.
+TRANSFER_HEADERS = ("content-encoding", "content-length", "transfer-encoding")
+
+
+class CachedResponse(NamedTuple):
+    """A stored response."""
+
+    status_code: int
+    headers: Dict[str, str]
+    content: bytes
+    expires: Optional[float]
+
+    @classmethod
+    def from_response(cls, response: Response, ttl: float) -> "CachedResponse":
+        """Build an entry from a requests response."""
+        headers = _stored_headers(response.headers)
+        return cls(response.status_code, headers, response.content, _expires(ttl))
+
+    @property
+    def expired(self) -> bool:
+        """Return True if the entry may no longer be used."""
+        return self.expires is not None and self.expires <= time.time()
+
+    @property
+    def validators(self) -> Dict[str, str]:
+        """Return the headers of a conditional request revalidating the entry."""
+        headers = CaseInsensitiveDict(self.headers)
+        validators = {}
+        if "etag" in headers:
+            validators["If-None-Match"] = headers["etag"]
+        if "last-modified" in headers:
+            validators["If-Modified-Since"] = headers["last-modified"]
+        return validators
+
+    def revalidated(self, response: Response, ttl: float) -> "CachedResponse":
+        """Return the entry refreshed by a 304 Not Modified response."""
+        headers = dict(self.headers)
+        headers.update(_stored_headers(response.headers))
+        return self._replace(headers=headers, expires=_expires(ttl))
+
+    def to_response(self, url: str) -> Response:
+        """Rebuild a requests response, flagged with ``from_cache``."""
+        response = Response()
+        response.status_code = self.status_code
+        response.headers = CaseInsensitiveDict(self.headers)
+        response._content = self.content  # pylint: disable=protected-access
+        response.url = url
+        response.from_cache = True  # type: ignore
+        return response
+
+
+def _expires(ttl: float) -> Optional[float]:
+    """Return the expiry time of an entry stored now."""
+    return None if ttl == FOREVER else time.time() + ttl
+
+
+def _stored_headers(headers: Any) -> Dict[str, str]:
+    """Return the response headers kept with an entry.
+
+    The content is stored decoded, so the transfer headers no longer apply.
+    """
+    return {
+        name: value
+        for name, value in headers.items()
+        if name.lower() not in TRANSFER_HEADERS
+    }
+
+
+class CachePolicy:
+    """Decide whether, and for how long, a request may be served from cache.
+
+    :param ttls: seconds to keep each ``(method, endpoint template)``, merged over
+        :data:`DEFAULT_TTLS`; a TTL of ``0`` disables caching for that endpoint
+    :param activity_ttl: seconds to keep activity data for ranges that are not
+        over yet, ``None`` to never cache them
+    :param settle_days: number of days after which a past day is considered final,
+        collars may sync a day late
+    :param revalidate: revalidate expired GET responses with ``If-None-Match`` and
+        ``If-Modified-Since`` when the server sent validators
+    """
+
+    def __init__(
+        self,
+        ttls: Optional[Dict[Tuple[str, str], float]] = None,
+        activity_ttl: Optional[float] = None,
+        settle_days: int = 1,
+        revalidate: bool = True,
+    ):
+        """Init."""
+        self.ttls = dict(DEFAULT_TTLS)
+        self.ttls.update(ttls or {})
+        self.activity_ttl = activity_ttl
+        self.settle_days = settle_days
+        self.revalidate = revalidate
+
+    def ttl(
+        self, method: str, endpoint: str, payload: Optional[Dict[str, Any]] = None
+    ) -> Optional[float]:
+        """Return the TTL of a request, or None if it must not be cached."""
+        if method == "post" and endpoint in ACTIVITY_ENDPOINTS:
+            return self._activity_ttl(payload or {})
+
+        ttl = self.ttls.get((method, endpoint))
+        return ttl if ttl else None
+
+    def _activity_ttl(self, payload: Dict[str, Any]) -> Optional[float]:
+        """Activity for days which are over never changes."""
+        for value in payload.values():
+            date_to = value.get("to") if isinstance(value, dict) else None
+            if date_to:
+                final = datetime.date.today() - datetime.timedelta(
+                    days=self.settle_days
+                )
+                if date_to < final.strftime("%Y-%m-%d"):
+                    return FOREVER
+        return self.activity_ttl
+
+
+def cache_key(method: str, path: str, payload: Optional[Dict[str, Any]] = None) -> str:
+    """Return the cache key of a request."""
+    key = f"{method.upper()} {path}"
+    if payload is not None:
+        key += " " + json.dumps(payload, sort_keys=True, separators=(",", ":"))
+    return key
+
+
+class MemoryCache:
+    """In-memory least recently used cache.
+
+    :param maxsize: number of responses to keep
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        """Init."""
+        self.maxsize = maxsize
+        self._data: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """Return the number of stored responses."""
+        return len(self._data)
+
+    def get(self, key: str, stale: bool = False) -> Optional[CachedResponse]:
+        """Return a fresh entry, or None.
+
+        :param stale: also return an expired entry, e.g. to revalidate it
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if entry.expired and not stale:
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return entry
+
+    def set(self, key: str, entry: CachedResponse) -> None:
+        """Store an entry, evicting the least recently used ones."""
+        with self._lock:
+            self._data[key] = entry
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        """Remove an entry."""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        """Remove every entry."""
+        with self._lock:
+            self._data.clear()
+
+
+class SQLiteCache:
+    """Persistent cache stored in a SQLite database.
+
+    :param path: database file, ``":memory:"`` for a private in-memory database
+    """
+
+    def __init__(self, path: str):
+        """Init."""
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, status_code INTEGER, headers TEXT, "
+                "content BLOB, expires REAL)"
+            )
+
+    def __len__(self) -> int:
+        """Return the number of stored responses."""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def get(self, key: str, stale: bool = False) -> Optional[CachedResponse]:
+        """Return a fresh entry, or None.
+
+        :param stale: also return an expired entry, e.g. to revalidate it
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status_code, headers, content, expires FROM responses "
+                "WHERE key = ?",
+                (key,),
+            ).fetchone()
+        if row is None:
+            return None
+
+        entry = CachedResponse(row[0], json.loads(row[1]), bytes(row[2]), row[3])
+        if entry.expired and not stale:
+            self.delete(key)
+            return None
+        return entry
+
+    def set(self, key: str, entry: CachedResponse) -> None:
+        """Store an entry."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                (
+                    key,
+                    entry.status_code,
+                    json.dumps(entry.headers),
+                    entry.content,
+                    entry.expires,
+                ),
+            )
+
+    def delete(self, key: str) -> None:
+        """Remove an entry."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+
+    def clear(self) -> None:
+        """Remove every entry."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM responses")
+
+    def purge(self) -> None:
+        """Remove expired entries."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM responses WHERE expires <= ?", (time.time(),)
+            )
+
+    def close(self) -> None:
+        """Close the database."""
+        self._conn.close()
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""PyFitBark JSON codec.
+
+Responses, stored records and CLI output are encoded and decoded through this
+module. orjson is used when it is installed, otherwise the stdlib :mod:`json`.
+Set the ``PYFITBARK_JSON`` environment variable or call :func:`use` to choose a
+backend explicitly. An unknown or missing backend in the environment only warns and
+falls back to the default.
+"""
+import json
+import os
+import warnings
+
+# pylint: disable=unused-import
+from typing import Tuple, List, Optional, Union, Callable, Dict, Any  # NOQA
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None  # type: ignore
+
+# Backends in order of preference.
+BACKENDS = ("orjson", "json")
+
+_backend = "json"
+
+
+def use(name: Optional[str] = None) -> str:
+    """Select the JSON backend.
+
+    :param name: ``"orjson"`` or ``"json"``, defaults to the fastest installed
+    :return: the selected backend
+    :rtype: str
+    """
+    global _backend  # pylint: disable=global-statement
+
+    if name is None:
+        name = "orjson" if orjson is not None else "json"
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown JSON backend {name}")
+    if name == "orjson" and orjson is None:
+        raise ImportError("orjson is not installed")
+
+    _backend = name
+    return name
+
+
+def backend() -> str:
+    """Return the name of the selected backend."""
+    return _backend
+
+
+def loads(data: Union[str, bytes]) -> Any:
+    """Decode a JSON document."""
+    if _backend == "orjson":
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(obj: Any, indent: bool = False) -> str:
+    """Encode an object as JSON.
+
+    :param obj: the object to encode
+    :param indent: pretty print with an indent of two spaces
+    :return: the JSON document
+    :rtype: str
+    """
+    if _backend == "orjson":
+        try:
+            return orjson.dumps(
+                obj, option=orjson.OPT_INDENT_2 if indent else 0
+            ).decode()
+        except TypeError:
+            # Integers beyond 64 bits and non-str keys need the stdlib.
+            pass
+
+    if indent:
+        return json.dumps(obj, indent=2, separators=(",", ": "))
+    return json.dumps(obj, separators=(",", ":"))
+
+
+def _use_environment() -> None:
+    """Select the backend named by ``PYFITBARK_JSON``, warning if it is unusable."""
+    name = os.environ.get("PYFITBARK_JSON") or None
+    try:
+        use(name)
+    except (ValueError, ImportError) as err:
+        warnings.warn(f"PYFITBARK_JSON ignored: {err}", RuntimeWarning)
+        use()
+
+
+_use_environment()
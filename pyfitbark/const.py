@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+"""PyFitBark constants and path helpers.
+
+Kept free of third party imports so the CLI and the fake server can use them
+without loading a client.
+"""
+
+API_VERSION = "2"
+BASE_URL = f"https://app.fitbark.com/api/v{API_VERSION}"
+FITBARK_OAUTH = "https://app.fitbark.com/oauth/authorize"
+FITBARK_TOKEN = "https://app.fitbark.com/oauth/token"
+FITBARK_REFRESH = "https://app.fitbark.com/oauth/token"
+# Scope of the client credentials token used by the hass_* helpers.
+HASS_SCOPE = "fitbark_open_api_2745H78RVS"
+# Seconds before expiry a cached client credentials token is replaced.
+HASS_TOKEN_MARGIN = 60
+HASS_CALLBACK_PATH = "/auth/external/callback"
+WEEK_DAYS = [
+    "SUNDAY",
+    "MONDAY",
+    "TUESDAY",
+    "WEDNESDAY",
+    "THURSDAY",
+    "FRIDAY",
+    "SATURDAY",
+]
+PERIODS = ["1d", "7d", "30d", "1w", "1m", "3m", "6m", "1y", "max"]
+RESOLUTIONS = ["DAILY", "HOURLY"]
+# Longest range, in days, the API accepts for one activity_series request.
+MAX_SERIES_DAYS = {"DAILY": 42, "HOURLY": 7}
+
+
+def _endpoint_template(path: str) -> str:
+    """Return the endpoint of a path with the slug stripped, e.g. /dog/{slug}."""
+    parts = path.split("/")
+    if len(parts) > 2:
+        parts[-1] = "{slug}"
+    return "/".join(parts)
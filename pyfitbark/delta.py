@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""PyFitBark change detection.
+
+Polling an activity series returns the whole range again although usually only
+the latest day or hour changed. :class:`DeltaTracker` remembers the last record
+seen for each dog and date and passes on only the records which are new or
+changed, so consumers do not re-ingest the same records every poll.
+"""
+
+# pylint: disable=unused-import
+from typing import Tuple, List, Optional, Union, Callable, Dict, Any  # NOQA
+from typing import Iterable, Iterator
+
+
+class DeltaTracker:
+    """Report the new or changed activity records of each dog.
+
+    :param callback: called with the slug and each new or changed record
+    :param max_records: records remembered per dog, the oldest dates are dropped
+        first; a dropped record is reported again if it is seen again
+    """
+
+    def __init__(
+        self,
+        callback: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+        max_records: int = 1024,
+    ):
+        """Init."""
+        if max_records < 1:
+            raise ValueError("max_records must be positive")
+        self.callback = callback
+        self.max_records = max_records
+        # Last record seen by slug and date.
+        self._seen: Dict[str, Dict[str, Dict[str, Any]]] = {}
+
+    def update(
+        self, slug: str, records: Iterable[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        """Remember the records of a dog and return those new or changed.
+
+        :param slug: uuid of the dog
+        :param records: ``activity_series`` records, in any order
+        :return: the new or changed records, in the order given
+        """
+        return list(self.iter_update(slug, records))
+
+    def iter_update(
+        self, slug: str, records: Iterable[Dict[str, Any]]
+    ) -> Iterator[Dict[str, Any]]:
+        """Yield the new or changed records of a dog as they are consumed.
+
+        Suits record streams such as ``FitbarkApi.iter_activity_records``; the
+        records not consumed are not remembered.
+        """
+        seen = self._seen.setdefault(slug, {})
+        try:
+            for record in records:
+                date = record["date"]
+                if seen.get(date) != record:
+                    seen[date] = record
+                    if self.callback is not None:
+                        self.callback(slug, record)
+                    yield record
+        finally:
+            if len(seen) > self.max_records:
+                for date in sorted(seen)[: len(seen) - self.max_records]:
+                    del seen[date]
+
+    def last(self, slug: str, date: str) -> Optional[Dict[str, Any]]:
+        """Return the last record seen of a dog and date, None if unknown."""
+        return self._seen.get(slug, {}).get(date)
+
+    def forget(self, slug: Optional[str] = None) -> None:
+        """Forget the records of a dog, or of all dogs, to report them again."""
+        if slug is None:
+            self._seen.clear()
+        else:
+            self._seen.pop(slug, None)
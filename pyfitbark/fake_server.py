@@ -0,0 +1,759 @@
+# -*- coding: utf-8 -*-
+"""PyFitBark fake server.
+
+A local stand-in of the FitBark API to develop and load test against without
+hitting the real service. :class:`FakeFitbark` holds a user, the related dogs and
+their activity: the payloads of a fixtures directory, such as
+``pyfitbark_tests/json``, are loaded as they are and any number of synthetic dogs
+are added. Activity is derived from the slug and hour, so every query of a dog
+agrees with the others and the current hour keeps growing like a live collar.
+
+:class:`FakeServer` serves it over HTTP, including ``/oauth/token``, and
+:class:`Faults` makes it slow or unreliable: added latency, 429 and 5xx
+responses, and access tokens which expire. Run it with::
+
+    python -m pyfitbark.fake_server --dogs 1000 --latency 0.05 --rate-429 0.01
+
+and point clients at it with ``FitbarkApi(..., base_url=...)``. The server
+speaks plain HTTP, set ``OAUTHLIB_INSECURE_TRANSPORT=1`` so oauthlib accepts it.
+"""
+import argparse
+import collections
+import datetime
+import hashlib
+import json
+import os
+import random
+import secrets
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qsl, urlsplit
+
+# pylint: disable=unused-import
+from typing import Tuple, List, Optional, Union, Callable, Dict, Any  # NOQA
+from typing import cast
+
+from .const import MAX_SERIES_DAYS, _endpoint_template
+
+API_PATH = "/api/v2"
+TOKEN_PATH = "/oauth/token"
+HOUR_FORMAT = "%Y-%m-%d %H:%M:%S"
+# A year, the lifetime of FitBark tokens.
+DEFAULT_TOKEN_TTL = 31557600
+
+# Share of the most active minutes of an hour spent active, by hour of the day.
+# fmt: off
+_DAY_CURVE = [
+    0.05, 0.05, 0.05, 0.05, 0.05, 0.1, 0.3, 0.6, 0.8, 0.6, 0.4, 0.4,
+    0.5, 0.4, 0.4, 0.5, 0.6, 0.8, 1.0, 0.8, 0.6, 0.4, 0.2, 0.1,
+]
+# fmt: on
+_NAMES = ["Bella", "Charlie", "Cooper", "Daisy", "Luna", "Max", "Milo", "Rose"]
+_BREEDS = [
+    {"id": 187, "name": "American Foxhound"},
+    {"id": 224, "name": "Cairn Terrier"},
+    {"id": 229, "name": "Chesapeake Bay Retriever"},
+    {"id": 240, "name": "Dachshund"},
+    {"id": 266, "name": "Labrador Retriever"},
+]
+# A 1x1 PNG.
+_PICTURE = (
+    "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAQAAAC1HAwCAAAAC0lEQVR42mNkYAAAAAYAAjCB0C8A"
+    "AAAASUVORK5CYII="
+)
+
+
+class FakeError(Exception):
+    """A request the fake API answers with an error status."""
+
+    def __init__(self, status: int, error: str, description: str = ""):
+        """Init."""
+        super().__init__(f"{status} {error}")
+        self.status = status
+        self.body = {"error": error}
+        if description:
+            self.body["error_description"] = description
+
+
+def _day(value: Any, name: str) -> datetime.date:
+    """Parse the date of a request body, ignoring any time of day."""
+    try:
+        return datetime.datetime.strptime(str(value)[:10], "%Y-%m-%d").date()
+    except ValueError:
+        raise FakeError(400, "invalid_request", f"Invalid {name} date {value!r}")
+
+
+def _days(start: datetime.date, end: datetime.date) -> List[datetime.date]:
+    """Return the days from start through end."""
+    return [
+        start + datetime.timedelta(days=offset)
+        for offset in range((end - start).days + 1)
+    ]
+
+
+class Faults:
+    """Faults injected into the responses of a :class:`FakeServer`.
+
+    The attributes may be changed while the server runs.
+
+    :param latency: seconds added to every response
+    :param jitter: up to this many more seconds, at random
+    :param rate_429: share of API requests answered 429 Too Many Requests
+    :param rate_5xx: share of API requests answered 503 Service Unavailable
+    :param retry_after: ``Retry-After`` seconds sent with a 429, None to omit it
+    :param token_ttl: seconds issued access tokens are valid; when set only
+        issued tokens are accepted, otherwise any bearer token is
+    :param seed: seed of the random faults, for repeatable runs
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        rate_429: float = 0.0,
+        rate_5xx: float = 0.0,
+        retry_after: Optional[float] = 1.0,
+        token_ttl: Optional[float] = None,
+        seed: Optional[int] = None,
+    ):
+        """Init."""
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_429 = rate_429
+        self.rate_5xx = rate_5xx
+        self.retry_after = retry_after
+        self.token_ttl = token_ttl
+        self._random = random.Random(seed)
+
+    def delay(self) -> float:
+        """Return the seconds to delay a response."""
+        return self.latency + self._random.uniform(0, self.jitter)
+
+    def error(self) -> Optional[Tuple[int, Dict[str, str]]]:
+        """Return the status and headers of an injected error, None for none."""
+        draw = self._random.random()
+        if draw < self.rate_429:
+            headers: Dict[str, str] = {}
+            if self.retry_after is not None:
+                headers["Retry-After"] = "%g" % self.retry_after
+            return 429, headers
+        if draw < self.rate_429 + self.rate_5xx:
+            return 503, {}
+        return None
+
+
+class FakeFitbark:
+    """The user, dogs and activity served by the fake API.
+
+    :param dogs: number of synthetic dogs to generate
+    :param fixtures: optional directory of response payloads named after the
+        client methods, e.g. ``get_dog.json``, whose user, dogs, relations,
+        pictures and similar dogs stats are served
+    :param seed: seed of the synthetic dogs
+    :param now: returns the current local time, activity ends there
+    """
+
+    def __init__(
+        self,
+        dogs: int = 0,
+        fixtures: Optional[str] = None,
+        seed: int = 0,
+        now: Callable[[], datetime.datetime] = datetime.datetime.now,
+    ):
+        """Init."""
+        self.now = now
+        self._lock = threading.Lock()
+        rng = random.Random(seed)
+
+        self.user: Dict[str, Any] = {
+            "slug": str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+            "username": "fake@example.com",
+            "name": "Fake User",
+            "first_name": "Fake",
+            "last_name": "User",
+            "picture_hash": hashlib.md5(_PICTURE.encode()).hexdigest(),
+        }
+        self.user_picture = _PICTURE
+        # Dogs and the relation of the user to them, by slug.
+        self.dogs: Dict[str, Dict[str, Any]] = {}
+        self.relations: Dict[str, Dict[str, Any]] = {}
+        self.user_relations: Dict[str, List[Dict[str, Any]]] = {}
+        self.pictures: Dict[str, str] = {}
+        # User set daily goals by slug and date.
+        self.goals: Dict[str, Dict[str, int]] = {}
+        self.similar_stats: Dict[str, Any] = {
+            "this_best_daily_activity": 2300,
+            "this_best_week_activity": 56000,
+            "this_current_goals_streak": 1,
+            "this_best_goals_streak": 3,
+            "this_average_daily_activity": 2100,
+            "median_same_age_weight_daily_activity": 2500,
+            "this_average_daily_rest_minutes": 60,
+            "median_same_age_weight_range_dogs_daily_rest_minutes": 54,
+            "median_all_dogs_daily_activity": 3000,
+            "median_same_breed_daily_activity": 3500,
+        }
+        self.redirect_urls = ["urn:ietf:wg:oauth:2.0:oob"]
+        # Issued access tokens: expiry time, None when they do not expire.
+        self._tokens: Dict[str, Optional[float]] = {}
+        self._refresh_tokens: Dict[str, str] = {}
+
+        if fixtures is not None:
+            self.load_fixtures(fixtures)
+        for index in range(dogs):
+            self.add_dog(self._synthetic_dog(rng, index))
+
+    def load_fixtures(self, directory: str) -> None:
+        """Serve the payloads of a fixtures directory; missing files are skipped."""
+
+        def load(name: str) -> Optional[Dict[str, Any]]:
+            path = os.path.join(directory, f"{name}.json")
+            if not os.path.exists(path):
+                return None
+            with open(path, "r") as fixture:
+                return json.load(fixture)
+
+        data = load("get_user_profile")
+        if data is not None:
+            self.user = data["user"]
+        data = load("get_user_picture")
+        if data is not None:
+            self.user_picture = data["image"]["data"]
+        data = load("get_user_related_dogs")
+        for relation in data["dog_relations"] if data is not None else []:
+            relation = dict(relation)
+            self.add_dog(relation.pop("dog"), **relation)
+        data = load("get_dog")
+        if data is not None and data["dog"]["slug"] not in self.dogs:
+            self.add_dog(data["dog"])
+        data = load("get_dog_related_users")
+        for relation in data["user_relation"] if data is not None else []:
+            self.user_relations.setdefault(relation["dog_slug"], []).append(relation)
+        data = load("get_dog_picture")
+        if data is not None:
+            self.pictures = dict.fromkeys(self.dogs, data["image"]["data"])
+        data = load("get_dog_similar_stats")
+        if data is not None:
+            self.similar_stats = data["similar_dogs_stats"]
+
+    def add_dog(
+        self,
+        dog: Dict[str, Any],
+        picture: str = _PICTURE,
+        status: str = "OWNER",
+        **relation: Any,
+    ) -> None:
+        """Relate a dog to the user.
+
+        :param dog: the dog as ``get_dog`` returns it
+        :param picture: base64 encoded picture of the dog
+        :param status: relation of the user to the dog
+        :param relation: more relation fields, ``id`` and ``date`` by default
+        """
+        slug = dog["slug"]
+        relation.setdefault("id", len(self.dogs) + 1)
+        relation.setdefault("date", "2019-01-01T00:00:00.000Z")
+        self.dogs[slug] = dog
+        self.relations[slug] = dict(relation, status=status)
+        self.pictures[slug] = picture
+
+    @staticmethod
+    def _synthetic_dog(rng: random.Random, index: int) -> Dict[str, Any]:
+        """Return a random dog."""
+        slug = str(uuid.UUID(int=rng.getrandbits(128), version=4))
+        breed1, breed2 = rng.sample(_BREEDS, 2)
+        return {
+            "slug": slug,
+            "name": f"{rng.choice(_NAMES)} {index + 1}",
+            "bluetooth_id": "%012x" % rng.getrandbits(48),
+            "activity_value": 0,
+            "birth": f"{rng.randint(2006, 2019)}-{rng.randint(1, 12):02}-"
+            f"{rng.randint(1, 28):02}",
+            "breed1": breed1,
+            "breed2": breed2,
+            "gender": rng.choice("FM"),
+            "weight": rng.randint(5, 120),
+            "weight_unit": "lbs",
+            "country": "US",
+            "zip": "64108",
+            "tzoffset": -21600,
+            "tzname": "America/Chicago",
+            "min_play": 0,
+            "min_active": 0,
+            "min_rest": 0,
+            "medical_conditions": [],
+            "hourly_average": 0,
+            "picture_hash": hashlib.md5(slug.encode()).hexdigest(),
+            "neutered": rng.choice(["True", "False"]),
+            "daily_goal": rng.randrange(1000, 8000, 100),
+            "battery_level": rng.randint(0, 100),
+            "description": "None",
+        }
+
+    def _dog(self, slug: str) -> Dict[str, Any]:
+        """Return a dog related to the user."""
+        try:
+            return self.dogs[slug]
+        except KeyError:
+            raise FakeError(404, "not_found", f"Unknown dog {slug}")
+
+    def goal(self, slug: str, day: datetime.date) -> int:
+        """Return the daily goal of a dog on a day."""
+        goals = self.goals.get(slug, {})
+        dates = [date for date in goals if date <= day.isoformat()]
+        if dates:
+            return goals[max(dates)]
+        return int(self._dog(slug).get("daily_goal") or 0)
+
+    def hour(self, slug: str, hour: datetime.datetime) -> Dict[str, Any]:
+        """Return the activity record of a dog and hour.
+
+        The record of the current hour covers the minutes elapsed so far.
+        """
+        digest = hashlib.sha1(f"{slug} {hour:%Y-%m-%d %H}".encode()).digest()
+        level = _DAY_CURVE[hour.hour]
+        active = digest[0] % (int(40 * level) + 1)
+        play = digest[1] % (int(20 * level) + 1)
+
+        minutes = 60
+        now = self.now()
+        if now < hour + datetime.timedelta(hours=1):
+            minutes = max(0, int((now - hour).total_seconds() // 60))
+            active = active * minutes // 60
+            play = play * minutes // 60
+        return {
+            "date": hour.strftime(HOUR_FORMAT),
+            "activity_value": active * 10 + play * 25 + digest[2] % 10 * minutes // 60,
+            "min_play": play,
+            "min_active": active,
+            "min_rest": minutes - active - play,
+        }
+
+    def hours(self, slug: str, day: datetime.date) -> List[Dict[str, Any]]:
+        """Return the hourly records of a dog and day, up to the current hour."""
+        start = datetime.datetime.combine(day, datetime.time())
+        now = self.now()
+        return [
+            self.hour(slug, hour)
+            for hour in (start + datetime.timedelta(hours=h) for h in range(24))
+            if hour <= now
+        ]
+
+    def day(self, slug: str, day: datetime.date) -> Optional[Dict[str, Any]]:
+        """Return the daily record of a dog, None for a future day."""
+        hours = self.hours(slug, day)
+        if not hours:
+            return None
+        record: Dict[str, Any] = {"date": day.isoformat()}
+        for key in ("activity_value", "min_play", "min_active", "min_rest"):
+            record[key] = sum(hour[key] for hour in hours)
+        record["daily_target"] = self.goal(slug, day)
+        record["has_trophy"] = int(record["activity_value"] >= record["daily_target"])
+        return record
+
+    def series(
+        self, slug: str, start: datetime.date, end: datetime.date, resolution: str
+    ) -> List[Dict[str, Any]]:
+        """Return the activity records of a dog between two days."""
+        self._dog(slug)
+        if resolution == "HOURLY":
+            return [hour for day in _days(start, end) for hour in self.hours(slug, day)]
+        days = (self.day(slug, day) for day in _days(start, end))
+        return [day for day in days if day is not None]
+
+    def authorize(self, authorization: Optional[str], strict: bool = False) -> None:
+        """Check the bearer token of a request.
+
+        :param authorization: the Authorization header
+        :param strict: accept only tokens issued by :meth:`token`
+        :raises FakeError: 401 when the token is missing, unknown or expired
+        """
+        scheme, _, token = (authorization or "").partition(" ")
+        if scheme.lower() != "bearer" or not token:
+            raise FakeError(401, "invalid_token", "Missing bearer token")
+        with self._lock:
+            known = token in self._tokens
+            expires_at = self._tokens.get(token)
+        if not known and strict:
+            raise FakeError(401, "invalid_token", "Unknown access token")
+        if expires_at is not None and expires_at <= time.time():
+            raise FakeError(401, "invalid_token", "The access token expired")
+
+    def token(
+        self, params: Dict[str, Any], ttl: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """Answer an ``/oauth/token`` request.
+
+        Any client and authorization code are accepted.
+
+        :param params: the form or JSON parameters of the request
+        :param ttl: seconds the access token is valid, a year by default
+        """
+        grant_type = params.get("grant_type")
+        if grant_type == "refresh_token":
+            with self._lock:
+                scope = self._refresh_tokens.pop(str(params.get("refresh_token")), None)
+            if scope is None and ttl is not None:
+                raise FakeError(400, "invalid_grant", "Unknown refresh token")
+        elif grant_type in ("authorization_code", "client_credentials"):
+            scope = params.get("scope")
+        else:
+            raise FakeError(400, "unsupported_grant_type")
+
+        expires_in = DEFAULT_TOKEN_TTL if ttl is None else ttl
+        token: Dict[str, Any] = {
+            "access_token": secrets.token_hex(32),
+            "token_type": "bearer",
+            "expires_in": expires_in,
+            "created_at": int(time.time()),
+        }
+        if scope:
+            token["scope"] = scope
+        with self._lock:
+            self._tokens[token["access_token"]] = (
+                None if ttl is None else time.time() + ttl
+            )
+            if grant_type != "client_credentials":
+                token["refresh_token"] = secrets.token_hex(32)
+                self._refresh_tokens[token["refresh_token"]] = scope or ""
+        return token
+
+    def handle(  # pylint: disable=too-many-return-statements
+        self, method: str, path: str, body: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """Answer an API request.
+
+        :param method: the HTTP method
+        :param path: the path below the API root, e.g. ``/dog/<slug>``
+        :param body: the JSON body of the request
+        :raises FakeError: for unknown routes, dogs and invalid bodies
+        """
+        endpoint = _endpoint_template(path)
+        slug = path.rsplit("/", 1)[-1]
+        route = (method, endpoint)
+
+        if route == ("GET", "/user"):
+            return {"user": self.user}
+        if route == ("GET", "/picture/user/{slug}"):
+            return {"image": {"data": self.user_picture}}
+        if route == ("GET", "/dog_relations"):
+            return {
+                "dog_relations": [
+                    dict(self.relations[slug], dog=dog)
+                    for slug, dog in self.dogs.items()
+                ]
+            }
+        if route == ("GET", "/dog/{slug}"):
+            return {"dog": self._dog(slug)}
+        if route == ("GET", "/picture/dog/{slug}"):
+            self._dog(slug)
+            return {"image": {"data": self.pictures[slug]}}
+        if route == ("GET", "/user_relations/{slug}"):
+            return {"user_relation": self._user_relations(slug)}
+        if endpoint == "/daily_goal/{slug}" and method in ("GET", "PUT"):
+            return {"daily_goals": self._daily_goals(slug, body, method == "PUT")}
+        if route == ("POST", "/activity_series"):
+            return {"activity_series": self._activity_series(body)}
+        if route in (("POST", "/activity_totals"), ("POST", "/time_breakdown")):
+            days = self._range(body.get("dog") or {}, "DAILY", limit=False)
+            if route[1] == "/activity_totals":
+                return {"activity_value": sum(day["activity_value"] for day in days)}
+            levels = ("min_play", "min_active", "min_rest")
+            return {
+                "activity_level": {
+                    level: sum(day[level] for day in days) for level in levels
+                }
+            }
+        if route == ("POST", "/similar_dogs_stats"):
+            self._dog(str(body.get("slug")))
+            return {"similar_dogs_stats": self.similar_stats}
+        if route == ("GET", "/redirect_urls"):
+            return {"redirect_uri": "\r".join(self.redirect_urls)}
+        if route == ("POST", "/redirect_urls"):
+            self.redirect_urls = str(body.get("redirect_uri", "")).split("\r")
+            return {"redirect_uri": "\r".join(self.redirect_urls)}
+        raise FakeError(404, "not_found", f"No route {method} {path}")
+
+    def _user_relations(self, slug: str) -> List[Dict[str, Any]]:
+        """Return the users related to a dog."""
+        self._dog(slug)
+        if slug in self.user_relations:
+            return self.user_relations[slug]
+        user = {
+            key: self.user.get(key)
+            for key in ("slug", "username", "name", "first_name", "last_name")
+        }
+        relation = self.relations[slug]
+        return [
+            {
+                "id": relation["id"],
+                "date": relation["date"],
+                "dog_slug": slug,
+                "status": relation["status"],
+                "user": user,
+            }
+        ]
+
+    def _daily_goals(
+        self, slug: str, body: Dict[str, Any], update: bool
+    ) -> List[Dict[str, Any]]:
+        """Set a daily goal and return the goals from today on."""
+        self._dog(slug)
+        today = self.now().date()
+        if update:
+            day = _day(body.get("date"), "goal")
+            goal = body.get("daily_goal")
+            if day < today:
+                raise FakeError(400, "invalid_request", "The date is in the past")
+            if not isinstance(goal, int) or goal <= 0:
+                raise FakeError(400, "invalid_request", "The goal must be positive")
+            with self._lock:
+                self.goals.setdefault(slug, {})[day.isoformat()] = goal
+
+        dates = sorted(d for d in self.goals.get(slug, {}) if d > today.isoformat())
+        return [{"goal": self.goal(slug, today), "date": today.isoformat()}] + [
+            {"goal": self.goals[slug][date], "date": date} for date in dates
+        ]
+
+    def _activity_series(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        """Answer an activity_series request."""
+        query = body.get("activity_series") or {}
+        resolution = query.get("resolution", "DAILY")
+        if resolution not in MAX_SERIES_DAYS:
+            raise FakeError(400, "invalid_request", f"Bad resolution {resolution}")
+        return {
+            "slug": query.get("slug"),
+            "records": self._range(query, resolution, limit=True),
+        }
+
+    def _range(
+        self, query: Dict[str, Any], resolution: str, limit: bool
+    ) -> List[Dict[str, Any]]:
+        """Return the records of the dog and date range of a request."""
+        start = _day(query.get("from"), "from")
+        end = _day(query.get("to"), "to")
+        if end < start:
+            raise FakeError(400, "invalid_request", "The to date is before from")
+        if limit and (end - start).days >= MAX_SERIES_DAYS[resolution]:
+            raise FakeError(
+                400,
+                "invalid_request",
+                f"At most {MAX_SERIES_DAYS[resolution]} days of {resolution} data",
+            )
+        return self.series(str(query.get("slug")), start, end, resolution)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """Answer requests with the data of the server's :class:`FakeFitbark`."""
+
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately, do not let Nagle delay the body.
+    disable_nagle_algorithm = True
+    server: "FakeServer"
+
+    def _body(self) -> Dict[str, Any]:
+        """Read the JSON or form encoded body of the request."""
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        if not raw:
+            return {}
+        if "json" in (self.headers.get("Content-Type") or ""):
+            try:
+                body = json.loads(raw.decode())
+            except ValueError:
+                raise FakeError(400, "invalid_request", "Invalid JSON")
+            return body if isinstance(body, dict) else {}
+        return dict(parse_qsl(raw.decode()))
+
+    def _reply(self, method: str) -> None:
+        """Answer a request, injecting the faults of the server."""
+        server = self.server
+        path = urlsplit(self.path).path
+        headers: Dict[str, str] = {}
+        endpoint = TOKEN_PATH
+
+        delay = server.faults.delay()
+        if delay > 0:
+            time.sleep(delay)
+
+        try:
+            body = self._body()
+            if path == TOKEN_PATH and method == "POST":
+                status, data = 200, server.fake.token(body, server.faults.token_ttl)
+            elif path.startswith(API_PATH + "/"):
+                path = path[len(API_PATH) :]
+                endpoint = _endpoint_template(path)
+                error = server.faults.error()
+                if error is not None:
+                    status, headers = error
+                    raise FakeError(status, "injected_fault")
+                server.fake.authorize(
+                    self.headers.get("Authorization"),
+                    strict=server.faults.token_ttl is not None,
+                )
+                status, data = 200, server.fake.handle(method, path, body)
+            else:
+                endpoint = path
+                raise FakeError(404, "not_found", f"No route {method} {path}")
+        except FakeError as err:
+            status, data = err.status, err.body
+            if status == 401:
+                headers["WWW-Authenticate"] = 'Bearer error="invalid_token"'
+
+        server.count(method, endpoint, status)
+        content = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_GET(self) -> None:  # pylint: disable=invalid-name
+        """Answer a GET request."""
+        self._reply("GET")
+
+    def do_POST(self) -> None:  # pylint: disable=invalid-name
+        """Answer a POST request."""
+        self._reply("POST")
+
+    def do_PUT(self) -> None:  # pylint: disable=invalid-name
+        """Answer a PUT request."""
+        self._reply("PUT")
+
+    def log_message(self, *args: Any) -> None:
+        """Log requests only when the server is verbose."""
+        if self.server.verbose:
+            super().log_message(*args)
+
+
+class FakeServer(ThreadingMixIn, HTTPServer):
+    """Serve a :class:`FakeFitbark` over HTTP/1.1 with keep-alive.
+
+    Used as a context manager it serves from a background thread.
+
+    :param fake: the data served, an empty :class:`FakeFitbark` by default
+    :param host: interface to listen on
+    :param port: port to listen on, a free one by default
+    :param faults: faults to inject, none by default
+    :param verbose: log every request to stderr
+    """
+
+    daemon_threads = True
+    # Concurrent clients open many connections at once.
+    request_queue_size = 1024
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        fake: Optional[FakeFitbark] = None,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        faults: Optional[Faults] = None,
+        verbose: bool = False,
+    ):
+        """Init."""
+        self.fake = fake if fake is not None else FakeFitbark()
+        self.faults = faults if faults is not None else Faults()
+        self.verbose = verbose
+        # Responses by (method, endpoint, status).
+        self.counts: Dict[Tuple[str, str, int], int] = collections.Counter()
+        self._counts_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        super().__init__((host, port), _Handler)
+
+    @property
+    def base_url(self) -> str:
+        """Return the root of the API, to pass as ``base_url`` to the clients."""
+        host, port = cast(Tuple[str, int], self.server_address[:2])
+        return f"http://{host}:{port}{API_PATH}"
+
+    def count(self, method: str, endpoint: str, status: int) -> None:
+        """Count a response."""
+        with self._counts_lock:
+            self.counts[(method, endpoint, status)] += 1
+
+    def start(self) -> None:
+        """Serve from a background thread."""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop serving and close the socket."""
+        if self._thread is not None:
+            self.shutdown()
+            self._thread.join()
+            self._thread = None
+        self.server_close()
+
+    def __enter__(self) -> "FakeServer":
+        """Start serving."""
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        """Stop serving."""
+        self.stop()
+
+
+def main(args: List[str]) -> None:
+    """Run a fake server until interrupted."""
+    parser = argparse.ArgumentParser(
+        prog="python -m pyfitbark.fake_server", description=__doc__.split("\n")[0]
+    )
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to listen on.")
+    parser.add_argument("--port", type=int, default=8080, help="Port to listen on.")
+    parser.add_argument(
+        "--dogs", type=int, default=10, help="Number of synthetic dogs."
+    )
+    parser.add_argument("--fixtures", help="Directory of payloads to serve.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the data.")
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="Seconds added to responses."
+    )
+    parser.add_argument(
+        "--jitter", type=float, default=0.0, help="Random seconds added on top."
+    )
+    parser.add_argument(
+        "--rate-429", type=float, default=0.0, help="Share of requests answered 429."
+    )
+    parser.add_argument(
+        "--rate-5xx", type=float, default=0.0, help="Share of requests answered 503."
+    )
+    parser.add_argument(
+        "--retry-after", type=float, default=1.0, help="Retry-After of 429s."
+    )
+    parser.add_argument(
+        "--token-ttl", type=float, help="Seconds until issued tokens expire."
+    )
+    parser.add_argument(
+        "-v", "--verbose", action="store_true", help="Log every request."
+    )
+    opts = parser.parse_args(args)
+
+    fake = FakeFitbark(dogs=opts.dogs, fixtures=opts.fixtures, seed=opts.seed)
+    faults = Faults(
+        latency=opts.latency,
+        jitter=opts.jitter,
+        rate_429=opts.rate_429,
+        rate_5xx=opts.rate_5xx,
+        retry_after=opts.retry_after,
+        token_ttl=opts.token_ttl,
+        seed=opts.seed,
+    )
+    server = FakeServer(fake, opts.host, opts.port, faults, verbose=opts.verbose)
+    print(f"Serving {len(fake.dogs)} dogs at {server.base_url}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,360 @@
+# -*- coding: utf-8 -*-
+"""PyFitBark request metrics.
+
+``FitbarkApi`` reports each request to its ``before_request`` and
+``after_request`` hooks as a :class:`RequestEvent`: the endpoint with the slug
+stripped, method, status, latency, bytes sent and received, retries, cache result
+and token refreshes. :class:`Metrics` is an after hook aggregating them into
+counters and latency histograms, exported in the Prometheus text format to a file
+or served on a local port by :class:`MetricsServer`::
+
+    metrics = Metrics()
+    api = FitbarkApi(client_id, client_secret, after_request=metrics.observe)
+    ...
+    metrics.write("/var/lib/node_exporter/pyfitbark.prom")
+"""
+import bisect
+import collections
+import os
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+# pylint: disable=unused-import
+from typing import Tuple, List, Optional, Union, Callable, Dict, Any  # NOQA
+from typing import Iterable, cast
+
+# Upper bounds, in seconds, of the latency histogram buckets.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class RequestEvent:
+    """A request made by a client.
+
+    The before hook is called with the method and endpoint set, the after hook
+    once the request completed or failed, with every field set.
+
+    :ivar method: the HTTP method, upper case
+    :ivar endpoint: the path below the API root with the slug stripped, e.g.
+        ``/dog/{slug}``, or the path of the OAuth endpoints
+    :ivar status: the status of the response, None if the request failed
+    :ivar latency: seconds taken, retries and cache lookups included
+    :ivar bytes_in: bytes of the response bodies received, 0 for a cache hit
+    :ivar bytes_out: bytes of the request bodies sent
+    :ivar retries: retries after the first attempt
+    :ivar cache: ``"hit"``, ``"miss"`` or ``"revalidated"`` for a 304 answered
+        from the cache; None when the request is not cached
+    :ivar token_refreshes: token refreshes the request made
+    :ivar error: the exception the request raised, if any
+    """
+
+    __slots__ = (
+        "method",
+        "endpoint",
+        "status",
+        "latency",
+        "bytes_in",
+        "bytes_out",
+        "retries",
+        "cache",
+        "token_refreshes",
+        "error",
+    )
+
+    def __init__(self, method: str, endpoint: str):
+        """Init."""
+        self.method = method.upper()
+        self.endpoint = endpoint
+        self.status: Optional[int] = None
+        self.latency = 0.0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.retries = 0
+        self.cache: Optional[str] = None
+        self.token_refreshes = 0
+        self.error: Optional[BaseException] = None
+
+    def add_response(self, response: Any, stream: bool = False) -> None:
+        """Count the bytes of one attempt's request and response.
+
+        :param response: a requests response
+        :param stream: the body is streamed, count its Content-Length instead of
+            reading it
+        """
+        body = response.request.body if response.request is not None else None
+        if isinstance(body, str):
+            body = body.encode()
+        self.bytes_out += len(body or b"")
+        if stream:
+            self.bytes_in += int(response.headers.get("Content-Length") or 0)
+        else:
+            self.bytes_in += len(response.content or b"")
+
+    def __repr__(self) -> str:
+        """Return the representation of the event."""
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"RequestEvent({fields})"
+
+
+class Histogram:
+    """Counts of observations at most each bucket's upper bound.
+
+    :param buckets: increasing upper bounds, an infinite bucket is added
+    """
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Iterable[float] = DEFAULT_BUCKETS):
+        """Init."""
+        self.buckets = sorted(buckets)
+        # Not cumulative, the last count is of the infinite bucket.
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        """Add an observation."""
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> List[Tuple[float, int]]:
+        """Return the upper bounds and the observations at most each."""
+        total = 0
+        result = []
+        for bound, count in zip(self.buckets + [float("inf")], self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+    def quantile(self, q: float) -> float:
+        """Return the upper bound of the bucket holding the q quantile."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        for bound, total in self.cumulative():
+            if total >= rank:
+                return bound
+        return float("inf")  # pragma: no cover
+
+
+def _labels(**labels: Any) -> str:
+    """Return Prometheus labels, escaping their values."""
+    pairs = []
+    for name, value in labels.items():
+        value = str(value).replace("\\", r"\\").replace("\n", r"\n")
+        pairs.append('%s="%s"' % (name, value.replace('"', r"\"")))
+    return "{" + ",".join(pairs) + "}"
+
+
+def _number(value: float) -> str:
+    """Return a sample value or bucket bound in the Prometheus format."""
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metrics:
+    """Aggregate the requests of clients into counters and latency histograms.
+
+    Pass ``observe`` as the ``after_request`` hook of one or more clients.
+
+    :param buckets: upper bounds, in seconds, of the latency histogram buckets
+    :param prefix: prefix of the exported metric names
+    """
+
+    def __init__(
+        self, buckets: Iterable[float] = DEFAULT_BUCKETS, prefix: str = "pyfitbark"
+    ):
+        """Init."""
+        self.buckets = list(buckets)
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """Drop every observation."""
+        with self._lock:
+            # Requests by (method, endpoint, status); status is "error" on failure.
+            self.requests: Dict[Tuple[str, str, str], int] = collections.Counter()
+            self.retries: Dict[Tuple[str, str], int] = collections.Counter()
+            self.bytes_in: Dict[Tuple[str, str], int] = collections.Counter()
+            self.bytes_out: Dict[Tuple[str, str], int] = collections.Counter()
+            # Cached requests by (endpoint, result).
+            self.cache: Dict[Tuple[str, str], int] = collections.Counter()
+            self.token_refreshes = 0
+            self.latency: Dict[Tuple[str, str], Histogram] = {}
+
+    def observe(self, event: RequestEvent) -> None:
+        """Add a completed request."""
+        key = (event.method, event.endpoint)
+        status = "error" if event.status is None else str(event.status)
+        with self._lock:
+            self.requests[key + (status,)] += 1
+            self.retries[key] += event.retries
+            self.bytes_in[key] += event.bytes_in
+            self.bytes_out[key] += event.bytes_out
+            if event.cache is not None:
+                self.cache[(event.endpoint, event.cache)] += 1
+            self.token_refreshes += event.token_refreshes
+            histogram = self.latency.get(key)
+            if histogram is None:
+                histogram = self.latency[key] = Histogram(self.buckets)
+            histogram.observe(event.latency)
+
+    def prometheus(self) -> str:
+        """Return the metrics in the Prometheus text exposition format."""
+        lines: List[str] = []
+
+        def family(name: str, kind: str, help_text: str) -> str:
+            name = f"{self.prefix}_{name}"
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            return name
+
+        def counter(
+            name: str, help_text: str, samples: Dict[Any, int], labels: Tuple[str, ...]
+        ) -> None:
+            name = family(name, "counter", help_text)
+            for key in sorted(samples):
+                lines.append(
+                    f"{name}{_labels(**dict(zip(labels, key)))} {samples[key]}"
+                )
+
+        with self._lock:
+            counter(
+                "requests_total",
+                "Requests made, by method, endpoint and status.",
+                self.requests,
+                ("method", "endpoint", "status"),
+            )
+            counter(
+                "request_retries_total",
+                "Retries after the first attempt of requests.",
+                self.retries,
+                ("method", "endpoint"),
+            )
+            counter(
+                "request_bytes_total",
+                "Bytes of the request bodies sent.",
+                self.bytes_out,
+                ("method", "endpoint"),
+            )
+            counter(
+                "response_bytes_total",
+                "Bytes of the response bodies received.",
+                self.bytes_in,
+                ("method", "endpoint"),
+            )
+            counter(
+                "cache_requests_total",
+                "Cacheable requests, by endpoint and cache result.",
+                self.cache,
+                ("endpoint", "result"),
+            )
+            name = family("token_refreshes_total", "counter", "Token refreshes.")
+            lines.append(f"{name} {self.token_refreshes}")
+
+            name = family(
+                "request_duration_seconds",
+                "histogram",
+                "Request latency, retries and cache lookups included.",
+            )
+            for (method, endpoint), histogram in sorted(self.latency.items()):
+                for bound, total in histogram.cumulative():
+                    labels = _labels(
+                        method=method, endpoint=endpoint, le=_number(bound)
+                    )
+                    lines.append(f"{name}_bucket{labels} {total}")
+                labels = _labels(method=method, endpoint=endpoint)
+                lines.append(f"{name}_sum{labels} {_number(histogram.sum)}")
+                lines.append(f"{name}_count{labels} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str) -> None:
+        """Write the metrics to a file, e.g. for the node exporter textfile collector.
+
+        The file is replaced atomically so it is never read half written.
+        """
+        directory = os.path.dirname(os.path.abspath(path))
+        handle, tmp = tempfile.mkstemp(
+            dir=directory, prefix=".pyfitbark-", suffix=".prom"
+        )
+        try:
+            with os.fdopen(handle, "w") as out:
+                out.write(self.prometheus())
+            os.chmod(tmp, 0o644)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """Answer scrapes of ``/metrics``."""
+
+    server: "MetricsServer"
+
+    def do_GET(self) -> None:  # pylint: disable=invalid-name
+        """Answer a GET request."""
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = self.server.metrics.prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args: Any) -> None:
+        """Do not log scrapes."""
+
+
+class MetricsServer(ThreadingMixIn, HTTPServer):
+    """Serve metrics at ``/metrics`` for Prometheus to scrape.
+
+    Used as a context manager it serves from a background thread.
+
+    :param metrics: the metrics served
+    :param host: interface to listen on, localhost by default
+    :param port: port to listen on, a free one if 0
+    """
+
+    daemon_threads = True
+
+    def __init__(self, metrics: Metrics, host: str = "127.0.0.1", port: int = 9464):
+        """Init."""
+        self.metrics = metrics
+        self._thread: Optional[threading.Thread] = None
+        super().__init__((host, port), _Handler)
+
+    @property
+    def url(self) -> str:
+        """Return the URL of the metrics."""
+        host, port = cast(Tuple[str, int], self.server_address[:2])
+        return f"http://{host}:{port}/metrics"
+
+    def start(self) -> None:
+        """Serve from a background thread."""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop serving and close the socket."""
+        if self._thread is not None:
+            self.shutdown()
+            self._thread.join()
+            self._thread = None
+        self.server_close()
+
+    def __enter__(self) -> "MetricsServer":
+        """Start serving."""
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        """Stop serving."""
+        self.stop()
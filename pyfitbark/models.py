@@ -0,0 +1,295 @@
+# -*- coding: utf-8 -*-
+"""PyFitBark response models.
+
+Typed, slotted views of the JSON the API returns. :class:`Dog`, :class:`User` and
+the other small models wrap the response dict, available as ``raw``, and read
+their fields from it on access. :class:`ActivityRecord`, of which there can be
+hundreds of thousands, copies the fields of a record into slots instead so the
+dict can be released.
+"""
+
+# pylint: disable=unused-import
+from typing import Tuple, List, Optional, Union, Callable, Dict, Any  # NOQA
+from typing import Generic, Iterator, NamedTuple, TypeVar, overload
+
+T = TypeVar("T")
+
+
+def _bool(value: Any) -> bool:
+    """Return a flag which the API may send as a string, e.g. "True"."""
+    if isinstance(value, str):
+        return value.lower() == "true"
+    return bool(value)
+
+
+class _Field(Generic[T]):
+    """Read a key of the wrapped dict, converting it when set."""
+
+    __slots__ = ("key", "convert")
+
+    def __init__(self, key: str, convert: Optional[Callable[[Any], T]] = None):
+        """Init."""
+        self.key = key
+        self.convert = convert
+
+    @overload
+    def __get__(self, obj: None, owner: Any) -> "_Field[T]": ...  # pragma: no cover
+
+    @overload
+    def __get__(self, obj: Any, owner: Any) -> Optional[T]: ...  # pragma: no cover
+
+    def __get__(self, obj: Any, owner: Any) -> Any:
+        """Return the value of the field, None when missing; the field on the class."""
+        if obj is None:
+            return self
+        value = obj.raw.get(self.key)
+        if value is None or self.convert is None:
+            return value
+        return self.convert(value)
+
+
+class Model:
+    """A response dict with typed attribute access.
+
+    :param raw: the dict returned by the API
+    """
+
+    __slots__ = ("raw",)
+
+    def __init__(self, raw: Dict[str, Any]):
+        """Init."""
+        self.raw = raw
+
+    def __repr__(self) -> str:
+        """Return the representation of the model."""
+        return f"{type(self).__name__}({self.raw!r})"
+
+    def __eq__(self, other: Any) -> bool:
+        """Return True if both models wrap equal dicts."""
+        return type(other) is type(self) and other.raw == self.raw
+
+    def __getitem__(self, key: str) -> Any:
+        """Return a key of the raw dict."""
+        return self.raw[key]
+
+
+class User(Model):
+    """A FitBark user."""
+
+    __slots__ = ()
+
+    slug: _Field[str] = _Field("slug")
+    username: _Field[str] = _Field("username")
+    name: _Field[str] = _Field("name")
+    first_name: _Field[str] = _Field("first_name")
+    last_name: _Field[str] = _Field("last_name")
+    picture_hash: _Field[str] = _Field("picture_hash")
+
+    @classmethod
+    def from_response(cls, data: Dict[str, Any]) -> "User":
+        """Build from a ``get_user_profile`` response."""
+        return cls(data["user"])
+
+
+class Dog(Model):
+    """A dog and the latest activity of its collar."""
+
+    __slots__ = ()
+
+    slug: _Field[str] = _Field("slug")
+    name: _Field[str] = _Field("name")
+    bluetooth_id: _Field[str] = _Field("bluetooth_id")
+    birth: _Field[str] = _Field("birth")
+    breed1: _Field[Dict[str, Any]] = _Field("breed1")
+    breed2: _Field[Dict[str, Any]] = _Field("breed2")
+    gender: _Field[str] = _Field("gender")
+    weight: _Field[float] = _Field("weight")
+    weight_unit: _Field[str] = _Field("weight_unit")
+    country: _Field[str] = _Field("country")
+    zip: _Field[str] = _Field("zip")
+    tzoffset: _Field[int] = _Field("tzoffset", int)
+    tzname: _Field[str] = _Field("tzname")
+    medical_conditions: _Field[List[Dict[str, Any]]] = _Field("medical_conditions")
+    neutered: _Field[bool] = _Field("neutered", _bool)
+    description: _Field[str] = _Field("description")
+    picture_hash: _Field[str] = _Field("picture_hash")
+    activity_value: _Field[int] = _Field("activity_value", int)
+    activity_date: _Field[str] = _Field("activity_date")
+    min_play: _Field[int] = _Field("min_play", int)
+    min_active: _Field[int] = _Field("min_active", int)
+    min_rest: _Field[int] = _Field("min_rest", int)
+    hourly_average: _Field[int] = _Field("hourly_average", int)
+    daily_goal: _Field[int] = _Field("daily_goal", int)
+    battery_level: _Field[int] = _Field("battery_level", int)
+    last_min_time: _Field[str] = _Field("last_min_time")
+    last_min_activity: _Field[int] = _Field("last_min_activity", int)
+    last_sync: _Field[str] = _Field("last_sync")
+
+    @classmethod
+    def from_response(cls, data: Dict[str, Any]) -> "Dog":
+        """Build from a ``get_dog`` response."""
+        return cls(data["dog"])
+
+
+class DogRelation(Model):
+    """The relation of the user to a dog, from ``get_user_related_dogs``."""
+
+    __slots__ = ()
+
+    id: _Field[int] = _Field("id", int)
+    status: _Field[str] = _Field("status")
+    date: _Field[str] = _Field("date")
+    dog: _Field[Dog] = _Field("dog", Dog)
+
+    @classmethod
+    def from_response(cls, data: Dict[str, Any]) -> List["DogRelation"]:
+        """Build from a ``get_user_related_dogs`` response."""
+        return [cls(relation) for relation in data["dog_relations"]]
+
+
+class UserRelation(Model):
+    """The relation of a user to a dog, from ``get_dog_related_users``."""
+
+    __slots__ = ()
+
+    id: _Field[int] = _Field("id", int)
+    status: _Field[str] = _Field("status")
+    date: _Field[str] = _Field("date")
+    dog_slug: _Field[str] = _Field("dog_slug")
+    user: _Field[User] = _Field("user", User)
+
+    @classmethod
+    def from_response(cls, data: Dict[str, Any]) -> List["UserRelation"]:
+        """Build from a ``get_dog_related_users`` response."""
+        return [cls(relation) for relation in data["user_relation"]]
+
+
+class DailyGoal(Model):
+    """A daily goal and the day it starts."""
+
+    __slots__ = ()
+
+    goal: _Field[int] = _Field("goal", int)
+    date: _Field[str] = _Field("date")
+
+    @classmethod
+    def from_response(cls, data: Dict[str, Any]) -> List["DailyGoal"]:
+        """Build from a ``get_daily_goal`` response."""
+        return [cls(goal) for goal in data["daily_goals"]]
+
+
+class Picture(Model):
+    """A base64 encoded picture."""
+
+    __slots__ = ()
+
+    data: _Field[str] = _Field("data")
+
+    @classmethod
+    def from_response(cls, data: Dict[str, Any]) -> "Picture":
+        """Build from a ``get_dog_picture`` or ``get_user_picture`` response."""
+        return cls(data["image"])
+
+
+class TimeBreakdown(Model):
+    """Minutes spent at each activity level."""
+
+    __slots__ = ()
+
+    min_play: _Field[int] = _Field("min_play", int)
+    min_active: _Field[int] = _Field("min_active", int)
+    min_rest: _Field[int] = _Field("min_rest", int)
+
+    @classmethod
+    def from_response(cls, data: Dict[str, Any]) -> "TimeBreakdown":
+        """Build from a ``get_time_breakdown`` response."""
+        return cls(data["activity_level"])
+
+
+class BulkResult(NamedTuple):
+    """Outcome of one slug in a bulk request.
+
+    Exactly one of ``data`` and ``error`` is set.
+    """
+
+    slug: str
+    data: Any
+    error: Optional[Exception]
+
+
+class ActivityRecord:
+    """One day or hour of an activity series.
+
+    The fields are copied into slots; keys the model does not know are kept in
+    ``extra`` so ``raw`` can rebuild the record.
+    """
+
+    __slots__ = (
+        "date",
+        "activity_value",
+        "min_play",
+        "min_active",
+        "min_rest",
+        "daily_target",
+        "has_trophy",
+        "extra",
+    )
+    FIELDS = __slots__[:-1]
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        date: str,
+        activity_value: int = 0,
+        min_play: int = 0,
+        min_active: int = 0,
+        min_rest: int = 0,
+        daily_target: int = 0,
+        has_trophy: bool = False,
+        extra: Optional[Dict[str, Any]] = None,
+    ):
+        """Init."""
+        self.date = date
+        self.activity_value = activity_value
+        self.min_play = min_play
+        self.min_active = min_active
+        self.min_rest = min_rest
+        self.daily_target = daily_target
+        self.has_trophy = has_trophy
+        self.extra = extra
+
+    @classmethod
+    def from_dict(cls, record: Dict[str, Any]) -> "ActivityRecord":
+        """Build from an ``activity_series`` record."""
+        extra = {key: value for key, value in record.items() if key not in cls.FIELDS}
+        return cls(
+            record["date"],
+            int(record.get("activity_value") or 0),
+            int(record.get("min_play") or 0),
+            int(record.get("min_active") or 0),
+            int(record.get("min_rest") or 0),
+            int(record.get("daily_target") or 0),
+            _bool(record.get("has_trophy")),
+            extra or None,
+        )
+
+    @classmethod
+    def from_response(cls, data: Dict[str, Any]) -> Iterator["ActivityRecord"]:
+        """Yield the records of a ``get_activity_series`` response."""
+        for record in data["activity_series"]["records"]:
+            yield cls.from_dict(record)
+
+    @property
+    def raw(self) -> Dict[str, Any]:
+        """Return the record as the API returns it."""
+        record = {name: getattr(self, name) for name in self.FIELDS}
+        record["has_trophy"] = int(self.has_trophy)
+        record.update(self.extra or {})
+        return record
+
+    def __repr__(self) -> str:
+        """Return the representation of the record."""
+        return f"ActivityRecord({self.raw!r})"
+
+    def __eq__(self, other: Any) -> bool:
+        """Return True if both records are equal."""
+        return isinstance(other, ActivityRecord) and other.raw == self.raw
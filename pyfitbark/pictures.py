@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+"""PyFitBark pictures.
+
+Picture endpoints return the image base64 encoded inside JSON. :class:`PictureDecoder`
+decodes it while the response is downloaded so the encoded text is never held in
+memory, and :class:`PictureCache` keeps the decoded images on disk by slug and hash.
+"""
+import binascii
+import hashlib
+import os
+import re
+import tempfile
+
+# pylint: disable=unused-import
+from typing import Tuple, List, Optional, Union, Callable, Dict, Any  # NOQA
+from typing import IO, Iterable, Match
+
+# Start of the image in a {"image": {"data": "..."}} response.
+_DATA_START = re.compile(rb'"data"\s*:\s*"')
+# JSON escapes which may appear in the encoded image, only \/ is kept.
+_ESCAPE = re.compile(rb"\\(.)", re.DOTALL)
+
+
+def _unescape(match: Match[bytes]) -> bytes:
+    return b"/" if match.group(1) == b"/" else b""
+
+
+class PictureDecoder:
+    """Decode the image of a picture response fed in chunks.
+
+    :param out: binary file the decoded image is written to
+    """
+
+    def __init__(self, out: IO[bytes]):
+        """Init."""
+        self._out = out
+        self._head = b""
+        self._escape = b""
+        self._rest = b""
+        self._started = False
+        self.done = False
+        self.size = 0
+        self.sha256 = hashlib.sha256()
+
+    def feed(self, chunk: bytes) -> None:
+        """Decode the next chunk of the response body."""
+        if self.done:
+            return
+
+        if not self._started:
+            self._head += chunk
+            match = _DATA_START.search(self._head)
+            if match is None:
+                return
+            self._started = True
+            chunk = self._head[match.end() :]
+            self._head = b""
+
+        data = self._escape + chunk
+        self._escape = b""
+        end = data.find(b'"')
+        if end != -1:
+            data = data[:end]
+            self.done = True
+        elif data.endswith(b"\\"):
+            # The escaped character is in the next chunk.
+            data, self._escape = data[:-1], b"\\"
+
+        data = self._rest + _ESCAPE.sub(_unescape, data)
+        if self.done:
+            self._rest = b""
+            data += b"=" * (-len(data) % 4)
+        else:
+            cut = len(data) - len(data) % 4
+            data, self._rest = data[:cut], data[cut:]
+        self._write(data)
+
+    def close(self) -> str:
+        """Finish decoding.
+
+        :return: sha256 hex digest of the image
+        :rtype: str
+        """
+        if not self.done:
+            raise ValueError("The response does not contain a picture")
+        return self.sha256.hexdigest()
+
+    def _write(self, data: bytes) -> None:
+        """Decode base64 data and write it out."""
+        if not data:
+            return
+        try:
+            image = binascii.a2b_base64(data)
+        except binascii.Error as err:
+            raise ValueError("Invalid picture data") from err
+        self._out.write(image)
+        self.sha256.update(image)
+        self.size += len(image)
+
+
+def decode_picture(chunks: Iterable[bytes], out: IO[bytes]) -> str:
+    """Decode a picture response body into a binary file.
+
+    :param chunks: the response body in chunks
+    :param out: binary file the image is written to
+    :return: sha256 hex digest of the image
+    :rtype: str
+    """
+    decoder = PictureDecoder(out)
+    for chunk in chunks:
+        decoder.feed(chunk)
+        if decoder.done:
+            break
+    return decoder.close()
+
+
+def _decode_to_temp(chunks: Iterable[bytes], directory: str) -> Tuple[str, str]:
+    """Decode a picture response body into a new temporary file.
+
+    :return: path of the temporary file and sha256 hex digest of the image
+    """
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".picture-")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            digest = decode_picture(chunks, out)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return tmp, digest
+
+
+def write_picture(chunks: Iterable[bytes], path: str) -> str:
+    """Decode a picture response body into a file, replacing it atomically.
+
+    The image is written to a temporary file next to ``path`` which is renamed
+    once complete, so readers never see a partial picture.
+
+    :return: sha256 hex digest of the image
+    :rtype: str
+    """
+    tmp, digest = _decode_to_temp(chunks, os.path.dirname(os.path.abspath(path)))
+    os.replace(tmp, path)
+    return digest
+
+
+class PictureCache:
+    """Decoded pictures stored on disk as ``<directory>/<slug>/<hash>``.
+
+    The hash is the ``picture_hash`` reported by the API when known, otherwise
+    the sha256 of the image.
+
+    :param directory: root directory of the cache, created if missing
+    """
+
+    def __init__(self, directory: str):
+        """Init."""
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, slug: str, picture_hash: str) -> str:
+        """Return the path of a picture in the cache."""
+        for part in (slug, picture_hash):
+            if not part or os.sep in part or part in (".", ".."):
+                raise ValueError(f"Invalid picture key {part!r}")
+        return os.path.join(self.directory, slug, picture_hash)
+
+    def get(self, slug: str, picture_hash: Optional[str]) -> Optional[str]:
+        """Return the path of a cached picture, or None."""
+        if not picture_hash:
+            return None
+        path = self.path(slug, picture_hash)
+        return path if os.path.isfile(path) else None
+
+    def add(
+        self, slug: str, chunks: Iterable[bytes], picture_hash: Optional[str] = None
+    ) -> str:
+        """Decode a picture response body into the cache.
+
+        :param slug: uuid of the user or dog
+        :param chunks: the response body in chunks
+        :param picture_hash: key of the picture, defaults to the sha256 of the image
+        :return: path of the cached picture
+        :rtype: str
+        """
+        if picture_hash:
+            self.path(slug, picture_hash)
+        directory = os.path.join(self.directory, slug)
+        os.makedirs(directory, exist_ok=True)
+
+        tmp, digest = _decode_to_temp(chunks, directory)
+        path = self.path(slug, picture_hash or digest)
+        os.replace(tmp, path)
+        return path
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""PyFitBark retry policy.
+
+Describes which failed requests are retried and how long to wait in between,
+using exponential backoff with full jitter and honoring ``Retry-After``.
+"""
+import datetime
+import random
+from email.utils import parsedate_to_datetime
+
+# pylint: disable=unused-import
+from typing import Tuple, List, Optional, Union, Callable, Dict, Any  # NOQA
+from typing import Iterable
+
+# Methods which may safely be sent twice.
+IDEMPOTENT_METHODS = ("get", "head", "options", "put", "delete")
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Return the seconds to wait from a Retry-After header, or None."""
+    if not value:
+        return None
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=datetime.timezone.utc)
+    now = datetime.datetime.now(datetime.timezone.utc)
+    return max(0.0, (date - now).total_seconds())
+
+
+class RetryPolicy:
+    """Retry transient failures with exponential backoff.
+
+    :param total: number of retries after the first attempt
+    :param backoff_factor: base delay in seconds, attempt ``n`` waits a random time
+        up to ``backoff_factor * 2 ** n``
+    :param max_backoff: longest computed delay in seconds
+    :param max_retry_after: longest ``Retry-After`` honored, in seconds; longer
+        requests give up instead of waiting
+    :param statuses: response statuses which are retried
+    :param methods: methods which are retried, idempotent ones by default; add
+        ``"post"`` to opt in for the read-only POST endpoints
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        total: int = 3,
+        backoff_factor: float = 0.5,
+        max_backoff: float = 30.0,
+        max_retry_after: float = 300.0,
+        statuses: Iterable[int] = RETRY_STATUSES,
+        methods: Iterable[str] = IDEMPOTENT_METHODS,
+    ):
+        """Init."""
+        self.total = total
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.max_retry_after = max_retry_after
+        self.statuses = frozenset(statuses)
+        self.methods = frozenset(method.lower() for method in methods)
+
+    def allows(self, method: str, retries: int) -> bool:
+        """Return True if a request which failed ``retries`` times may be retried."""
+        return method.lower() in self.methods and retries < self.total
+
+    def retry_status(self, status: int) -> bool:
+        """Return True if a response with this status should be retried."""
+        return status in self.statuses
+
+    def delay(self, retries: int, retry_after: Optional[str] = None) -> Optional[float]:
+        """Return the seconds to wait before the next attempt.
+
+        :param retries: number of retries already made
+        :param retry_after: value of the response's Retry-After header
+        :return: delay in seconds, None when the server asks to wait too long
+        """
+        wait = parse_retry_after(retry_after)
+        if wait is not None:
+            return wait if wait <= self.max_retry_after else None
+
+        ceiling = min(self.max_backoff, self.backoff_factor * 2**retries)
+        return random.uniform(0, ceiling)
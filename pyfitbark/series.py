@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+"""PyFitBark columnar activity series.
+
+:class:`ActivitySeries` stores ``activity_series`` records column by column in
+compact typed arrays. NumPy arrays are used when NumPy is installed, otherwise
+the stdlib :mod:`array` module.
+"""
+import datetime
+from array import array
+from itertools import groupby
+
+# pylint: disable=unused-import
+from typing import Tuple, List, Optional, Union, Callable, Dict, Any  # NOQA
+from typing import Iterable, Sequence
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None  # type: ignore
+
+# Column name and array typecode of each numeric field of a record.
+FIELDS = (
+    ("activity_value", "i"),
+    ("min_play", "i"),
+    ("min_active", "i"),
+    ("min_rest", "i"),
+    ("daily_target", "i"),
+    ("has_trophy", "b"),
+)
+NUMPY_TYPES = {"i": "int32", "b": "int8"}
+# Fields resampled by taking the largest value of the period instead of the sum.
+MAX_FIELDS = ("daily_target", "has_trophy")
+
+
+def _column(values: Iterable[int], typecode: str) -> Any:
+    """Return a typed array of values."""
+    if numpy is not None:
+        if isinstance(values, numpy.ndarray):
+            return values.astype(NUMPY_TYPES[typecode])
+        return numpy.fromiter(values, dtype=NUMPY_TYPES[typecode])
+    return array(typecode, values)
+
+
+def _period(resolution: str) -> Callable[[str], str]:
+    """Return a function mapping a record date to its period."""
+    if resolution == "DAILY":
+        return lambda date: date[:10]
+    if resolution == "MONTHLY":
+        return lambda date: date[:7]
+    if resolution == "WEEKLY":
+
+        def week(date: str) -> str:
+            day = datetime.datetime.strptime(date[:10], "%Y-%m-%d").date()
+            return (day - datetime.timedelta(days=day.weekday())).isoformat()
+
+        return week
+    raise ValueError(f"Unknown resolution {resolution}")
+
+
+class ActivitySeries:
+    """Activity records stored as typed columns.
+
+    Columns are available as attributes, e.g. ``series.activity_value``.
+    """
+
+    __slots__ = ("dates",) + tuple(name for name, _ in FIELDS)
+
+    activity_value: Any
+    min_play: Any
+    min_active: Any
+    min_rest: Any
+    daily_target: Any
+    has_trophy: Any
+
+    def __init__(self, dates: Sequence[str], **columns: Iterable[int]):
+        """Init.
+
+        :param dates: date of each record
+        :param columns: values of each field, missing fields are filled with 0
+        """
+        self.dates = list(dates)
+        for name, typecode in FIELDS:
+            values = columns.get(name)
+            if values is None:
+                values = [0] * len(self.dates)
+            setattr(self, name, _column(values, typecode))
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict[str, Any]]) -> "ActivitySeries":
+        """Build a series from ``activity_series`` records."""
+        records = list(records)
+        columns = {
+            name: [int(record.get(name) or 0) for record in records]
+            for name, _ in FIELDS
+        }
+        return cls([record["date"] for record in records], **columns)
+
+    @classmethod
+    def from_response(cls, data: Dict[str, Any]) -> "ActivitySeries":
+        """Build a series from a ``get_activity_series`` response."""
+        return cls.from_records(data["activity_series"]["records"])
+
+    def __len__(self) -> int:
+        """Return the number of records."""
+        return len(self.dates)
+
+    def __getitem__(self, name: str) -> Any:
+        """Return a column by name."""
+        if name == "dates" or name in dict(FIELDS):
+            return getattr(self, name)
+        raise KeyError(name)
+
+    def to_records(self) -> List[Dict[str, Any]]:
+        """Return the series as ``activity_series`` records."""
+        names = [name for name, _ in FIELDS]
+        columns = [self[name] for name in names]
+        return [
+            dict(zip(["date"] + names, [date] + [int(c[i]) for c in columns]))
+            for i, date in enumerate(self.dates)
+        ]
+
+    def sum(self, name: str = "activity_value") -> int:
+        """Return the total of a column."""
+        column = self[name]
+        if numpy is not None:
+            return int(column.sum(dtype="int64"))
+        return sum(column)
+
+    def mean(self, name: str = "activity_value") -> float:
+        """Return the mean of a column, 0 when the series is empty."""
+        return self.sum(name) / len(self) if len(self) else 0.0
+
+    def rolling_mean(self, name: str = "activity_value", window: int = 7) -> Any:
+        """Return the mean of each run of ``window`` consecutive records."""
+        if window < 1:
+            raise ValueError("The window must be at least 1")
+
+        column = self[name]
+        if numpy is not None:
+            if len(column) < window:
+                return numpy.empty(0)
+            totals = numpy.cumsum(column, dtype="float64")
+            totals[window:] = totals[window:] - totals[:-window]
+            return totals[window - 1 :] / window
+
+        means = []
+        total = 0
+        for i, value in enumerate(column):
+            total += value
+            if i >= window:
+                total -= column[i - window]
+            if i >= window - 1:
+                means.append(total / window)
+        return means
+
+    def goal_ratios(self) -> Any:
+        """Return activity_value / daily_target per record, 0 without a target."""
+        if numpy is not None:
+            target = self.daily_target.astype("float64")
+            return numpy.divide(
+                self.activity_value,
+                target,
+                out=numpy.zeros(len(self)),
+                where=target > 0,
+            )
+        return [
+            value / target if target else 0.0
+            for value, target in zip(self.activity_value, self.daily_target)
+        ]
+
+    def goal_attainment(self) -> float:
+        """Return the fraction of records where the daily target was reached."""
+        if not len(self):
+            return 0.0
+        ratios = self.goal_ratios()
+        if numpy is not None:
+            return float((ratios >= 1).mean())
+        return sum(1 for ratio in ratios if ratio >= 1) / len(self)
+
+    def resample(self, resolution: str = "DAILY") -> "ActivitySeries":
+        """Aggregate the records into DAILY, WEEKLY or MONTHLY periods.
+
+        Minutes and activity are summed, daily_target and has_trophy keep the
+        period's largest value. Records must be in date order.
+        """
+        period = _period(resolution)
+        keys = [period(date) for date in self.dates]
+        if not keys:
+            return ActivitySeries([])
+
+        if numpy is not None:
+            _, starts = numpy.unique(numpy.array(keys), return_index=True)
+            starts.sort()
+            columns = {}
+            for name, _ in FIELDS:
+                if name in MAX_FIELDS:
+                    columns[name] = numpy.maximum.reduceat(self[name], starts)
+                else:
+                    columns[name] = numpy.add.reduceat(
+                        self[name], starts, dtype="int64"
+                    )
+            return ActivitySeries([keys[i] for i in starts], **columns)
+
+        dates = []
+        merged: Dict[str, List[int]] = {name: [] for name, _ in FIELDS}
+        index = 0
+        for key, group in groupby(keys):
+            size = len(list(group))
+            dates.append(key)
+            for name, _ in FIELDS:
+                values = self[name][index : index + size]
+                merged[name].append(max(values) if name in MAX_FIELDS else sum(values))
+            index += size
+        return ActivitySeries(dates, **merged)
@@ -0,0 +1,372 @@
+# -*- coding: utf-8 -*-
+"""PyFitBark query server.
+
+:class:`QueryServer` keeps one :class:`pyfitbark.api.FitbarkApi`, with its token,
+connections and cache, warm in a long running process and answers queries from
+other processes over a Unix socket or a localhost TCP port. :class:`QueryClient`
+has the query methods of the client and forwards them to the server.
+
+The protocol is newline-delimited JSON. Each request line
+``{"method": "get_dog", "args": ["<slug>"], "kwargs": {}}`` is answered with
+``{"result": ...}`` or ``{"error": {"type": ..., "message": ..., "status": ...}}``
+and a connection may send any number of requests.
+"""
+import functools
+import logging
+import os
+import re
+import socket
+import socketserver
+import stat
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# pylint: disable=unused-import
+from typing import Tuple, List, Optional, Union, Callable, Dict, Any  # NOQA
+from typing import IO, TYPE_CHECKING, Iterable, Iterator, cast
+
+from . import codec
+from .models import BulkResult
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .api import FitbarkApi
+
+_LOGGER = logging.getLogger(__name__)
+
+# Read only FitbarkApi methods the server answers.
+METHODS = frozenset(
+    [
+        "get_user_profile",
+        "get_user_picture",
+        "get_user_related_dogs",
+        "get_dog",
+        "get_dog_picture",
+        "get_dog_related_users",
+        "get_daily_goal",
+        "get_dogs",
+        "get_dog_pictures",
+        "get_activity_series",
+        "iter_activity_records",
+        "get_dog_similar_stats",
+        "get_activity_totals",
+        "get_time_breakdown",
+    ]
+)
+
+# Methods returning a BulkResult per slug, whose errors are sent as error replies.
+BULK_METHODS = frozenset(["get_dogs", "get_dog_pictures"])
+
+_TCP_ADDRESS = re.compile(r"^(?P<host>[\w.\-]*):(?P<port>\d+)$")
+
+
+class ServerError(Exception):
+    """A query failed in the server.
+
+    :param kind: name of the exception raised by the server
+    :param message: its message
+    :param status: HTTP status code of the failed API request, if any
+    """
+
+    def __init__(self, kind: str, message: str, status: Optional[int] = None):
+        """Init."""
+        super().__init__(f"{kind}: {message}")
+        self.kind = kind
+        self.message = message
+        self.status = status
+
+
+def parse_address(address: str) -> Union[str, Tuple[str, int]]:
+    """Parse a server address.
+
+    ``host:port`` and ``:port`` are TCP addresses, the host defaulting to
+    ``127.0.0.1``; anything else is the path of a Unix socket.
+
+    :return: ``(host, port)`` or the socket path
+    """
+    match = _TCP_ADDRESS.match(address)
+    if match is None or os.sep in address:
+        return address
+    return match.group("host") or "127.0.0.1", int(match.group("port"))
+
+
+def _error(err: Exception) -> Dict[str, Any]:
+    """Return the reply to a query which raised err."""
+    response = getattr(err, "response", None)
+    return {
+        "error": {
+            "type": type(err).__name__,
+            "message": str(err),
+            "status": getattr(response, "status_code", None),
+        }
+    }
+
+
+def _server_error(error: Dict[str, Any]) -> ServerError:
+    """Return the exception of an error reply."""
+    return ServerError(error["type"], error["message"], error.get("status"))
+
+
+def _encode_bulk(results: Iterable[BulkResult]) -> List[Dict[str, Any]]:
+    """Return bulk results as JSON, their exceptions as in error replies."""
+    return [
+        {
+            "slug": result.slug,
+            "data": result.data,
+            "error": None if result.error is None else _error(result.error)["error"],
+        }
+        for result in results
+    ]
+
+
+def _decode_bulk(results: List[Dict[str, Any]]) -> List[BulkResult]:
+    """Rebuild bulk results, their errors as :class:`ServerError`."""
+    return [
+        BulkResult(
+            result["slug"],
+            result["data"],
+            None if result["error"] is None else _server_error(result["error"]),
+        )
+        for result in results
+    ]
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    """Answer the requests of one connection."""
+
+    def handle(self) -> None:
+        """Reply to each request line until the client disconnects."""
+        server = cast(_ServerMixin, self.server)
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            reply = server.dispatch(line)
+            self.wfile.write(reply.encode() + b"\n")
+
+
+class _ServerMixin:
+    """Dispatch requests to the client of the server."""
+
+    daemon_threads = True
+    api: "FitbarkApi"
+
+    def dispatch(self, line: bytes) -> str:
+        """Run one request line and return the reply line."""
+        try:
+            request = codec.loads(line)
+            method = request["method"]
+            if method not in METHODS:
+                raise ValueError(f"Unknown method {method}")
+            result = getattr(self.api, method)(
+                *request.get("args", ()), **request.get("kwargs", {})
+            )
+            if isinstance(result, Iterator):
+                result = list(result)
+            if method in BULK_METHODS:
+                result = _encode_bulk(result)
+            return codec.dumps({"result": result})
+        except Exception as err:  # pylint: disable=broad-except
+            _LOGGER.debug("Query %r failed: %s", line, err)
+            return codec.dumps(_error(err))
+
+
+class _TCPServer(_ServerMixin, socketserver.ThreadingTCPServer):
+    """Threaded TCP query server."""
+
+    allow_reuse_address = True
+
+
+if hasattr(socket, "AF_UNIX"):
+
+    class _UnixServer(_ServerMixin, socketserver.ThreadingUnixStreamServer):
+        """Threaded Unix socket query server."""
+
+
+def _remove_stale_socket(path: str) -> None:
+    """Remove the socket at path if no server listens on it any more."""
+    try:
+        if not stat.S_ISSOCK(os.stat(path).st_mode):
+            return
+    except FileNotFoundError:
+        return
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except ConnectionRefusedError:
+        os.unlink(path)
+    else:
+        raise OSError(f"A server is already listening on {path}")
+    finally:
+        probe.close()
+
+
+class QueryServer:
+    """Answer queries with one long lived client.
+
+    The Unix socket is only accessible by its owner; a TCP server should only be
+    bound to localhost, as the queries are not authenticated.
+
+    :param api: client answering the queries, give it a cache so repeated
+        queries are served from memory
+    :param address: socket path or ``host:port``, see :func:`parse_address`
+    """
+
+    def __init__(self, api: "FitbarkApi", address: str):
+        """Init."""
+        self.api = api
+        bind = parse_address(address)
+        self._server: Union[_TCPServer, "_UnixServer"]
+        if isinstance(bind, tuple):
+            self._server = _TCPServer(bind, _Handler)
+        else:
+            _remove_stale_socket(bind)
+            old_umask = os.umask(0o177)
+            try:
+                self._server = _UnixServer(bind, _Handler)
+            finally:
+                os.umask(old_umask)
+        self._server.api = api
+
+    @property
+    def address(self) -> Union[str, Tuple[str, int]]:
+        """Return the address the server is bound to."""
+        return cast(Union[str, Tuple[str, int]], self._server.server_address)
+
+    def serve_forever(self) -> None:
+        """Answer queries until :meth:`shutdown` is called."""
+        _LOGGER.info("Serving queries on %s", self.address)
+        self._server.serve_forever()
+
+    def shutdown(self) -> None:
+        """Stop :meth:`serve_forever`, from another thread."""
+        self._server.shutdown()
+
+    def close(self) -> None:
+        """Close the listening socket, removing a Unix socket file."""
+        self._server.server_close()
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            os.unlink(self.address)
+
+    def __enter__(self) -> "QueryServer":
+        """Enter the context manager."""
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        """Exit the context manager."""
+        self.close()
+
+
+class QueryClient:
+    """Forward queries to a :class:`QueryServer`.
+
+    Has the methods in :data:`METHODS` and ``map_slugs`` of
+    :class:`pyfitbark.api.FitbarkApi`, so it can be used in place of one for
+    queries. Each thread uses its own connection. Failed queries raise
+    :class:`ServerError`; the failed slugs of ``get_dogs`` and
+    ``get_dog_pictures`` carry one as the ``error`` of their ``BulkResult``.
+
+    :param address: socket path or ``host:port`` of the server
+    :param timeout: seconds to wait for a reply
+    :param max_workers: default number of concurrent calls of ``map_slugs``
+    """
+
+    def __init__(self, address: str, timeout: float = 60, max_workers: int = 8):
+        """Init."""
+        self.address = parse_address(address)
+        self.timeout = timeout
+        self.max_workers = max_workers
+        self._local = threading.local()
+        self._files: List[IO[bytes]] = []
+        self._lock = threading.Lock()
+
+    def _connect(self) -> IO[bytes]:
+        """Return the connection of the current thread."""
+        conn: Optional[IO[bytes]] = getattr(self._local, "conn", None)
+        if conn is None:
+            if isinstance(self.address, tuple):
+                sock = socket.create_connection(self.address, self.timeout)
+            else:
+                sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                sock.settimeout(self.timeout)
+                sock.connect(self.address)
+            conn = cast(IO[bytes], sock.makefile("rwb"))
+            sock.close()  # the file keeps the connection open
+            self._local.conn = conn
+            with self._lock:
+                self._files.append(conn)
+        return conn
+
+    def call(self, method: str, *args: Any, **kwargs: Any) -> Any:
+        """Run a query in the server and return its result."""
+        conn = self._connect()
+        request = {"method": method, "args": args, "kwargs": kwargs}
+        try:
+            conn.write(codec.dumps(request).encode() + b"\n")
+            conn.flush()
+            line = conn.readline()
+        except OSError:
+            self._drop()
+            raise
+        if not line:
+            self._drop()
+            raise ConnectionError("The server closed the connection")
+
+        reply = codec.loads(line)
+        if "error" in reply:
+            raise _server_error(reply["error"])
+        return reply["result"]
+
+    def _drop(self) -> None:
+        """Forget the connection of the current thread."""
+        conn = self._local.conn
+        self._local.conn = None
+        with self._lock:
+            self._files.remove(conn)
+        conn.close()
+
+    def __getattr__(self, name: str) -> Callable[..., Any]:
+        """Return a function forwarding the query method name."""
+        if name not in METHODS:
+            raise AttributeError(f"{type(self).__name__} has no attribute {name}")
+        if name in BULK_METHODS:
+            return lambda *args, **kwargs: _decode_bulk(
+                self.call(name, *args, **kwargs)
+            )
+        return functools.partial(self.call, name)
+
+    def map_slugs(
+        self,
+        func: Callable[[str], Any],
+        slugs: Iterable[str],
+        max_workers: Optional[int] = None,
+    ) -> List[BulkResult]:
+        """Call func for every slug concurrently, collecting failures.
+
+        See :meth:`pyfitbark.api.FitbarkApi.map_slugs`.
+        """
+
+        def call(slug: str) -> BulkResult:
+            try:
+                return BulkResult(slug, func(slug), None)
+            except Exception as err:  # pylint: disable=broad-except
+                return BulkResult(slug, None, err)
+
+        items = list(slugs)
+        workers = max(1, min(max_workers or self.max_workers, len(items)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(call, items))
+
+    def close(self) -> None:
+        """Close the connections of all threads."""
+        with self._lock:
+            files, self._files = self._files, []
+        for conn in files:
+            conn.close()
+        self._local = threading.local()
+
+    def __enter__(self) -> "QueryClient":
+        """Enter the context manager."""
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        """Exit the context manager."""
+        self.close()
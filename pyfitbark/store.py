@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+"""PyFitBark local activity store.
+
+Keeps ``activity_series`` records in SQLite, indexed by dog slug, resolution and
+date, so that only new days have to be downloaded on each run.
+"""
+import datetime
+import sqlite3
+import threading
+import time
+
+# pylint: disable=unused-import
+from typing import Tuple, List, Optional, Union, Callable, Dict, Any  # NOQA
+from typing import Iterable
+
+from . import codec
+from .api import MAX_SERIES_DAYS, FitbarkApi, _date_string, _resolution
+from .series import ActivitySeries
+
+
+def _next_day(date: str) -> str:
+    """Return the day after a YYYY-MM-DD date."""
+    day = datetime.datetime.strptime(date[:10], "%Y-%m-%d").date()
+    return (day + datetime.timedelta(days=1)).strftime("%Y-%m-%d")
+
+
+class ActivityStore:
+    """Activity records stored in a SQLite database in WAL mode.
+
+    :param path: database file, ``":memory:"`` for a private in-memory database
+    """
+
+    def __init__(self, path: str = ":memory:"):
+        """Init."""
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS activity ("
+                "slug TEXT NOT NULL, resolution TEXT NOT NULL, date TEXT NOT NULL, "
+                "record TEXT NOT NULL, updated REAL NOT NULL, "
+                "PRIMARY KEY (slug, resolution, date)"
+                ") WITHOUT ROWID"
+            )
+
+    def add_records(
+        self, slug: str, records: Iterable[Dict[str, Any]], resolution: str = "DAILY"
+    ) -> int:
+        """Insert or replace records in a single transaction.
+
+        :param slug: uuid of the dog the records belong to
+        :type slug: uuid
+        :param records: ``activity_series`` records
+        :type records: list
+        :param resolution: DAILY or HOURLY
+        :type resolution: str
+        :return: number of records written
+        :rtype: int
+        """
+        now = time.time()
+        rows = [
+            (slug, resolution, record["date"], codec.dumps(record), now)
+            for record in records
+        ]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO activity VALUES (?, ?, ?, ?, ?)", rows
+            )
+        return len(rows)
+
+    def records(
+        self,
+        slug: str,
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+        resolution: str = "DAILY",
+    ) -> List[Dict[str, Any]]:
+        """Return the stored records of a dog in date order.
+
+        :param slug: uuid of the dog to look up
+        :type slug: uuid
+        :param date_from: the first day to return, defaults to the first stored
+        :type date_from: datetime, date, str
+        :param date_to: the last day to return, defaults to the last stored
+        :type date_to: datetime, date, str
+        :param resolution: DAILY or HOURLY
+        :type resolution: str
+        :return: list of records
+        :rtype: list
+        """
+        date_from = _date_string(date_from) or ""
+        date_to = _date_string(date_to)
+        end = _next_day(date_to) if date_to else "~"
+
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT record FROM activity WHERE slug = ? AND resolution = ? "
+                "AND date >= ? AND date < ? ORDER BY date",
+                (slug, resolution, date_from, end),
+            ).fetchall()
+        return [codec.loads(row[0]) for row in rows]
+
+    def covered(
+        self,
+        slug: str,
+        date_from: str,
+        date_to: str,
+        max_age: float = 300,
+        settle_days: int = 1,
+    ) -> Optional[List[Dict[str, Any]]]:
+        """Return the daily records of a range if the store fully covers it.
+
+        Every day of the range must be stored. A day is final once it was written
+        ``settle_days`` after its end; a day written earlier, while it could still
+        change, must have been written within ``max_age`` seconds.
+
+        :return: list of records, or None when the range is not covered
+        :rtype: list
+        """
+        start = datetime.datetime.strptime(date_from, "%Y-%m-%d").date()
+        end = datetime.datetime.strptime(date_to, "%Y-%m-%d").date()
+
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT date, record, updated FROM activity WHERE slug = ? AND "
+                "resolution = 'DAILY' AND date >= ? AND date <= ? ORDER BY date",
+                (slug, date_from, date_to),
+            ).fetchall()
+
+        if len(rows) != (end - start).days + 1:
+            return None
+
+        fresh = time.time() - max_age
+        for date, _, updated in rows:
+            day = datetime.datetime.strptime(date[:10], "%Y-%m-%d")
+            final = day + datetime.timedelta(days=1 + settle_days)
+            if updated < fresh and updated < time.mktime(final.timetuple()):
+                return None
+        return [codec.loads(record) for _, record, _ in rows]
+
+    def series(
+        self,
+        slug: str,
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+        resolution: str = "DAILY",
+    ) -> ActivitySeries:
+        """Return the stored records of a dog as an :class:`ActivitySeries`."""
+        return ActivitySeries.from_records(
+            self.records(slug, date_from, date_to, resolution)
+        )
+
+    def last_date(self, slug: str, resolution: str = "DAILY") -> Optional[str]:
+        """Return the last stored day of a dog, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MAX(date) FROM activity WHERE slug = ? AND resolution = ?",
+                (slug, resolution),
+            ).fetchone()
+        return row[0][:10] if row[0] else None
+
+    def sync(
+        self,
+        api: FitbarkApi,
+        slug: str,
+        resolution: Optional[str] = "DAILY",
+        since: Optional[str] = None,
+    ) -> int:
+        """Download the records missing from the store.
+
+        Only the days from the last stored day through today are requested. The last
+        stored day is fetched again as it may have been incomplete when stored. When
+        ``api`` writes through to this store the records are not written again.
+
+        :param api: client used to download the records
+        :type api: FitbarkApi
+        :param slug: uuid of the dog to sync
+        :type slug: uuid
+        :param resolution: DAILY or HOURLY
+        :type resolution: str
+        :param since: first day to download when nothing is stored yet, defaults to
+            the longest range of a single request
+        :type since: datetime, date, str
+        :return: number of records written
+        :rtype: int
+        """
+        resolution = _resolution(resolution)
+        today = datetime.date.today()
+        date_from = self.last_date(slug, resolution) or _date_string(since)
+
+        if date_from is None:
+            start = today - datetime.timedelta(days=MAX_SERIES_DAYS[resolution] - 1)
+            date_from = start.strftime("%Y-%m-%d")
+
+        data = api.get_activity_series(
+            slug, date_from, today.strftime("%Y-%m-%d"), resolution
+        )
+        records: List[Dict[str, Any]] = data["activity_series"]["records"]
+        if getattr(api, "store", None) is self:
+            # The client already wrote the records through to this store.
+            return len(records)
+        return self.add_records(slug, records, resolution)
+
+    def close(self) -> None:
+        """Close the database."""
+        self._conn.close()
@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+"""PyFitBark watch mode.
+
+:class:`Watcher` polls the recent activity of a set of dogs. Every dog has its own
+interval, which shrinks while its data changes and grows while it does not, so
+idle or offline collars are polled less often than active ones. Poll times are
+jittered to spread the requests, and a :class:`TokenBucket` keeps them within a
+budget.
+"""
+import hashlib
+import heapq
+import logging
+import random
+import time
+
+# pylint: disable=unused-import
+from typing import Tuple, List, Optional, Union, Callable, Dict, Any  # NOQA
+from typing import TYPE_CHECKING, Iterable, Iterator, NamedTuple
+
+from . import codec
+from .delta import DeltaTracker
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .api import FitbarkApi
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Allow ``rate`` requests per second on average, in bursts of ``capacity``.
+
+    :param rate: tokens added per second
+    :param capacity: most tokens held, the bucket starts full
+    :param clock: returns the current time in seconds
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: float,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """Init."""
+        if rate <= 0 or capacity <= 0:
+            raise ValueError("The rate and capacity must be positive")
+        self.rate = rate
+        self.capacity = capacity
+        self._clock = clock
+        self._tokens = capacity
+        self._updated = clock()
+
+    def take(self, tokens: float = 1) -> float:
+        """Take tokens from the bucket.
+
+        The tokens are reserved even when the bucket does not hold them yet, the
+        caller must then wait the returned time before using them.
+
+        :return: seconds to wait, 0 if the tokens are available now
+        """
+        now = self._clock()
+        self._tokens = min(
+            self.capacity, self._tokens + (now - self._updated) * self.rate
+        )
+        self._updated = now
+        self._tokens -= tokens
+        return max(0.0, -self._tokens / self.rate)
+
+
+class Poll(NamedTuple):
+    """Outcome of polling one dog.
+
+    ``data`` holds the ``activity_series`` and ``time_breakdown`` responses, it
+    is None when the poll failed with ``error``. ``records`` are the activity
+    records which are new or changed since the previous polls.
+    """
+
+    slug: str
+    data: Optional[Dict[str, Any]]
+    changed: bool
+    records: List[Dict[str, Any]]
+    error: Optional[Exception]
+    interval: float
+
+
+class Watcher:
+    """Poll the activity of dogs, adapting each interval to how often it changes.
+
+    Each poll fetches the activity series and the time breakdown of yesterday and
+    today, two requests. Do not give the client a response cache which would
+    serve these endpoints for longer than ``min_interval``.
+
+    :param api: client to poll with
+    :param slugs: uuids of the dogs to watch
+    :param interval: seconds between the first polls of a dog
+    :param min_interval: shortest interval, used while the data keeps changing
+    :param max_interval: longest interval, reached while nothing changes
+    :param backoff: factor the interval grows by when nothing changed, or a poll
+        failed, and shrinks by when the data changed
+    :param jitter: polls are randomly moved by up to this fraction of the
+        interval, the first polls are spread over this fraction of ``interval``
+    :param budget: most requests per hour, unlimited by default
+    :param burst: requests which may be sent at once within the budget
+    :param resolution: DAILY or HOURLY activity series
+    :param delta: tracks the records already seen, to share it or give it a
+        callback
+    :param clock: returns the current time in seconds
+    :param sleep: waits a number of seconds
+    :param rand: returns a random float in [0, 1)
+    """
+
+    # Requests sent by each poll.
+    REQUESTS_PER_POLL = 2
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        api: "FitbarkApi",
+        slugs: Iterable[str],
+        *,
+        interval: float = 300,
+        min_interval: float = 60,
+        max_interval: float = 3600,
+        backoff: float = 2,
+        jitter: float = 0.1,
+        budget: Optional[float] = None,
+        burst: int = 10,
+        resolution: str = "HOURLY",
+        delta: Optional[DeltaTracker] = None,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+        rand: Callable[[], float] = random.random,
+    ):
+        """Init."""
+        if not 0 < min_interval <= interval <= max_interval:
+            raise ValueError("Expected 0 < min_interval <= interval <= max_interval")
+        if backoff < 1:
+            raise ValueError("The backoff must be at least 1")
+        self.api = api
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.jitter = jitter
+        self.resolution = resolution
+        self.delta = delta if delta is not None else DeltaTracker()
+        self._clock = clock
+        self._sleep = sleep
+        self._rand = rand
+        self.bucket = (
+            TokenBucket(budget / 3600, max(burst, self.REQUESTS_PER_POLL), clock)
+            if budget is not None
+            else None
+        )
+
+        self.intervals: Dict[str, float] = {}
+        # Digest of the last data seen of each dog.
+        self._digests: Dict[str, str] = {}
+        # Next polls: (due, sequence, slug).
+        self._queue: List[Tuple[float, int, str]] = []
+        self._sequence = 0
+
+        now = clock()
+        for slug in dict.fromkeys(slugs):
+            self.intervals[slug] = interval
+            self._schedule(slug, now + self._rand() * jitter * interval)
+
+    def _schedule(self, slug: str, due: float) -> None:
+        """Queue the next poll of a dog."""
+        self._sequence += 1
+        heapq.heappush(self._queue, (due, self._sequence, slug))
+
+    def fetch(self, slug: str) -> Dict[str, Any]:
+        """Return the recent activity of a dog."""
+        return {
+            "activity_series": self.api.get_activity_series(
+                slug, resolution=self.resolution
+            ),
+            "time_breakdown": self.api.get_time_breakdown(slug),
+        }
+
+    def poll(self, slug: str) -> Poll:
+        """Poll a dog now and adapt its interval.
+
+        The first poll of a dog counts as a change but keeps its interval.
+        """
+        interval = self.intervals[slug]
+        try:
+            data = self.fetch(slug)
+        except Exception as err:  # pylint: disable=broad-except
+            _LOGGER.debug("Polling %s failed: %s", slug, err)
+            interval = min(self.max_interval, interval * self.backoff)
+            self.intervals[slug] = interval
+            return Poll(slug, None, False, [], err, interval)
+
+        digest = hashlib.sha1(codec.dumps(data).encode()).hexdigest()
+        previous = self._digests.get(slug)
+        self._digests[slug] = digest
+        changed = digest != previous
+        if previous is not None:
+            factor = 1 / self.backoff if changed else self.backoff
+            interval = min(self.max_interval, max(self.min_interval, interval * factor))
+        self.intervals[slug] = interval
+        records = self.delta.update(
+            slug, data["activity_series"]["activity_series"]["records"]
+        )
+        return Poll(slug, data, changed, records, None, interval)
+
+    def step(self) -> Poll:
+        """Wait for the next due dog and the budget, then poll it."""
+        if not self._queue:
+            raise ValueError("No dogs to watch")
+        due, _, slug = heapq.heappop(self._queue)
+        wait = due - self._clock()
+        if wait > 0:
+            self._sleep(wait)
+        if self.bucket is not None:
+            wait = self.bucket.take(self.REQUESTS_PER_POLL)
+            if wait > 0:
+                self._sleep(wait)
+
+        result = self.poll(slug)
+        spread = 1 + self.jitter * (2 * self._rand() - 1)
+        self._schedule(slug, self._clock() + result.interval * spread)
+        return result
+
+    def __iter__(self) -> Iterator[Poll]:
+        """Poll the dogs forever, yielding every poll."""
+        while True:
+            yield self.step()
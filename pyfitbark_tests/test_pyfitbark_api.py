@@ -10,10 +10,21 @@ import datetime
 
 import json
 
+import threading
+
+import time
+
 from requests_oauthlib import OAuth2Session
 from oauthlib.oauth2 import TokenExpiredError
 
-from pyfitbark.api import BASE_URL, FitbarkApi
+from pyfitbark.store import ActivityStore
+from pyfitbark.api import (
+    BASE_URL,
+    FITBARK_TOKEN,
+    FitbarkApi,
+    _date_windows,
+    _update_redirect_urls,
+)
 
 CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
 SLUG = "09659a8a-24c9-4246-92a8-7ecd0650368c"
@@ -55,6 +66,27 @@ class MockResponse:
         return data
 
 
+def activity_window(windows):
+    """Return a fake _get_activity_window recording its windows.
+
+    Each window overlaps the previous one by a day, to exercise de-duplication,
+    and its records are in reverse order.
+    """
+
+    def get_activity_window(slug, date_from, date_to, resolution):
+        windows.append((date_from, date_to, resolution))
+        day = datetime.datetime.strptime(date_from, "%Y-%m-%d").date()
+        day -= datetime.timedelta(days=1)
+        records = []
+        while day.isoformat() <= date_to:
+            records.append({"date": day.isoformat(), "activity_value": day.day})
+            day += datetime.timedelta(days=1)
+        records.reverse()
+        return {"activity_series": {"slug": slug, "records": records}}
+
+    return get_activity_window
+
+
 class TestFitbarkApi:
     """Unit tests for pyfitbark.FitbarkApi."""
 
@@ -289,6 +321,30 @@ class TestFitbarkApi:
         assert daily_goals["goal"] == 1091
         assert daily_goals["date"] == "2019-12-31"
 
+    def test_get_dogs(self, api, monkeypatch):
+        """Test FitbarkApi.get_dogs() and FitbarkApi.get_dog_pictures()."""
+        slugs = [f"slug-{i}" for i in range(20)]
+
+        def get_one(slug):
+            if slug == "slug-7":
+                raise ValueError(slug)
+            return {"dog": {"slug": slug}}
+
+        monkeypatch.setattr(api, "get_dog", get_one)
+        monkeypatch.setattr(api, "get_dog_picture", get_one)
+
+        for results in (
+            api.get_dogs(slugs),
+            api.get_dog_pictures(iter(slugs), max_workers=3),
+        ):
+            assert [result.slug for result in results] == slugs
+            assert isinstance(results[7].error, ValueError)
+            assert results[7].data is None
+            assert results[8].error is None
+            assert results[8].data == {"dog": {"slug": "slug-8"}}
+
+        assert api.get_dogs([]) == []
+
     def test_get_date_string(self, api):
         """Test FitbarkApi._get_date_string()."""
         date = "2019-12-31"
@@ -347,6 +403,90 @@ class TestFitbarkApi:
                 "/activity_series", "2019-12-31", "2019-12-25"
             )
 
+    def test_date_windows(self):
+        """Test pyfitbark.api._date_windows()."""
+        assert _date_windows("2019-12-25", "2019-12-25", "DAILY") == [
+            ("2019-12-25", "2019-12-25")
+        ]
+        assert _date_windows("2019-01-01", "2019-02-11", "DAILY") == [
+            ("2019-01-01", "2019-02-11")
+        ]
+        assert _date_windows("2019-01-01", "2019-02-12", "DAILY") == [
+            ("2019-01-01", "2019-02-11"),
+            ("2019-02-12", "2019-02-12"),
+        ]
+        windows = _date_windows("2019-01-01", "2019-12-31", "HOURLY")
+        assert len(windows) == 53
+        assert windows[0] == ("2019-01-01", "2019-01-07")
+        assert windows[-1] == ("2019-12-31", "2019-12-31")
+        # Ranges in other formats are left to the API.
+        assert _date_windows("2020-1-1T00:00:00", "2020-01-02", "DAILY") == [
+            ("2020-1-1T00:00:00", "2020-01-02")
+        ]
+
+    def test_get_activity_series_unparsed(self, api, monkeypatch, tmp_path):
+        """Test FitbarkApi.get_activity_series() passes other date formats."""
+        windows = []
+
+        def get_activity_window(slug, date_from, date_to, resolution):
+            windows.append((date_from, date_to, resolution))
+            records = [{"date": "2020-01-01", "activity_value": 1}]
+            return {"activity_series": {"slug": slug, "records": records}}
+
+        monkeypatch.setattr(api, "_get_activity_window", get_activity_window)
+        api.store = ActivityStore(str(tmp_path / "activity.sqlite"))
+
+        api.get_activity_series(SLUG, "2020-01-01 00:00:00", "2020-01-02 00:00:00")
+        assert windows == [("2020-01-01 00:00:00", "2020-01-02 00:00:00", "DAILY")]
+        assert api._stored_records(SLUG, "2020-01-01 00:00:00", "2020-01-02") is None
+        api.store.close()
+
+    def test_get_activity_series_windows(self, api, monkeypatch):
+        """Test FitbarkApi.get_activity_series() splits long ranges."""
+        windows = []
+        monkeypatch.setattr(api, "_get_activity_window", activity_window(windows))
+
+        data = api.get_activity_series(SLUG, "2019-01-01", "2019-03-31")
+        assert sorted(windows) == [
+            ("2019-01-01", "2019-02-11", "DAILY"),
+            ("2019-02-12", "2019-03-25", "DAILY"),
+            ("2019-03-26", "2019-03-31", "DAILY"),
+        ]
+        records = data["activity_series"]["records"]
+        assert data["activity_series"]["slug"] == SLUG
+        assert records[0]["date"] == "2018-12-31"
+        assert records[-1]["date"] == "2019-03-31"
+        dates = [record["date"] for record in records]
+        assert dates == sorted(set(dates))
+        assert len(dates) == 91
+
+    def test_iter_activity_records(self, api, monkeypatch):
+        """Test FitbarkApi.iter_activity_records() yields window by window."""
+        windows = []
+        monkeypatch.setattr(api, "_get_activity_window", activity_window(windows))
+
+        records = api.iter_activity_records(SLUG, "2019-01-01", "2019-03-31")
+        first = next(records)
+        assert first["date"] == "2018-12-31"
+        assert len(windows) == 1
+
+        dates = [first["date"]] + [record["date"] for record in records]
+        assert dates == sorted(set(dates))
+        assert len(dates) == 91
+        assert windows[-1] == ("2019-03-26", "2019-03-31", "DAILY")
+
+        windows.clear()
+        records = api.iter_activity_records(
+            SLUG, "2019-01-01", "2019-12-31", max_workers=3
+        )
+        first = next(records)
+        # Only max_workers windows are fetched ahead of the one yielded.
+        assert len(windows) <= 4
+        dates = [first["date"]] + [record["date"] for record in records]
+        assert dates == sorted(set(dates))
+        assert len(dates) == 366
+        assert len(windows) == 9
+
     @httpretty.activate
     def test_get_dog_similar_stats(self, api):
         """Test FitbarkApi.get_dog_similar_stats()."""
@@ -498,6 +638,59 @@ class TestFitbarkApi:
         with pytest.raises(TokenExpiredError):
             api._request("get", "/path", json="{}")  # pylint: disable=protected-access
 
+    def test_request_single_flight_refresh(self, api, monkeypatch):
+        """Test concurrent expired requests share a single token refresh."""
+        api._oauth.token = {"access_token": "old", "token_type": "Bearer"}
+        refreshes = []
+        barrier = threading.Barrier(10)
+
+        def mock_get(session, url, **kwargs):  # pylint: disable=unused-argument
+            if session.token["access_token"] == "old":
+                barrier.wait(timeout=5)
+                raise TokenExpiredError
+            return session.token["access_token"]
+
+        def mock_refresh_token(session, *args, **kwargs):
+            refreshes.append(1)
+            time.sleep(0.05)
+            return {"access_token": "new", "token_type": "Bearer"}
+
+        monkeypatch.setattr(OAuth2Session, "get", mock_get)
+        monkeypatch.setattr(OAuth2Session, "refresh_token", mock_refresh_token)
+
+        results = api._map(lambda _: api.get("/user"), list(range(10)), 10)
+        assert results == ["new"] * 10
+        assert len(refreshes) == 1
+
+    def test_request_proactive_refresh(self, api, monkeypatch):
+        """Test the token is refreshed before it expires."""
+        refreshes = []
+
+        def mock_refresh_token(session, *args, **kwargs):
+            refreshes.append(1)
+            return {
+                "access_token": "new",
+                "token_type": "Bearer",
+                "expires_at": time.time() + 3600,
+            }
+
+        monkeypatch.setattr(OAuth2Session, "get", lambda session, url: url)
+        monkeypatch.setattr(OAuth2Session, "refresh_token", mock_refresh_token)
+        api._oauth.token = {
+            "access_token": "old",
+            "token_type": "Bearer",
+            "expires_at": time.time() + 30,
+        }
+
+        api.get("/user")
+        assert not refreshes
+
+        api.refresh_margin = 60
+        api.get("/user")
+        api.get("/user")
+        assert len(refreshes) == 1
+        assert api._oauth.token["access_token"] == "new"
+
     def test_hass_add_url(self, api, monkeypatch):
         """Test FitbarkApi.hass_add_url()."""
         monkeypatch.setattr(api, "hass_get_token", self.hass_get_token)
@@ -507,7 +700,10 @@ class TestFitbarkApi:
         monkeypatch.setattr(api, "hass_add_redirect_urls", self.hass_add_redirect_urls)
 
         # api._callback_url = "http://mock_url.com"  # pylint: disable=protected-access
-        api.hass_add_url()
+        data = api.hass_add_url()
+        assert data == MockResponse.hass_get_redirect_urls_no_match() + [
+            "http://mock_url.com/auth/external/callback"
+        ]
 
     def test_hass_remove_url(self, api, monkeypatch):
         """Test FitbarkApi.hass_remove_url()."""
@@ -516,11 +712,89 @@ class TestFitbarkApi:
         monkeypatch.setattr(api, "hass_add_redirect_urls", self.hass_add_redirect_urls)
 
         # api._callback_url = "http://mock_url.com"  # pylint: disable=protected-access
-        api.hass_remove_url()
+        data = api.hass_remove_url()
+        assert data == ["http://mock_url.com/auth/external/callback2"]
+
+        api._callback_url = None  # pylint: disable=protected-access
+        assert api.hass_remove_url() is None
+
+    @httpretty.activate
+    def test_hass_make_request(self, api, monkeypatch):
+        """Test FitbarkApi.hass_make_request()."""
+        httpretty.register_uri(
+            httpretty.GET, BASE_URL + "/redirect_urls", body='{"redirect_uri": ""}'
+        )
+        sessions = []
+        request = OAuth2Session.request
+
+        def mock_request(session, *args, **kwargs):
+            sessions.append(session)
+            return request(session, *args, **kwargs)
+
+        monkeypatch.setattr(OAuth2Session, "request", mock_request)
+        api._oauth.token = {"access_token": "user", "token_type": "Bearer"}
+
+        for _ in range(2):
+            data = api.hass_make_request(
+                "GET",
+                BASE_URL + "/redirect_urls",
+                {},
+                {"Authorization": f"Bearer {ACCESS_TOKEN}"},
+            )
+            assert data == {"redirect_uri": ""}
+        assert sessions == [api._oauth, api._oauth]
+        headers = httpretty.last_request().headers
+        assert headers["Authorization"] == f"Bearer {ACCESS_TOKEN}"
+
+    def test_close(self, monkeypatch):
+        """Test FitbarkApi as a context manager."""
+        closed = []
+        monkeypatch.setattr(
+            OAuth2Session, "close", lambda session: closed.append(session)
+        )
+
+        with FitbarkApi("foo", "faa") as api:
+            assert isinstance(api, FitbarkApi)
+        assert closed == [api._oauth]
+
+    def test_update_redirect_urls(self):
+        """Test the redirect url diff."""
+        current = ["a", "b", "c"]
+        assert _update_redirect_urls(current, ["b"], ["d"]) is None
+        assert _update_redirect_urls(current, ["d", "a", "d"], ["b"]) == [
+            "a",
+            "c",
+            "d",
+        ]
+        assert _update_redirect_urls(["a", "", "a"], [], []) is None
+        assert _update_redirect_urls(["a", "", "a"], ["b"], []) == ["a", "b"]
+        # An empty list is read as [""].
+        assert _update_redirect_urls([""], [], ["d"]) is None
+        with pytest.raises(ValueError):
+            _update_redirect_urls(current, ["a"], ["a"])
+
+    def test_hass_update_urls(self, api, monkeypatch):
+        """Test FitbarkApi.hass_update_urls()."""
+        calls = []
+
+        def mock_get(*args):
+            calls.append(("get",) + args)
+            return ["a", "b"]
+
+        def mock_add(*args):
+            calls.append(("add",) + args)
+            return {"redirect_uri": args[0]}
+
+        monkeypatch.setattr(api, "hass_get_redirect_urls", mock_get)
+        monkeypatch.setattr(api, "hass_add_redirect_urls", mock_add)
 
-    # @httpretty.activate
-    # def test_hass_make_request(self, api, monkeypatch):
-    #     """Test FitbarkApi.hass_make_request()."""
+        assert api.hass_update_urls(add=["a"], remove=["x"]) == ["a", "b"]
+        assert calls == [("get",)]
+
+        calls.clear()
+        urls = api.hass_update_urls(add=["c", "d"], remove=["a"])
+        assert urls == ["b", "c", "d"]
+        assert calls == [("get",), ("add", "b\rc\rd")]
 
     def test_hass_get_token(self, api, monkeypatch):
         """Test FitbarkApi.hass_get_token()."""
@@ -533,6 +807,66 @@ class TestFitbarkApi:
             == "db73736bc5713e986415fd22345678e2a1f0d8f84eefee3d78515b643db329c341679"
         )
 
+    @httpretty.activate
+    def test_hass_token_cache(self, api, monkeypatch):
+        """Test the client credentials token is cached and renewed on 401."""
+        tokens = iter(["first", "second", "third"])
+        httpretty.register_uri(
+            httpretty.POST,
+            FITBARK_TOKEN,
+            body=lambda request, uri, headers: (
+                200,
+                headers,
+                json.dumps({"access_token": next(tokens), "expires_in": 3600}),
+            ),
+        )
+        httpretty.register_uri(
+            httpretty.GET,
+            BASE_URL + "/redirect_urls",
+            responses=[
+                httpretty.Response(body='{"redirect_uri": "a"}'),
+                httpretty.Response(body="{}", status=401),
+                httpretty.Response(body='{"redirect_uri": "b"}'),
+            ],
+        )
+
+        assert api.hass_get_token() == "first"
+        assert api.hass_get_token() == "first"
+        assert api.hass_get_redirect_urls() == ["a"]
+        assert api.hass_get_redirect_urls() == ["b"]
+        assert api.hass_get_token() == "second"
+        headers = httpretty.last_request().headers
+        assert headers["Authorization"] == "Bearer second"
+
+        now = time.time()
+        monkeypatch.setattr(time, "time", lambda: now + 3600)
+        assert api.hass_get_token() == "third"
+
+    @httpretty.activate
+    def test_base_url(self):
+        """Test the API and OAuth endpoints are found at base_url."""
+        base_url = "https://localhost:8443/api/v2"
+        api = FitbarkApi(
+            "foo", "faa", token={"access_token": ACCESS_TOKEN}, base_url=base_url
+        )
+        httpretty.register_uri(
+            httpretty.POST,
+            "https://localhost:8443/oauth/token",
+            body='{"access_token": "hass"}',
+        )
+        httpretty.register_uri(
+            httpretty.GET, base_url + f"/dog/{SLUG}", body='{"dog": {"slug": "x"}}'
+        )
+        httpretty.register_uri(
+            httpretty.GET, base_url + "/redirect_urls", body='{"redirect_uri": "a"}'
+        )
+
+        assert api.get_dog(SLUG) == {"dog": {"slug": "x"}}
+        assert api.hass_get_redirect_urls() == ["a"]
+        assert api.get_authorization_url()[0].startswith(
+            "https://localhost:8443/oauth/authorize?"
+        )
+
     @httpretty.activate
     def test_hass_get_redirect_urls(self, api):
         """Test FitbarkApi.hass_get_redirect_urls()."""
@@ -0,0 +1,335 @@
+# -*- coding: utf-8 -*-
+"""PyFitBark asyncio API Tests."""
+import asyncio
+import os
+import time
+
+import pytest
+
+aiohttp = pytest.importorskip("aiohttp")
+
+from aiohttp import web  # noqa: E402
+from aiohttp.test_utils import TestServer  # noqa: E402
+
+from pyfitbark.async_api import AsyncFitbarkApi  # noqa: E402
+from pyfitbark.retry import RetryPolicy  # noqa: E402
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+SLUG = "09659a8a-24c9-4246-92a8-7ecd0650368c"
+TOKEN = {"access_token": "mock_access", "refresh_token": "mock_refresh"}
+
+
+def run(coro):
+    """Run a coroutine to completion on a fresh event loop."""
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+def read_file(file):
+    """Return the raw contents of a json fixture."""
+    with open(os.path.join(CURRENT_DIR, "json/", f"{file}.json"), "r") as o_file:
+        return o_file.read()
+
+
+class MockServer:
+    """aiohttp application serving the json fixtures."""
+
+    def __init__(self):
+        self.requests = []
+        self.bodies = []
+        self.app = web.Application()
+        routes = [
+            ("GET", "/api/v2/user", "get_user_profile"),
+            ("GET", "/api/v2/picture/user/{slug}", "get_user_picture"),
+            ("GET", "/api/v2/dog_relations", "get_user_related_dogs"),
+            ("GET", "/api/v2/dog/{slug}", "get_dog"),
+            ("GET", "/api/v2/picture/dog/{slug}", "get_dog_picture"),
+            ("GET", "/api/v2/user_relations/{slug}", "get_dog_related_users"),
+            ("GET", "/api/v2/daily_goal/{slug}", "get_daily_goal"),
+            ("PUT", "/api/v2/daily_goal/{slug}", "get_daily_goal"),
+            ("POST", "/api/v2/activity_series", "get_activity_series"),
+            ("POST", "/api/v2/similar_dogs_stats", "get_dog_similar_stats"),
+            ("POST", "/api/v2/activity_totals", "get_activity_totals"),
+            ("POST", "/api/v2/time_breakdown", "get_time_breakdown"),
+        ]
+        for method, path, file in routes:
+            self.app.router.add_route(method, path, self.fixture(file))
+        self.app.router.add_post("/oauth/token", self.token)
+        self.app.router.add_route("*", "/api/v2/redirect_urls", self.redirect_urls)
+        self.redirect_uri = "urn:ietf:wg:oauth:2.0:oob"
+
+    def fixture(self, file):
+        async def handler(request):
+            self.requests.append(request)
+            self.bodies.append(await request.read())
+            return web.Response(text=read_file(file), content_type="application/json")
+
+        return handler
+
+    async def token(self, request):
+        self.requests.append(request)
+        if request.content_type == "application/json":
+            data = await request.json()
+        else:
+            data = dict(await request.post())
+        self.bodies.append(data)
+        return web.json_response(
+            {
+                "access_token": f"new_{data['grant_type']}",
+                "refresh_token": "new_refresh",
+                "expires_in": 3600,
+            }
+        )
+
+    async def redirect_urls(self, request):
+        self.requests.append(request)
+        self.bodies.append(await request.read())
+        if request.method == "POST":
+            self.redirect_uri = (await request.json())["redirect_uri"]
+        return web.json_response({"redirect_uri": self.redirect_uri})
+
+
+class TestAsyncFitbarkApi:
+    """Unit tests for pyfitbark.AsyncFitbarkApi."""
+
+    def call(self, method, *args, token=None, **kwargs):
+        """Run one API method against a fresh mock server."""
+        mock = MockServer()
+
+        async def go():
+            async with TestServer(mock.app) as server:
+                async with AsyncFitbarkApi(
+                    "foo",
+                    "faa",
+                    "https://whatever.com",
+                    token=token or dict(TOKEN),
+                    callback_url="http://mock_url.com",
+                    base_url=str(server.make_url("/api/v2")),
+                ) as api:
+                    return await getattr(api, method)(*args, **kwargs)
+
+        return run(go()), mock
+
+    def test_get_user_profile(self):
+        """Test AsyncFitbarkApi.get_user_profile()."""
+        data, mock = self.call("get_user_profile")
+        assert data["user"]["slug"] == "00000000-zzzz-1111-2222-xxxxxxxxxxxx"
+        assert mock.requests[0].headers["Authorization"] == "Bearer mock_access"
+
+    def test_get_dog_endpoints(self):
+        """Test the per dog GET endpoints."""
+        data, _ = self.call("get_dog", SLUG)
+        assert data["dog"]["name"] == "Rose"
+
+        data, mock = self.call("get_dog_picture", SLUG)
+        assert data["image"]["data"].startswith("/9j/")
+        assert mock.requests[0].path == f"/api/v2/picture/dog/{SLUG}"
+
+        data, _ = self.call("get_user_picture", SLUG)
+        assert data["image"]["data"].startswith("/9j/")
+
+        data, _ = self.call("get_user_related_dogs")
+        assert data["dog_relations"][0]["dog"]["name"] == "Bingle"
+
+        data, _ = self.call("get_dog_related_users", SLUG)
+        assert data["user_relation"][0]["status"] == "OWNER"
+
+        data, _ = self.call("get_daily_goal", SLUG)
+        assert data["daily_goals"][0]["goal"] == 1091
+
+    def test_get_dogs(self):
+        """Test AsyncFitbarkApi.get_dogs() keeps order and reports failures."""
+        mock = MockServer()
+        mock.app.router.add_get("/api/v2/dog/missing", self.not_found)
+
+        async def go():
+            async with TestServer(mock.app) as server:
+                async with AsyncFitbarkApi(
+                    "foo", "faa", base_url=str(server.make_url("/api/v2"))
+                ) as api:
+                    dogs = await api.get_dogs([SLUG, "missing", SLUG], 2)
+                    pictures = await api.get_dog_pictures([SLUG])
+                    return dogs, pictures
+
+        dogs, pictures = run(go())
+        assert [result.slug for result in dogs] == [SLUG, "missing", SLUG]
+        assert dogs[0].data["dog"]["name"] == "Rose"
+        assert dogs[1].data is None
+        assert isinstance(dogs[1].error, aiohttp.ClientResponseError)
+        assert pictures[0].data["image"]["data"].startswith("/9j/")
+
+    @staticmethod
+    async def not_found(request):
+        raise web.HTTPNotFound()
+
+    def test_set_daily_goal(self):
+        """Test AsyncFitbarkApi.set_daily_goal()."""
+        data, mock = self.call(
+            "set_daily_goal", SLUG, {"daily_goal": 7000, "date": "2014-08-15"}
+        )
+        assert data["daily_goals"][0]["goal"] == 1091
+        assert mock.requests[0].method == "PUT"
+        assert b'"daily_goal": 7000' in mock.bodies[0]
+
+    def test_get_activity_series(self):
+        """Test AsyncFitbarkApi.get_activity_series()."""
+        data, mock = self.call(
+            "get_activity_series", SLUG, "2019-12-25", "2019-12-31", "BAD INPUT"
+        )
+        assert len(data["activity_series"]["records"]) == 2
+        assert b'"resolution": "DAILY"' in mock.bodies[0]
+
+        with pytest.raises(ValueError):
+            self.call("get_activity_series", SLUG, "2019-12-31", "2019-12-25")
+
+    def test_get_activity_series_windows(self):
+        """Test long ranges are fetched in windows and merged."""
+        data, mock = self.call(
+            "get_activity_series", SLUG, "2019-12-01", "2019-12-31", "HOURLY"
+        )
+        assert len(mock.requests) == 5
+        records = data["activity_series"]["records"]
+        assert [record["date"] for record in records] == ["2014-12-27", "2014-12-28"]
+
+    def test_post_endpoints(self):
+        """Test the POST statistics endpoints."""
+        data, _ = self.call("get_dog_similar_stats", SLUG)
+        assert data["similar_dogs_stats"]["this_best_daily_activity"] == 2300
+
+        data, _ = self.call("get_activity_totals", SLUG, "2019-12-25", "2019-12-31")
+        assert data["activity_value"] == 26305
+
+        data, _ = self.call("get_time_breakdown", SLUG, "2019-12-25", "2019-12-31")
+        assert data["activity_level"]["min_rest"] == 4498
+
+    def test_expired_token_refresh(self):
+        """Test an expired token is refreshed before the request."""
+        updated = []
+        mock = MockServer()
+        token = dict(TOKEN, expires_at=time.time() - 10)
+
+        async def go():
+            async with TestServer(mock.app) as server:
+                async with AsyncFitbarkApi(
+                    "foo",
+                    "faa",
+                    token=token,
+                    token_updater=updated.append,
+                    base_url=str(server.make_url("/api/v2")),
+                ) as api:
+                    return await api.get_user_profile()
+
+        data = run(go())
+        assert data["user"]["name"] == "John Smith"
+        assert mock.requests[0].path == "/oauth/token"
+        assert mock.bodies[0]["grant_type"] == "refresh_token"
+        assert mock.requests[1].headers["Authorization"] == "Bearer new_refresh_token"
+        assert updated[0]["access_token"] == "new_refresh_token"
+        assert "expires_at" in updated[0]
+
+    def test_single_flight_refresh(self):
+        """Test concurrent requests share one proactive refresh."""
+        mock = MockServer()
+        token = dict(TOKEN, expires_at=time.time() + 30)
+
+        async def go():
+            async with TestServer(mock.app) as server:
+                async with AsyncFitbarkApi(
+                    "foo",
+                    "faa",
+                    token=token,
+                    base_url=str(server.make_url("/api/v2")),
+                    refresh_margin=60,
+                ) as api:
+                    return await asyncio.gather(
+                        *(api.get_user_profile() for _ in range(10))
+                    )
+
+        run(go())
+        paths = [request.path for request in mock.requests]
+        assert paths.count("/oauth/token") == 1
+        assert paths.count("/api/v2/user") == 10
+
+    def test_retry(self):
+        """Test 5xx responses are retried."""
+        mock = MockServer()
+        statuses = [503, 502]
+
+        async def handler(request):
+            mock.requests.append(request)
+            if statuses:
+                return web.Response(status=statuses.pop(0))
+            return web.json_response({"user": {"name": "John Smith"}})
+
+        mock.app.router.add_get("/retry/user", handler)
+
+        async def go():
+            async with TestServer(mock.app) as server:
+                async with AsyncFitbarkApi(
+                    "foo",
+                    "faa",
+                    base_url=str(server.make_url("/retry")),
+                    retry=RetryPolicy(backoff_factor=0),
+                ) as api:
+                    return await api.get_user_profile()
+
+        assert run(go()) == {"user": {"name": "John Smith"}}
+        assert len(mock.requests) == 3
+
+    def test_request_token(self):
+        """Test AsyncFitbarkApi.request_token()."""
+        data, mock = self.call(
+            "request_token", "https://whatever.com/?code=mock_code&state=x"
+        )
+        assert data["access_token"] == "new_authorization_code"
+        assert mock.bodies[0]["code"] == "mock_code"
+
+    def test_get_authorization_url(self):
+        """Test AsyncFitbarkApi.get_authorization_url()."""
+        api = AsyncFitbarkApi("foo", "faa", "https://whatever.com")
+        url, state = api.get_authorization_url()
+        assert url.startswith("https://app.fitbark.com/oauth/authorize")
+        assert state in url
+
+    def test_hass_add_and_remove_url(self):
+        """Test the redirect url helpers."""
+        callback = "http://mock_url.com/auth/external/callback"
+        mock = MockServer()
+
+        async def go():
+            async with TestServer(mock.app) as server:
+                async with AsyncFitbarkApi(
+                    "foo",
+                    "faa",
+                    callback_url="http://mock_url.com",
+                    base_url=str(server.make_url("/api/v2")),
+                ) as api:
+                    await api.hass_add_url()
+                    added = mock.redirect_uri
+                    await api.hass_add_url()
+                    await api.hass_remove_url()
+                    return added
+
+        added = run(go())
+        assert added == f"urn:ietf:wg:oauth:2.0:oob\r{callback}"
+        assert mock.redirect_uri == "urn:ietf:wg:oauth:2.0:oob"
+        posts = [r for r in mock.requests if r.method == "POST"]
+        # Three token grants and two writes, the second add is a no-op.
+        assert len(posts) == 5
+
+    def test_shared_session(self):
+        """Test a caller supplied session is left open."""
+
+        async def go():
+            session = aiohttp.ClientSession()
+            api = AsyncFitbarkApi("foo", "faa", session=session)
+            assert api.session is session
+            await api.close()
+            closed = session.closed
+            await session.close()
+            return closed
+
+        assert run(go()) is False
@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+"""PyFitBark Cache Tests."""
+import datetime
+import os
+import time
+
+import httpretty
+
+import pytest
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from pyfitbark.api import BASE_URL, FitbarkApi
+from pyfitbark.const import _endpoint_template
+from pyfitbark.cache import (
+    FOREVER,
+    CachedResponse,
+    CachePolicy,
+    MemoryCache,
+    SQLiteCache,
+    cache_key,
+)
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+SLUG = "09659a8a-24c9-4246-92a8-7ecd0650368c"
+
+
+def entry(content=b"{}", expires=None):
+    """Return a CachedResponse."""
+    return CachedResponse(200, {"Content-Type": "application/json"}, content, expires)
+
+
+class TestCachePolicy:
+    """Unit tests for pyfitbark.cache.CachePolicy."""
+
+    def test_endpoint_template(self):
+        assert _endpoint_template("/user") == "/user"
+        assert _endpoint_template(f"/dog/{SLUG}") == "/dog/{slug}"
+        assert _endpoint_template(f"/picture/dog/{SLUG}") == "/picture/dog/{slug}"
+
+    def test_ttl(self):
+        policy = CachePolicy({("get", "/user"): 10, ("get", "/dog/{slug}"): 0})
+        assert policy.ttl("get", "/user") == 10
+        assert policy.ttl("get", "/dog/{slug}") is None
+        assert policy.ttl("get", "/picture/dog/{slug}") == 86400
+        assert policy.ttl("put", "/daily_goal/{slug}") is None
+
+    def test_activity_ttl(self):
+        today = datetime.date.today()
+        yesterday = today - datetime.timedelta(days=1)
+        past = today - datetime.timedelta(days=2)
+
+        def payload(date_to):
+            return {"dog": {"slug": SLUG, "from": "2019-01-01", "to": str(date_to)}}
+
+        policy = CachePolicy()
+        assert policy.ttl("post", "/activity_totals", payload(past)) == FOREVER
+        assert policy.ttl("post", "/activity_totals", payload(yesterday)) is None
+        assert policy.ttl("post", "/time_breakdown", payload(today)) is None
+
+        policy = CachePolicy(activity_ttl=60, settle_days=0)
+        assert policy.ttl("post", "/activity_series", payload(yesterday)) == FOREVER
+        assert policy.ttl("post", "/activity_series", payload(today)) == 60
+
+    def test_cache_key(self):
+        assert cache_key("get", "/user") == "GET /user"
+        assert cache_key("post", "/x", {"b": 1, "a": 2}) == cache_key(
+            "post", "/x", {"a": 2, "b": 1}
+        )
+
+
+class TestBackends:
+    """Unit tests for the cache backends."""
+
+    @pytest.fixture(params=["memory", "sqlite"])
+    def cache(self, request, tmp_path):
+        if request.param == "memory":
+            return MemoryCache(maxsize=2)
+        return SQLiteCache(str(tmp_path / "cache.sqlite"))
+
+    def test_get_set_delete(self, cache):
+        assert cache.get("a") is None
+        cache.set("a", entry(b"content"))
+        assert cache.get("a").content == b"content"
+        assert cache.get("a").headers["Content-Type"] == "application/json"
+        cache.delete("a")
+        assert cache.get("a") is None
+
+        cache.set("a", entry(expires=time.time() - 1))
+        assert cache.get("a", stale=True).expired
+        assert cache.get("a") is None
+        assert cache.get("a", stale=True) is None
+        cache.set("b", entry())
+        cache.clear()
+        assert len(cache) == 0
+
+    def test_validators(self):
+        assert entry().validators == {}
+
+        stored = CachedResponse(
+            200,
+            {"ETag": '"v1"', "Last-Modified": "Tue, 31 Dec 2019 00:00:00 GMT"},
+            b"{}",
+            time.time() - 1,
+        )
+        assert stored.validators == {
+            "If-None-Match": '"v1"',
+            "If-Modified-Since": "Tue, 31 Dec 2019 00:00:00 GMT",
+        }
+
+        response = requests.Response()
+        response.status_code = 304
+        response.headers = CaseInsensitiveDict({"etag": '"v2"', "Content-Length": "0"})
+        refreshed = stored.revalidated(response, 60)
+        assert not refreshed.expired
+        assert refreshed.content == b"{}"
+        assert refreshed.validators["If-None-Match"] == '"v2"'
+        assert "Content-Length" not in refreshed.headers
+
+    def test_lru(self):
+        cache = MemoryCache(maxsize=2)
+        cache.set("a", entry())
+        cache.set("b", entry())
+        cache.get("a")
+        cache.set("c", entry())
+        assert cache.get("b") is None
+        assert cache.get("a") is not None
+        assert len(cache) == 2
+
+    def test_sqlite_persists(self, tmp_path):
+        path = str(tmp_path / "cache.sqlite")
+        cache = SQLiteCache(path)
+        cache.set("a", entry(b"content"))
+        cache.set("b", entry(expires=time.time() - 1))
+        cache.purge()
+        cache.close()
+
+        cache = SQLiteCache(path)
+        assert len(cache) == 1
+        assert cache.get("a").content == b"content"
+
+
+class TestFitbarkApiCache:
+    """Tests for the cache in FitbarkApi._request()."""
+
+    @pytest.fixture
+    def api(self):
+        """Return MOCK Fitbark API with a cache."""
+        return FitbarkApi("foo", "faa", cache=MemoryCache())
+
+    def register(self, file, method, url):
+        with open(os.path.join(CURRENT_DIR, "json/", f"{file}.json"), "r") as o_file:
+            httpretty.register_uri(method, f"{BASE_URL}{url}", body=o_file.read())
+
+    @httpretty.activate
+    def test_get_cached(self, api):
+        self.register("get_dog", httpretty.GET, f"/dog/{SLUG}")
+
+        first = api.get_dog(SLUG)
+        second = api.get_dog(SLUG)
+        assert first == second
+        assert len(httpretty.latest_requests()) == 1
+        assert api.get(f"/dog/{SLUG}").from_cache
+
+    @httpretty.activate
+    def test_write_invalidates(self, api):
+        self.register("get_daily_goal", httpretty.GET, f"/daily_goal/{SLUG}")
+        self.register("get_daily_goal", httpretty.PUT, f"/daily_goal/{SLUG}")
+
+        api.get_daily_goal(SLUG)
+        assert len(api.cache) == 1
+        api.set_daily_goal(SLUG, {"daily_goal": 7000, "date": "2014-08-15"})
+        assert len(api.cache) == 0
+
+    @httpretty.activate
+    def test_activity_cached_once_past(self, api):
+        self.register("get_activity_totals", httpretty.POST, "/activity_totals")
+
+        api.get_activity_totals(SLUG, "2019-12-25", "2019-12-31")
+        api.get_activity_totals(SLUG, "2019-12-25", "2019-12-31")
+        assert len(api.cache) == 1
+
+        api.get_activity_totals(SLUG)
+        assert len(api.cache) == 1
+
+    @httpretty.activate
+    def test_errors_not_cached(self, api):
+        httpretty.register_uri(httpretty.GET, f"{BASE_URL}/user", status=500)
+
+        with pytest.raises(Exception):
+            api.get_user_profile()
+        assert len(api.cache) == 0
+
+    @httpretty.activate
+    def test_revalidate(self, api, monkeypatch):
+        with open(os.path.join(CURRENT_DIR, "json/get_dog.json"), "r") as o_file:
+            body = o_file.read()
+        httpretty.register_uri(
+            httpretty.GET,
+            f"{BASE_URL}/dog/{SLUG}",
+            responses=[
+                httpretty.Response(body=body, adding_headers={"ETag": '"v1"'}),
+                httpretty.Response(body="", status=304),
+                httpretty.Response(body='{"dog": {}}', adding_headers={"ETag": '"v2"'}),
+            ],
+        )
+
+        first = api.get_dog(SLUG)
+        now = time.time()
+        monkeypatch.setattr(time, "time", lambda: now + 3601)
+
+        r = api.get(f"/dog/{SLUG}")
+        assert r.status_code == 200
+        assert r.from_cache
+        assert r.json() == first
+        assert httpretty.last_request().headers["If-None-Match"] == '"v1"'
+        assert len(httpretty.latest_requests()) == 2
+
+        assert api.get_dog(SLUG) == first
+        assert len(httpretty.latest_requests()) == 2
+
+        monkeypatch.setattr(time, "time", lambda: now + 7202)
+        assert api.get_dog(SLUG) == {"dog": {}}
+        assert api.cache.get(cache_key("get", f"/dog/{SLUG}")).validators == {
+            "If-None-Match": '"v2"'
+        }
+
+        api.cache_policy.revalidate = False
+        monkeypatch.setattr(time, "time", lambda: now + 10803)
+        api.get(f"/dog/{SLUG}")
+        assert "If-None-Match" not in httpretty.last_request().headers
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""PyFitBark Codec Tests."""
+import importlib
+import json
+import sys
+
+import pytest
+
+from pyfitbark import codec
+
+DATA = {"user": {"name": "John Smith", "dogs": [1, 2.5, None, True]}}
+
+
+@pytest.fixture(params=codec.BACKENDS)
+def backend(request):
+    """Select each backend for a test."""
+    previous = codec.backend()
+    if request.param == "orjson" and codec.orjson is None:
+        pytest.skip("orjson is not installed")
+    codec.use(request.param)
+    yield request.param
+    codec.use(previous)
+
+
+class TestCodec:
+    """Unit tests for pyfitbark.codec."""
+
+    def test_loads(self, backend):
+        assert codec.backend() == backend
+        assert codec.loads(json.dumps(DATA)) == DATA
+        assert codec.loads(json.dumps(DATA).encode()) == DATA
+        with pytest.raises(ValueError):
+            codec.loads(b"{")
+
+    def test_dumps(self, backend):
+        assert json.loads(codec.dumps(DATA)) == DATA
+        assert codec.dumps(DATA, indent=True) == json.dumps(
+            DATA, indent=2, separators=(",", ": ")
+        )
+        assert json.loads(codec.dumps({1: 2**70})) == {"1": 2**70}
+
+    def test_use(self):
+        previous = codec.backend()
+        assert codec.use() == ("orjson" if codec.orjson is not None else "json")
+        with pytest.raises(ValueError):
+            codec.use("simplejson")
+        codec.use(previous)
+
+    @pytest.mark.parametrize("name", ["bogus", "orjson"])
+    def test_environment(self, monkeypatch, name):
+        previous = codec.backend()
+        monkeypatch.setenv("PYFITBARK_JSON", name)
+        if name == "orjson":
+            # Importing a module set to None in sys.modules raises ImportError.
+            monkeypatch.setitem(sys.modules, "orjson", None)
+        try:
+            with pytest.warns(RuntimeWarning, match="PYFITBARK_JSON"):
+                importlib.reload(codec)
+            assert codec.backend() == ("json" if name == "orjson" else codec.use())
+        finally:
+            monkeypatch.undo()
+            importlib.reload(codec)
+            codec.use(previous)
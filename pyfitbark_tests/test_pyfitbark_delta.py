@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""PyFitBark Delta Tests."""
+import json
+import os
+
+import pytest
+
+from pyfitbark.api import FitbarkApi
+from pyfitbark.delta import DeltaTracker
+from pyfitbark.watch import Watcher
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+SLUG = "21d131d5-9616-4e95-bbb2-02c631ef4268"
+OTHER = "036aa64a-96cc-4fec-bee9-2e3c843208a0"
+
+
+def load_records():
+    """Return the records of the activity series fixture."""
+    path = os.path.join(CURRENT_DIR, "json/", "get_activity_series.json")
+    with open(path, "r") as o_file:
+        return json.load(o_file)["activity_series"]["records"]
+
+
+class TestDeltaTracker:
+    """Unit tests for pyfitbark.delta.DeltaTracker."""
+
+    def test_update(self):
+        records = load_records()
+        seen = []
+        delta = DeltaTracker(callback=lambda slug, record: seen.append(slug))
+
+        assert delta.update(SLUG, records) == records
+        assert delta.update(SLUG, records) == []
+        assert delta.update(OTHER, records[:1]) == records[:1]
+
+        changed = dict(records[-1], activity_value=records[-1]["activity_value"] + 1)
+        new = dict(records[0], date="2020-01-01")
+        assert delta.update(SLUG, records[:-1] + [changed, new]) == [changed, new]
+        assert delta.last(SLUG, changed["date"]) == changed
+        assert seen == [SLUG] * len(records) + [OTHER, SLUG, SLUG]
+
+        delta.forget(SLUG)
+        assert delta.last(SLUG, changed["date"]) is None
+        assert delta.update(OTHER, records[:1]) == []
+        delta.forget()
+        assert delta.update(OTHER, records[:1]) == records[:1]
+
+    def test_iter_update(self):
+        records = load_records()
+        delta = DeltaTracker()
+        changes = delta.iter_update(SLUG, iter(records))
+        assert next(changes) == records[0]
+        changes.close()
+        assert delta.update(SLUG, records) == records[1:]
+
+    def test_max_records(self):
+        records = [{"date": f"2019-12-{day:02}"} for day in range(1, 11)]
+        delta = DeltaTracker(max_records=4)
+        assert delta.update(SLUG, records) == records
+        assert delta.update(SLUG, records[6:]) == []
+        assert delta.last(SLUG, "2019-12-06") is None
+        assert delta.update(SLUG, records[5:6]) == records[5:6]
+
+        with pytest.raises(ValueError):
+            DeltaTracker(max_records=0)
+
+    def test_watcher(self, monkeypatch):
+        polls = iter([[1, 1], [1, 2], [1, 2], [3, 2, 4]])
+
+        def get_activity_series(slug, date_from=None, date_to=None, resolution=None):
+            records = [
+                {"date": f"2019-12-31 1{hour}:00:00", "activity_value": value}
+                for hour, value in enumerate(next(polls))
+            ]
+            return {"activity_series": {"slug": slug, "records": records}}
+
+        api = FitbarkApi("foo", "faa")
+        monkeypatch.setattr(api, "get_activity_series", get_activity_series)
+        monkeypatch.setattr(api, "get_time_breakdown", lambda slug: {})
+
+        now = [0.0]
+        watcher = Watcher(
+            api,
+            [SLUG],
+            clock=lambda: now[0],
+            sleep=lambda seconds: now.__setitem__(0, now[0] + seconds),
+        )
+        changes = [
+            [record["activity_value"] for record in watcher.step().records]
+            for _ in range(4)
+        ]
+        assert changes == [[1, 1], [2], [], [3, 4]]
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""PyFitBark Fake Server Tests."""
+import datetime
+import os
+import time
+
+import pytest
+import requests
+
+from pyfitbark.api import FitbarkApi
+from pyfitbark.fake_server import FakeError, FakeFitbark, FakeServer, Faults
+from pyfitbark.models import ActivityRecord, DailyGoal, Dog, DogRelation, User
+from pyfitbark.retry import RetryPolicy
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURES = os.path.join(CURRENT_DIR, "json")
+SLUG = "21d131d5-9616-4e95-bbb2-02c631ef4268"
+NOW = datetime.datetime(2019, 12, 31, 10, 30)
+
+
+@pytest.fixture
+def fake():
+    """Return the fixtures and two synthetic dogs, at a fixed time."""
+    return FakeFitbark(dogs=2, fixtures=FIXTURES, now=lambda: NOW)
+
+
+@pytest.fixture
+def server(monkeypatch, fake):
+    """Serve the fake API in the background."""
+    monkeypatch.setenv("OAUTHLIB_INSECURE_TRANSPORT", "1")
+    with FakeServer(fake) as running:
+        yield running
+
+
+def client(server, **kwargs):
+    """Return a client of the fake server."""
+    kwargs.setdefault("token", {"access_token": "foo", "token_type": "Bearer"})
+    return FitbarkApi("foo", "faa", base_url=server.base_url, **kwargs)
+
+
+def series(fake, slug, date_from, date_to, resolution="DAILY"):
+    """Return the records of an activity_series request."""
+    query = {"slug": slug, "from": date_from, "to": date_to, "resolution": resolution}
+    return fake.handle("POST", "/activity_series", {"activity_series": query})[
+        "activity_series"
+    ]["records"]
+
+
+class TestFakeFitbark:
+    """Unit tests for pyfitbark.fake_server.FakeFitbark."""
+
+    def test_fixtures(self, fake):
+        assert User.from_response(fake.handle("GET", "/user", {})).name == "John Smith"
+        relations = DogRelation.from_response(fake.handle("GET", "/dog_relations", {}))
+        assert len(relations) == 4
+        assert relations[0].dog.name == "Bingle"
+        dog = Dog.from_response(
+            fake.handle("GET", f"/dog/{relations[-1].dog.slug}", {})
+        )
+        assert dog.daily_goal > 0
+
+        with pytest.raises(FakeError) as err:
+            fake.handle("GET", "/dog/unknown", {})
+        assert err.value.status == 404
+
+    def test_activity(self, fake):
+        slug = list(fake.dogs)[-1]
+        hourly = series(fake, slug, "2019-12-30", "2019-12-31", "HOURLY")
+        daily = series(fake, slug, "2019-12-30", "2020-01-02")
+
+        # Nothing after now, and the current hour covers 30 minutes.
+        assert len(hourly) == 24 + 11
+        assert hourly[-1]["date"] == "2019-12-31 10:00:00"
+        assert sum(hourly[-1][key] for key in ("min_play", "min_active", "min_rest"))
+        assert [record["date"] for record in daily] == ["2019-12-30", "2019-12-31"]
+
+        for day in daily:
+            hours = [hour for hour in hourly if hour["date"].startswith(day["date"])]
+            assert day["activity_value"] == sum(h["activity_value"] for h in hours)
+            assert ActivityRecord.from_dict(day).daily_target == fake.goal(
+                slug, NOW.date()
+            )
+        assert series(fake, slug, "2019-12-30", "2019-12-31", "HOURLY") == hourly
+
+        body = {"dog": {"slug": slug, "from": "2019-12-30", "to": "2019-12-31"}}
+        totals = fake.handle("POST", "/activity_totals", body)
+        assert totals["activity_value"] == sum(d["activity_value"] for d in daily)
+        breakdown = fake.handle("POST", "/time_breakdown", body)["activity_level"]
+        assert breakdown["min_play"] == sum(d["min_play"] for d in daily)
+
+        with pytest.raises(FakeError) as err:
+            series(fake, slug, "2019-12-01", "2019-12-31", "HOURLY")
+        assert err.value.status == 400
+
+    def test_daily_goal(self, fake):
+        path = f"/daily_goal/{SLUG}"
+        goal = {"daily_goal": 4000, "date": "2020-01-02"}
+        goals = DailyGoal.from_response(fake.handle("PUT", path, goal))
+        assert [(g.goal, g.date) for g in goals][-1] == (4000, "2020-01-02")
+        assert fake.goal(SLUG, datetime.date(2020, 1, 5)) == 4000
+
+        with pytest.raises(FakeError):
+            fake.handle("PUT", path, dict(goal, date="2019-12-01"))
+
+    def test_tokens(self, fake):
+        token = fake.token({"grant_type": "authorization_code", "code": "x"}, ttl=60)
+        fake.authorize(f"Bearer {token['access_token']}", strict=True)
+        fake.authorize("Bearer unknown")
+
+        with pytest.raises(FakeError):
+            fake.authorize("Bearer unknown", strict=True)
+        with pytest.raises(FakeError):
+            fake.authorize(None)
+
+        refreshed = fake.token(
+            {"grant_type": "refresh_token", "refresh_token": token["refresh_token"]}
+        )
+        assert refreshed["access_token"] != token["access_token"]
+        with pytest.raises(FakeError):
+            fake.token({"grant_type": "password"})
+
+
+class TestFakeServer:
+    """Tests of the clients against pyfitbark.fake_server.FakeServer."""
+
+    def test_endpoints(self, server):
+        with client(server) as api:
+            assert api.get_dog(SLUG)["dog"]["slug"] == SLUG
+            records = api.get_activity_series(
+                SLUG, "2019-10-01", "2019-12-31", resolution="DAILY"
+            )["activity_series"]["records"]
+            assert len(records) == 92
+            assert api.get_dog_picture_bytes(SLUG)
+            assert api.hass_update_urls(add=["https://x/cb"])[-1] == "https://x/cb"
+
+            with pytest.raises(requests.HTTPError):
+                api.get_dog("unknown")
+        assert server.counts[("GET", "/dog/{slug}", 404)] == 1
+        assert server.counts[("POST", "/activity_series", 200)] == 3
+
+    def test_faults(self, server):
+        server.faults = Faults(rate_429=1, retry_after=0)
+        with client(server) as api:
+            with pytest.raises(requests.HTTPError):
+                api.get_dog(SLUG)
+
+        server.faults = Faults(rate_429=0.3, rate_5xx=0.3, retry_after=0, seed=1)
+        retry = RetryPolicy(total=20, backoff_factor=0.001)
+        with client(server, retry=retry) as api:
+            for _ in range(10):
+                assert api.get_dog(SLUG)["dog"]["slug"] == SLUG
+        assert server.counts[("GET", "/dog/{slug}", 429)] > 1
+        assert server.counts[("GET", "/dog/{slug}", 503)] > 0
+
+    def test_token_expiry(self, server):
+        server.faults.token_ttl = 1
+        tokens = []
+        api = client(server, token=None, token_updater=tokens.append)
+        token = api.request_token(code="foo")
+        api.get_dog(SLUG)
+
+        # oauthlib rounds the expiry time to the second.
+        time.sleep(1.6)
+        stale = {"Authorization": f"Bearer {token['access_token']}"}
+        assert requests.get(f"{server.base_url}/user", headers=stale).status_code == 401
+
+        api.get_dog(SLUG)
+        assert len(tokens) == 1
+        assert tokens[0]["access_token"] != token["access_token"]
+        api.close()
@@ -3,12 +3,16 @@
 import os
 import builtins
 import io
+import subprocess
+import sys
+import threading
 import pytest
 
 import json
 
 from pyfitbark.api import FitbarkApi
-from pyfitbark.__main__ import argparser, MainClass, main
+from pyfitbark.__main__ import TOKEN_FILE, argparser, MainClass, main
+from pyfitbark.server import QueryServer
 
 CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
 
@@ -216,6 +220,7 @@ class TestFitbarkMain:
         assert isinstance(data, dict)
 
     def test_do_auth(self, api, monkeypatch):
+        assert isinstance(api.api, FitbarkApi)
         monkeypatch.setattr(os.path, "isfile", self.os_path_isfile_false)
         monkeypatch.setattr(
             FitbarkApi, "get_authorization_url", self.get_authorization_url
@@ -226,6 +231,17 @@ class TestFitbarkMain:
 
         api.do_auth()
 
+    def test_lazy_api(self, monkeypatch):
+        monkeypatch.setattr(builtins, "open", self.io_error)
+        main_class = MainClass(auth=False)
+        assert main_class._api is None
+
+        monkeypatch.setattr(builtins, "open", self.token_file_good)
+        monkeypatch.setattr(os.path, "isfile", lambda path: path != TOKEN_FILE)
+        monkeypatch.setattr(FitbarkApi, "get_authorization_url", self.io_error)
+        assert main_class.api is main_class.api
+        assert not main_class.api._oauth.token
+
     def test_get_token(self, api, monkeypatch):
         monkeypatch.setattr(builtins, "open", self.io_error)
         with pytest.raises(SystemExit):
@@ -292,6 +308,10 @@ class TestFitbarkMain:
         data = api.u_slug()
         assert isinstance(data, str)
 
+        monkeypatch.setattr(FitbarkApi, "get_user_profile", lambda self: {"user": {}})
+        with pytest.raises(ValueError):
+            api.u_slug()
+
     def test_u_pic(self, api, monkeypatch):
         monkeypatch.setattr(FitbarkApi, "get_user_profile", self.get_user_profile)
         monkeypatch.setattr(FitbarkApi, "get_user_picture", self.get_user_picture)
@@ -333,6 +353,237 @@ class TestFitbarkMain:
         data = api.d_pic()
         assert isinstance(data, list)
 
+    def test_pic_dir(self, api, monkeypatch, tmp_path):
+        monkeypatch.setattr(
+            FitbarkApi, "get_user_related_dogs", self.get_user_related_dogs
+        )
+        monkeypatch.setattr(FitbarkApi, "get_user_profile", self.get_user_profile)
+        monkeypatch.setattr(
+            FitbarkApi,
+            "cached_dog_picture",
+            lambda self, slug, picture_hash=None: f"{slug}/{picture_hash}",
+        )
+        monkeypatch.setattr(
+            FitbarkApi,
+            "cached_user_picture",
+            lambda self, slug, picture_hash=None: f"{slug}/{picture_hash}",
+        )
+
+        data = api.d_pic(str(tmp_path))
+        assert data == [f"{slug}/None" for slug in api.u_dog_slug()]
+        data = api.u_pic(str(tmp_path))
+        assert data == f"{api.u_slug()}/None"
+        assert argparser(["--dog-pic", "--pic-dir", "pics"]).pic_dir == "pics"
+
+    def test_export(self, api, monkeypatch):
+        monkeypatch.setattr(
+            FitbarkApi, "get_user_related_dogs", self.get_user_related_dogs
+        )
+        monkeypatch.setattr(
+            FitbarkApi,
+            "iter_activity_records",
+            lambda self, slug, *args, **kwargs: iter(
+                [{"date": "2019-12-30"}, {"date": "2019-12-31"}]
+            ),
+        )
+        monkeypatch.setattr(
+            FitbarkApi, "get_activity_totals", lambda self, *args: {"activity_value": 3}
+        )
+        monkeypatch.setattr(
+            FitbarkApi,
+            "get_time_breakdown",
+            lambda self, *args: {"activity_level": {"min_play": 1}},
+        )
+
+        out = io.StringIO()
+        assert api.export(out, "2019-12-30", "2019-12-31") == 4
+        lines = [json.loads(line) for line in out.getvalue().splitlines()]
+        slug = api.u_dog_slug()[0]
+        assert [line["type"] for line in lines] == [
+            "activity_series",
+            "activity_series",
+            "activity_totals",
+            "time_breakdown",
+        ]
+        assert lines[1] == {
+            "type": "activity_series",
+            "slug": slug,
+            "data": {"date": "2019-12-31"},
+        }
+        assert lines[2]["data"] == {"activity_value": 3}
+
+        opts = argparser(["--export", "--date-from", "2019-12-30", "-o", "out.json"])
+        assert opts.export
+        assert opts.date_from == "2019-12-30"
+        assert opts.output == "out.json"
+        assert opts.resolution == "DAILY"
+
+    def test_export_streams(self, api, monkeypatch):
+        monkeypatch.setattr(
+            FitbarkApi, "get_user_related_dogs", self.get_user_related_dogs
+        )
+        windows = []
+
+        def get_activity_window(self, slug, date_from, date_to, resolution):
+            windows.append(date_from)
+            records = [{"date": date_from}, {"date": date_to}]
+            return {"activity_series": {"slug": slug, "records": records}}
+
+        monkeypatch.setattr(FitbarkApi, "_get_activity_window", get_activity_window)
+        monkeypatch.setattr(FitbarkApi, "get_activity_totals", lambda self, *args: {})
+        monkeypatch.setattr(FitbarkApi, "get_time_breakdown", lambda self, *args: {})
+
+        fetched = []
+
+        class Out(io.StringIO):
+            def write(self, text):
+                fetched.append(len(windows))
+                return super().write(text)
+
+        out = Out()
+        assert api.export(out, "2019-01-01", "2019-12-31", jobs=3) == 18 + 2
+        # The first windows are written before the last is fetched.
+        assert len(windows) == 9
+        assert fetched[0] <= 4
+        dates = [
+            json.loads(line)["data"].get("date") for line in out.getvalue().splitlines()
+        ]
+        assert dates[:18] == sorted(dates[:18])
+
+    def test_jobs(self, api, monkeypatch):
+        relations = {
+            "dog_relations": [
+                {"dog": {"slug": f"dog-{i}", "picture_hash": ""}} for i in range(6)
+            ]
+        }
+        monkeypatch.setattr(FitbarkApi, "get_user_related_dogs", lambda self: relations)
+
+        def get_dog(self, slug):
+            if slug == "dog-3":
+                raise ValueError("not found")
+            return {"dog": {"slug": slug}}
+
+        monkeypatch.setattr(FitbarkApi, "get_dog", get_dog)
+        monkeypatch.setattr(
+            FitbarkApi,
+            "get_dog_picture",
+            lambda self, slug: {"image": {"data": slug}},
+        )
+        monkeypatch.setattr(
+            FitbarkApi,
+            "iter_activity_records",
+            lambda self, slug, *args, **kwargs: iter([{"date": slug}]),
+        )
+        monkeypatch.setattr(
+            FitbarkApi,
+            "get_activity_totals",
+            lambda self, slug, *args: get_dog(self, slug),
+        )
+        monkeypatch.setattr(FitbarkApi, "get_time_breakdown", lambda self, *args: {})
+
+        data = api.dog(jobs=4)
+        assert [dog["dog"]["slug"] for dog in data] == [
+            "dog-0",
+            "dog-1",
+            "dog-2",
+            "dog-4",
+            "dog-5",
+        ]
+        assert [(error.slug, str(error.error)) for error in api.errors] == [
+            ("dog-3", "not found")
+        ]
+
+        assert api.d_pic(jobs=4) == [f"dog-{i}" for i in range(6)]
+        assert len(api.errors) == 1
+
+        for jobs in (1, 4):
+            api.errors = []
+            out = io.StringIO()
+            written = api.export(out, jobs=jobs)
+            lines = [json.loads(line) for line in out.getvalue().splitlines()]
+            slugs = [line["slug"] for line in lines if line["type"] == "time_breakdown"]
+            assert slugs == ["dog-0", "dog-1", "dog-2", "dog-4", "dog-5"]
+            assert written == len(lines)
+            assert [error.slug for error in api.errors] == ["dog-3"]
+
+        assert argparser(["--dog", "-j", "8"]).jobs == 8
+        assert argparser(["--dog"]).jobs == 1
+
+    def test_watch(self, api, monkeypatch):
+        relations = {"dog_relations": [{"dog": {"slug": "dog-0"}}]}
+        monkeypatch.setattr(FitbarkApi, "get_user_related_dogs", lambda self: relations)
+        values = iter([1, 1, 2, None, 3])
+
+        def get_activity_series(self, slug, *args, **kwargs):
+            value = next(values)
+            if value is None:
+                raise ValueError("offline")
+            records = [{"date": "2019-12-31 10:00:00", "activity_value": value}]
+            return {"activity_series": {"slug": slug, "records": records}}
+
+        monkeypatch.setattr(FitbarkApi, "get_activity_series", get_activity_series)
+        monkeypatch.setattr(FitbarkApi, "get_time_breakdown", lambda self, slug: {})
+
+        now = [0.0]
+        out = io.StringIO()
+        written = api.watch(
+            out,
+            polls=5,
+            clock=lambda: now[0],
+            sleep=lambda seconds: now.__setitem__(0, now[0] + seconds),
+        )
+        lines = [json.loads(line) for line in out.getvalue().splitlines()]
+        assert written == len(lines) == 6
+        assert [line["data"].get("activity_value") for line in lines] == [
+            1,
+            None,
+            2,
+            None,
+            3,
+            None,
+        ]
+
+        opts = argparser(["--watch", "--budget", "120"])
+        assert opts.watch
+        assert opts.budget == 120
+
+    def test_connect(self, monkeypatch, tmp_path, capsys):
+        relations = {"dog_relations": [{"dog": {"slug": "dog-0"}}]}
+        monkeypatch.setattr(FitbarkApi, "get_user_related_dogs", lambda self: relations)
+        monkeypatch.setattr(FitbarkApi, "get_dog", lambda self, slug: {"slug": slug})
+        monkeypatch.setattr(
+            FitbarkApi,
+            "iter_activity_records",
+            lambda self, slug, *args, **kwargs: iter([{"date": "2019-12-31"}]),
+        )
+        monkeypatch.setattr(FitbarkApi, "get_activity_totals", lambda self, *args: {})
+        monkeypatch.setattr(FitbarkApi, "get_time_breakdown", lambda self, *args: {})
+
+        path = str(tmp_path / "pyfitbark.sock")
+        server = QueryServer(FitbarkApi("foo", "faa"), path)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        try:
+            main(["--connect", path, "--dog", "-j", "2"])
+            assert json.loads(capsys.readouterr().out) == [{"slug": "dog-0"}]
+
+            api = MainClass(connect=path)
+            out = io.StringIO()
+            assert api.export(out) == 3
+            assert json.loads(out.getvalue().splitlines()[0])["data"] == {
+                "date": "2019-12-31"
+            }
+        finally:
+            server.shutdown()
+            thread.join()
+            server.close()
+
+        assert argparser(["--serve"]).serve == "pyfitbark.sock"
+        assert argparser(["--connect", ":8765", "-u"]).connect == ":8765"
+        for opts in (["-g"], ["--dog-pic", "--pic-dir", "pics"], ["--serve"]):
+            with pytest.raises(SystemExit):
+                argparser(["--connect", *opts])
+
     def test_main(self, monkeypatch):
         monkeypatch.setattr(os.path, "isfile", self.os_path_isfile_true)
         monkeypatch.setattr(builtins, "open", self.token_file_good)
@@ -418,6 +669,23 @@ class TestFitbarkMain:
             monkeypatch.setattr(FitbarkApi, "get_dog_picture", self.get_dog_picture)
             main(["--dog-pic"])
 
+        def test_arg_export():
+            monkeypatch.setattr(
+                FitbarkApi, "get_user_related_dogs", self.get_user_related_dogs
+            )
+            monkeypatch.setattr(
+                FitbarkApi,
+                "iter_activity_records",
+                lambda self, *args, **kwargs: iter([]),
+            )
+            monkeypatch.setattr(
+                FitbarkApi, "get_activity_totals", lambda self, *args: {}
+            )
+            monkeypatch.setattr(
+                FitbarkApi, "get_time_breakdown", lambda self, *args: {}
+            )
+            main(["--export"])
+
         test_empty()
         # test_help():
         test_arg_get()
@@ -431,3 +699,61 @@ class TestFitbarkMain:
         test_arg_dog_slug()
         test_arg_dog()
         test_arg_dog_pic()
+        test_arg_export()
+
+        monkeypatch.setattr(FitbarkApi, "get_dog", self.io_error)
+        with pytest.raises(SystemExit):
+            main(["--dog", "--jobs", "2"])
+
+
+class TestStartup:
+    """Regression checks for the startup cost of the CLI."""
+
+    # Modules only commands talking to the API may load.
+    HEAVY = ("requests", "oauthlib", "requests_oauthlib", "aiohttp", "numpy")
+
+    @staticmethod
+    def run(tmp_path, *args):
+        """Run the CLI in an empty directory, returning the process."""
+        env = dict(os.environ)
+        env["PYTHONPATH"] = os.pathsep.join(
+            [os.path.dirname(CURRENT_DIR), env.get("PYTHONPATH", "")]
+        )
+        return subprocess.run(
+            [sys.executable, "-X", "importtime", "-m", "pyfitbark", *args],
+            cwd=str(tmp_path),
+            env=env,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            universal_newlines=True,
+        )
+
+    @staticmethod
+    def imported(stderr):
+        """Return the top level packages listed by -X importtime."""
+        return {
+            line.split("|")[-1].strip().split(".")[0]
+            for line in stderr.splitlines()
+            if line.startswith("import time:")
+        }
+
+    def test_help(self, tmp_path):
+        proc = self.run(tmp_path, "--help")
+        assert proc.returncode == 0
+        assert "usage: pyfitbark" in proc.stdout
+        assert not self.imported(proc.stderr).intersection(self.HEAVY)
+        assert os.listdir(str(tmp_path)) == []
+
+    def test_argument_error(self, tmp_path):
+        proc = self.run(tmp_path, "--resolution", "WEEKLY")
+        assert proc.returncode == 2
+        assert not self.imported(proc.stderr).intersection(self.HEAVY)
+        assert os.listdir(str(tmp_path)) == []
+
+    def test_lazy_package(self):
+        import pyfitbark
+
+        assert "FitbarkApi" in dir(pyfitbark)
+        assert pyfitbark.FitbarkApi is FitbarkApi
+        with pytest.raises(AttributeError):
+            pyfitbark.missing  # pylint: disable=pointless-statement
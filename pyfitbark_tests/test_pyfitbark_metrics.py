@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""PyFitBark Metrics Tests."""
+import urllib.request
+
+import pytest
+import requests
+
+from pyfitbark.api import FitbarkApi
+from pyfitbark.cache import MemoryCache
+from pyfitbark.fake_server import FakeFitbark, FakeServer, Faults
+from pyfitbark.metrics import Histogram, Metrics, MetricsServer, RequestEvent
+from pyfitbark.retry import RetryPolicy
+
+TOKEN = {"access_token": "foo", "token_type": "Bearer"}
+
+
+@pytest.fixture
+def server(monkeypatch):
+    """Serve two fake dogs in the background."""
+    monkeypatch.setenv("OAUTHLIB_INSECURE_TRANSPORT", "1")
+    with FakeServer(FakeFitbark(dogs=2)) as running:
+        running.slug = next(iter(running.fake.dogs))
+        yield running
+
+
+def event(endpoint="/dog/{slug}", status=200, latency=0.02, **fields):
+    """Return a completed request event."""
+    result = RequestEvent("get", endpoint)
+    result.status = status
+    result.latency = latency
+    for name, value in fields.items():
+        setattr(result, name, value)
+    return result
+
+
+class TestHistogram:
+    """Unit tests for pyfitbark.metrics.Histogram."""
+
+    def test_observe(self):
+        histogram = Histogram([0.1, 1])
+        for value in (0.05, 0.1, 0.5, 5):
+            histogram.observe(value)
+        assert histogram.cumulative() == [(0.1, 2), (1, 3), (float("inf"), 4)]
+        assert histogram.sum == pytest.approx(5.65)
+        assert histogram.quantile(0.5) == 0.1
+        assert histogram.quantile(0.75) == 1
+        assert Histogram().quantile(0.5) == 0.0
+
+
+class TestMetrics:
+    """Unit tests for pyfitbark.metrics.Metrics."""
+
+    def test_prometheus(self):
+        metrics = Metrics(buckets=[0.01, 0.1])
+        metrics.observe(event(bytes_in=100, bytes_out=10, retries=2, cache="miss"))
+        metrics.observe(event(cache="hit", latency=0.001))
+        metrics.observe(event("/user", status=None, token_refreshes=1))
+
+        text = metrics.prometheus()
+        for line in (
+            "# TYPE pyfitbark_requests_total counter",
+            'pyfitbark_requests_total{method="GET",endpoint="/dog/{slug}",status="200"} 2',
+            'pyfitbark_requests_total{method="GET",endpoint="/user",status="error"} 1',
+            'pyfitbark_request_retries_total{method="GET",endpoint="/dog/{slug}"} 2',
+            'pyfitbark_request_bytes_total{method="GET",endpoint="/dog/{slug}"} 10',
+            'pyfitbark_response_bytes_total{method="GET",endpoint="/dog/{slug}"} 100',
+            'pyfitbark_cache_requests_total{endpoint="/dog/{slug}",result="hit"} 1',
+            "pyfitbark_token_refreshes_total 1",
+            "# TYPE pyfitbark_request_duration_seconds histogram",
+            'pyfitbark_request_duration_seconds_bucket{method="GET",'
+            'endpoint="/dog/{slug}",le="0.01"} 1',
+            'pyfitbark_request_duration_seconds_bucket{method="GET",'
+            'endpoint="/dog/{slug}",le="+Inf"} 2',
+            'pyfitbark_request_duration_seconds_count{method="GET",'
+            'endpoint="/dog/{slug}"} 2',
+        ):
+            assert line in text.splitlines()
+
+        metrics.reset()
+        assert "pyfitbark_requests_total{" not in metrics.prometheus()
+
+    def test_labels(self):
+        metrics = Metrics()
+        metrics.observe(event('/a"b\\c'))
+        assert 'endpoint="/a\\"b\\\\c"' in metrics.prometheus()
+
+    def test_write(self, tmp_path):
+        metrics = Metrics()
+        metrics.observe(event())
+        path = tmp_path / "pyfitbark.prom"
+        metrics.write(str(path))
+        assert path.read_text() == metrics.prometheus()
+        assert [p.name for p in tmp_path.iterdir()] == ["pyfitbark.prom"]
+
+    def test_server(self):
+        metrics = Metrics()
+        metrics.observe(event())
+        with MetricsServer(metrics, port=0) as server:
+            with urllib.request.urlopen(server.url) as response:
+                assert response.headers["Content-Type"].startswith("text/plain")
+                assert response.read().decode() == metrics.prometheus()
+
+
+class TestHooks:
+    """Tests of the request hooks of pyfitbark.api.FitbarkApi."""
+
+    def test_events(self, server):
+        before, after = [], []
+        api = FitbarkApi(
+            "foo",
+            "faa",
+            token=TOKEN,
+            base_url=server.base_url,
+            cache=MemoryCache(),
+            before_request=lambda e: before.append((e.method, e.endpoint, e.status)),
+            after_request=after.append,
+        )
+        api.get_dog(server.slug)
+        api.get_dog(server.slug)
+        api.get_activity_series(server.slug)
+        api.get_dog_picture_bytes(server.slug)
+
+        assert before == [
+            ("GET", "/dog/{slug}", None),
+            ("GET", "/dog/{slug}", None),
+            ("POST", "/activity_series", None),
+            ("GET", "/picture/dog/{slug}", None),
+        ]
+        miss, hit, series, picture = after
+        assert (miss.status, miss.cache, hit.cache) == (200, "miss", "hit")
+        assert miss.bytes_in > 0 and miss.bytes_out == 0
+        assert hit.bytes_in == 0 and hit.latency < miss.latency
+        assert series.bytes_out > 0 and series.cache is None
+        assert picture.bytes_in > 0
+        assert all(e.retries == 0 and e.token_refreshes == 0 for e in after)
+
+    def test_retries_and_refreshes(self, server):
+        server.faults = Faults(rate_429=0.5, retry_after=0, token_ttl=30, seed=3)
+        metrics = Metrics()
+        api = FitbarkApi(
+            "foo",
+            "faa",
+            base_url=server.base_url,
+            retry=RetryPolicy(total=20, backoff_factor=0.001),
+            refresh_margin=60,
+            token_updater=lambda token: None,
+            after_request=metrics.observe,
+        )
+        api.request_token(code="foo")
+        for _ in range(5):
+            api.get_dog(server.slug)
+
+        assert metrics.requests[("GET", "/dog/{slug}", "200")] == 5
+        retries = metrics.retries[("GET", "/dog/{slug}")]
+        assert retries == server.counts[("GET", "/dog/{slug}", 429)] > 0
+        # Every token expires within the refresh margin, so each attempt refreshes.
+        assert metrics.token_refreshes == 5 + retries
+
+    def test_hass(self, server):
+        metrics = Metrics()
+        api = FitbarkApi(
+            "foo", "faa", base_url=server.base_url, after_request=metrics.observe
+        )
+        api.hass_get_redirect_urls()
+        assert set(metrics.requests) == {
+            ("POST", "/oauth/token", "200"),
+            ("GET", "/redirect_urls", "200"),
+        }
+
+    def test_error(self, server):
+        after = []
+        api = FitbarkApi(
+            "foo",
+            "faa",
+            token=TOKEN,
+            base_url=server.base_url,
+            after_request=after.append,
+        )
+        server.stop()
+        with pytest.raises(requests.ConnectionError):
+            api.get_user_profile()
+        assert after[0].status is None
+        assert isinstance(after[0].error, requests.ConnectionError)
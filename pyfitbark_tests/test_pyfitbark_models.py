@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""PyFitBark Models Tests."""
+import json
+import os
+
+import pytest
+
+from pyfitbark.models import (
+    ActivityRecord,
+    DailyGoal,
+    Dog,
+    DogRelation,
+    Picture,
+    TimeBreakdown,
+    User,
+    UserRelation,
+)
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def load(file):
+    """Return a response fixture."""
+    with open(os.path.join(CURRENT_DIR, "json/", f"{file}.json"), "r") as o_file:
+        return json.load(o_file)
+
+
+class TestModels:
+    """Unit tests for pyfitbark.models."""
+
+    def test_user(self):
+        data = load("get_user_profile")
+        user = User.from_response(data)
+        assert user.slug == "00000000-zzzz-1111-2222-xxxxxxxxxxxx"
+        assert user.picture_hash == "fdszgxcfkhgjlbnm"
+        assert user.raw is data["user"]
+        assert user["name"] == user.name
+        assert User({}).slug is None
+        # Class access returns the field, e.g. for autodoc.
+        assert User.slug.key == "slug"
+
+    def test_dog(self):
+        dog = Dog.from_response(load("get_dog"))
+        assert dog.name == "Rose"
+        assert dog.neutered is True
+        assert dog.tzoffset == -21600
+        assert dog.breed1["name"] == "Chesapeake Bay Retriever"
+        assert dog.medical_conditions[0]["name"] == "Overweight"
+        assert dog == Dog.from_response(load("get_dog"))
+        assert not hasattr(dog, "__dict__")
+        with pytest.raises(AttributeError):
+            dog.color = "brown"
+
+    def test_relations(self):
+        relations = DogRelation.from_response(load("get_user_related_dogs"))
+        assert relations[0].status == "OWNER"
+        assert relations[0].dog.slug == "21d131d5-9616-4e95-bbb2-02c631ef4268"
+        assert relations[0].dog.neutered is False
+
+        users = UserRelation.from_response(load("get_dog_related_users"))
+        assert users[0].dog_slug == "21d131d5-9616-4e95-bbb2-02c631ef4268"
+        assert users[0].user.username == "fake_001@fitbark.com"
+
+    def test_small_models(self):
+        goals = DailyGoal.from_response(load("get_daily_goal"))
+        assert [(goal.goal, goal.date) for goal in goals] == [(1091, "2019-12-31")]
+
+        breakdown = TimeBreakdown.from_response(load("get_time_breakdown"))
+        assert (breakdown.min_play, breakdown.min_active, breakdown.min_rest) == (
+            321,
+            941,
+            4498,
+        )
+
+        picture = Picture.from_response(load("get_dog_picture"))
+        assert picture.data.startswith("/9j/")
+
+    def test_activity_record(self):
+        data = load("get_activity_series")
+        records = ActivityRecord.from_response(data)
+        assert not isinstance(records, list)
+
+        records = list(records)
+        raw = data["activity_series"]["records"]
+        assert [record.raw for record in records] == raw
+        assert records[1].activity_value == 5421
+        assert records[0].has_trophy is False
+        assert not hasattr(records[0], "__dict__")
+
+        record = ActivityRecord.from_dict(
+            {"date": "2019-12-31", "has_trophy": "True", "min_play": 1, "note": "x"}
+        )
+        assert record.has_trophy is True
+        assert record.extra == {"note": "x"}
+        assert record.raw["note"] == "x"
+        assert record == ActivityRecord.from_dict(record.raw)
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""PyFitBark Pictures Tests."""
+import base64
+import hashlib
+import io
+import json
+import os
+
+import httpretty
+
+import pytest
+
+from pyfitbark.api import BASE_URL, FitbarkApi
+from pyfitbark.pictures import PictureCache, decode_picture, write_picture
+
+SLUG = "09659a8a-24c9-4246-92a8-7ecd0650368c"
+IMAGE = bytes(range(256)) * 64
+
+
+def body(image=IMAGE, escape=False):
+    """Return a picture response body."""
+    data = base64.b64encode(image).decode()
+    text = json.dumps({"image": {"data": data}}, indent=4)
+    if escape:
+        text = text.replace("/", "\\/")
+    return text.encode()
+
+
+def chunked(data, size):
+    """Split bytes into chunks."""
+    return [data[i : i + size] for i in range(0, len(data), size)]
+
+
+class TestDecodePicture:
+    """Unit tests for pyfitbark.pictures.decode_picture."""
+
+    @pytest.mark.parametrize("size", [1, 3, 7, 1000, 1 << 20])
+    @pytest.mark.parametrize("escape", [False, True])
+    def test_chunks(self, size, escape):
+        out = io.BytesIO()
+        digest = decode_picture(chunked(body(escape=escape), size), out)
+        assert out.getvalue() == IMAGE
+        assert digest == hashlib.sha256(IMAGE).hexdigest()
+
+    def test_padding(self):
+        for image in (b"a", b"ab", b"abc", b""):
+            out = io.BytesIO()
+            decode_picture(chunked(body(image), 2), out)
+            assert out.getvalue() == image
+
+    def test_invalid(self):
+        with pytest.raises(ValueError):
+            decode_picture([b'{"error": "not found"}'], io.BytesIO())
+        with pytest.raises(ValueError):
+            decode_picture([b'{"image": {"data": "AAA'], io.BytesIO())
+
+    def test_write_picture(self, tmp_path):
+        path = str(tmp_path / "picture.jpg")
+        digest = write_picture(chunked(body(), 100), path)
+        with open(path, "rb") as picture:
+            assert picture.read() == IMAGE
+        assert digest == hashlib.sha256(IMAGE).hexdigest()
+
+        with pytest.raises(ValueError):
+            write_picture([b"{}"], path)
+        with open(path, "rb") as picture:
+            assert picture.read() == IMAGE
+        assert os.listdir(str(tmp_path)) == ["picture.jpg"]
+
+
+class TestPictureCache:
+    """Unit tests for pyfitbark.pictures.PictureCache."""
+
+    def test_add(self, tmp_path):
+        cache = PictureCache(str(tmp_path / "pictures"))
+        assert cache.get(SLUG, "abc") is None
+        assert cache.get(SLUG, None) is None
+
+        path = cache.add(SLUG, [body()], "abc")
+        assert path == str(tmp_path / "pictures" / SLUG / "abc")
+        assert cache.get(SLUG, "abc") == path
+
+        path = cache.add(SLUG, [body()])
+        assert os.path.basename(path) == hashlib.sha256(IMAGE).hexdigest()
+        assert sorted(os.listdir(os.path.dirname(path))) == sorted(
+            ["abc", os.path.basename(path)]
+        )
+
+        for key in ("", "..", "a/b"):
+            with pytest.raises(ValueError):
+                cache.path(SLUG, key)
+
+
+class TestFitbarkApiPictures:
+    """Tests for the streaming picture methods of FitbarkApi."""
+
+    @pytest.fixture
+    def api(self, tmp_path):
+        """Return MOCK Fitbark API with a picture cache."""
+        return FitbarkApi("foo", "faa", pictures=PictureCache(str(tmp_path)))
+
+    @httpretty.activate
+    def test_pictures(self, api, tmp_path):
+        httpretty.register_uri(
+            httpretty.GET, f"{BASE_URL}/picture/dog/{SLUG}", body=body(escape=True)
+        )
+        httpretty.register_uri(
+            httpretty.GET, f"{BASE_URL}/picture/user/{SLUG}", body=body()
+        )
+
+        assert api.get_dog_picture_bytes(SLUG) == IMAGE
+        assert api.get_user_picture_bytes(SLUG) == IMAGE
+
+        path = str(tmp_path / "dog.jpg")
+        assert api.save_dog_picture(SLUG, path) == hashlib.sha256(IMAGE).hexdigest()
+        api.save_user_picture(SLUG, str(tmp_path / "user.jpg"))
+
+        path = api.cached_dog_picture(SLUG, "c8ba24128de5e2e2631b74ee1f2cb5ba")
+        with open(path, "rb") as picture:
+            assert picture.read() == IMAGE
+        requests = len(httpretty.latest_requests())
+        assert api.cached_dog_picture(SLUG, "c8ba24128de5e2e2631b74ee1f2cb5ba") == path
+        assert len(httpretty.latest_requests()) == requests
+
+        assert api.cached_user_picture(SLUG).endswith(hashlib.sha256(IMAGE).hexdigest())
+
+        api.pictures = None
+        with pytest.raises(ValueError):
+            api.cached_dog_picture(SLUG)
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""PyFitBark Retry Tests."""
+import email.utils
+import time
+
+import httpretty
+
+import pytest
+
+import requests
+
+from requests_oauthlib import OAuth2Session
+
+import pyfitbark.api
+from pyfitbark.api import BASE_URL, FitbarkApi
+from pyfitbark.retry import RetryPolicy, parse_retry_after
+
+
+class TestRetryPolicy:
+    """Unit tests for pyfitbark.retry.RetryPolicy."""
+
+    def test_parse_retry_after(self):
+        assert parse_retry_after(None) is None
+        assert parse_retry_after("") is None
+        assert parse_retry_after("garbage") is None
+        assert parse_retry_after("120") == 120
+        assert parse_retry_after("-5") == 0
+
+        date = email.utils.formatdate(time.time() + 60, usegmt=True)
+        assert 55 < parse_retry_after(date) <= 60
+        date = email.utils.formatdate(time.time() - 60, usegmt=True)
+        assert parse_retry_after(date) == 0
+
+    def test_allows(self):
+        policy = RetryPolicy(total=2)
+        assert policy.allows("GET", 0)
+        assert policy.allows("put", 1)
+        assert not policy.allows("get", 2)
+        assert not policy.allows("post", 0)
+        assert RetryPolicy(methods=["get", "post"]).allows("post", 0)
+
+        assert policy.retry_status(429)
+        assert policy.retry_status(503)
+        assert not policy.retry_status(404)
+
+    def test_delay(self):
+        policy = RetryPolicy(backoff_factor=1, max_backoff=5, max_retry_after=60)
+        for retries in range(6):
+            assert 0 <= policy.delay(retries) <= min(5, 2**retries)
+        assert policy.delay(0, "30") == 30
+        assert policy.delay(0, "90") is None
+
+
+class TestFitbarkApiRetry:
+    """Tests for retries in FitbarkApi._request()."""
+
+    @pytest.fixture
+    def sleeps(self, monkeypatch):
+        sleeps = []
+        monkeypatch.setattr(pyfitbark.api.time, "sleep", sleeps.append)
+        return sleeps
+
+    @pytest.fixture
+    def api(self):
+        """Return MOCK Fitbark API retrying twice."""
+        return FitbarkApi("foo", "faa", retry=RetryPolicy(total=2, backoff_factor=0))
+
+    @httpretty.activate
+    def test_retry_status(self, api, sleeps):
+        httpretty.register_uri(
+            httpretty.GET,
+            f"{BASE_URL}/user",
+            responses=[
+                httpretty.Response(body="", status=503),
+                httpretty.Response(
+                    body="", status=429, adding_headers={"Retry-After": "7"}
+                ),
+                httpretty.Response(body='{"user": {}}', status=200),
+            ],
+        )
+
+        assert api.get_user_profile() == {"user": {}}
+        assert sleeps == [0, 7]
+
+    @httpretty.activate
+    def test_retry_gives_up(self, api, sleeps):
+        httpretty.register_uri(httpretty.GET, f"{BASE_URL}/user", status=500, body="")
+
+        with pytest.raises(requests.HTTPError):
+            api.get_user_profile()
+        assert len(sleeps) == 2
+
+    @httpretty.activate
+    def test_post_not_retried(self, api, sleeps):
+        httpretty.register_uri(
+            httpretty.POST, f"{BASE_URL}/similar_dogs_stats", status=503, body=""
+        )
+
+        with pytest.raises(requests.HTTPError):
+            api.get_dog_similar_stats("slug")
+        assert not sleeps
+
+    def test_retry_connection_error(self, api, sleeps, monkeypatch):
+        attempts = []
+        response = requests.Response()
+        response.status_code = 200
+
+        def mock_get(session, url, **kwargs):  # pylint: disable=unused-argument
+            attempts.append(url)
+            if len(attempts) < 3:
+                raise requests.ConnectionError("reset")
+            return response
+
+        monkeypatch.setattr(OAuth2Session, "get", mock_get)
+        assert api.get("/user") is response
+        assert len(attempts) == 3
+
+        attempts.clear()
+        api.retry = None
+        with pytest.raises(requests.ConnectionError):
+            api.get("/user")
+        assert len(attempts) == 1
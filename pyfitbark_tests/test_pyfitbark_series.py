@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""PyFitBark Series Tests."""
+import os
+
+import json
+
+import pytest
+
+import pyfitbark.series
+from pyfitbark.series import ActivitySeries
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def hourly_records():
+    """Return two days of hourly records."""
+    records = []
+    for day in ("2019-12-30", "2019-12-31"):
+        for hour in range(24):
+            records.append(
+                {
+                    "date": f"{day} {hour:02d}:00:00",
+                    "activity_value": hour,
+                    "min_play": 1,
+                    "min_active": 2,
+                    "min_rest": 57,
+                    "daily_target": 100 if day == "2019-12-30" else 300,
+                    "has_trophy": 0,
+                }
+            )
+    return records
+
+
+class TestActivitySeries:
+    """Unit tests for pyfitbark.series.ActivitySeries."""
+
+    @pytest.fixture(params=["numpy", "array"])
+    def backend(self, request, monkeypatch):
+        if request.param == "numpy":
+            pytest.importorskip("numpy")
+        else:
+            monkeypatch.setattr(pyfitbark.series, "numpy", None)
+        return request.param
+
+    @pytest.fixture
+    def series(self, backend):
+        with open(os.path.join(CURRENT_DIR, "json/", "get_activity_series.json")) as f:
+            return ActivitySeries.from_response(json.loads(f.read()))
+
+    def test_columns(self, series, backend):
+        assert len(series) == 2
+        assert series.dates == ["2014-12-27", "2014-12-28"]
+        assert list(series.activity_value) == [921, 5421]
+        assert list(series["min_rest"]) == [1300, 838]
+        assert series.activity_value.itemsize == 4
+        assert series.has_trophy.itemsize == 1
+        with pytest.raises(KeyError):
+            series["date"]
+        with pytest.raises(AttributeError):
+            series.other = 1
+
+    def test_to_records(self, series):
+        records = series.to_records()
+        assert records[1] == {
+            "date": "2014-12-28",
+            "activity_value": 5421,
+            "min_play": 114,
+            "min_active": 484,
+            "min_rest": 838,
+            "daily_target": 5000,
+            "has_trophy": 1,
+        }
+
+    def test_aggregations(self, series):
+        assert series.sum() == 6342
+        assert series.sum("min_play") == 129
+        assert series.mean() == 3171
+        assert list(series.goal_ratios()) == [921 / 5000, 5421 / 5000]
+        assert series.goal_attainment() == 0.5
+
+        empty = ActivitySeries([])
+        assert empty.sum() == 0
+        assert empty.mean() == 0
+        assert empty.goal_attainment() == 0
+
+    def test_goal_ratio_without_target(self, backend):
+        series = ActivitySeries(["2019-12-31"], activity_value=[10])
+        assert list(series.goal_ratios()) == [0]
+
+    def test_rolling_mean(self, backend):
+        series = ActivitySeries(["a", "b", "c", "d"], activity_value=[1, 2, 3, 6])
+        assert list(series.rolling_mean(window=2)) == [1.5, 2.5, 4.5]
+        assert list(series.rolling_mean(window=4)) == [3]
+        assert list(series.rolling_mean(window=5)) == []
+        with pytest.raises(ValueError):
+            series.rolling_mean(window=0)
+
+    def test_resample(self, backend):
+        series = ActivitySeries.from_records(hourly_records())
+        daily = series.resample()
+        assert daily.dates == ["2019-12-30", "2019-12-31"]
+        assert list(daily.activity_value) == [276, 276]
+        assert list(daily.min_rest) == [24 * 57, 24 * 57]
+        assert list(daily.daily_target) == [100, 300]
+
+        assert series.resample("WEEKLY").dates == ["2019-12-30"]
+        monthly = series.resample("MONTHLY")
+        assert monthly.dates == ["2019-12"]
+        assert list(monthly.activity_value) == [552]
+        assert list(monthly.daily_target) == [300]
+        assert len(ActivitySeries([]).resample()) == 0
+
+        with pytest.raises(ValueError):
+            series.resample("YEARLY")
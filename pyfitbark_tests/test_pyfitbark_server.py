@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""PyFitBark Server Tests."""
+import os
+import socket
+import stat
+import threading
+
+import pytest
+
+import requests
+
+from pyfitbark.api import FitbarkApi
+from pyfitbark.server import (
+    QueryClient,
+    QueryServer,
+    ServerError,
+    parse_address,
+)
+
+SLUG = "21d131d5-9616-4e95-bbb2-02c631ef4268"
+
+
+def get_dog(slug):
+    """Return a dog, failing with a 404 for unknown slugs."""
+    if slug != SLUG:
+        response = requests.Response()
+        response.status_code = 404
+        raise requests.HTTPError("404 Client Error: Not Found", response=response)
+    return {"dog": {"slug": slug, "name": "Rose"}}
+
+
+def iter_activity_records(slug, date_from=None, date_to=None, resolution="DAILY"):
+    """Yield two records."""
+    for day in ("2019-12-30", "2019-12-31"):
+        yield {"date": day, "activity_value": len(resolution)}
+
+
+@pytest.fixture
+def api(monkeypatch):
+    """Return a client answering without requests."""
+    client = FitbarkApi("foo", "faa")
+    monkeypatch.setattr(client, "get_dog", get_dog)
+    monkeypatch.setattr(client, "iter_activity_records", iter_activity_records)
+    return client
+
+
+@pytest.fixture(params=["unix", "tcp"])
+def address(request, tmp_path):
+    """Return a socket path or a localhost port chosen by the OS."""
+    if request.param == "tcp":
+        return "127.0.0.1:0"
+    return str(tmp_path / "pyfitbark.sock")
+
+
+@pytest.fixture
+def server(api, address):
+    """Run a server in a thread."""
+    server = QueryServer(api, address)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    yield server
+    server.shutdown()
+    thread.join()
+    server.close()
+
+
+def connect(server):
+    """Return a client of server."""
+    if isinstance(server.address, tuple):
+        return QueryClient("%s:%s" % server.address)
+    return QueryClient(server.address)
+
+
+class TestQueryServer:
+    """Unit tests for pyfitbark.server."""
+
+    def test_parse_address(self):
+        assert parse_address("localhost:8765") == ("localhost", 8765)
+        assert parse_address(":8765") == ("127.0.0.1", 8765)
+        assert parse_address("pyfitbark.sock") == "pyfitbark.sock"
+        assert parse_address("/run/a:1") == "/run/a:1"
+
+    def test_query(self, server):
+        with connect(server) as client:
+            assert client.get_dog(SLUG) == get_dog(SLUG)
+            assert client.call("get_dog", slug=SLUG) == get_dog(SLUG)
+            assert client.iter_activity_records(SLUG, resolution="HOURLY") == [
+                {"date": "2019-12-30", "activity_value": 6},
+                {"date": "2019-12-31", "activity_value": 6},
+            ]
+
+            with pytest.raises(ServerError) as err:
+                client.get_dog("unknown")
+            assert err.value.kind == "HTTPError"
+            assert err.value.status == 404
+
+            with pytest.raises(ServerError) as err:
+                client.call("hass_get_token")
+            assert err.value.kind == "ValueError"
+            with pytest.raises(AttributeError):
+                client.hass_get_token  # pylint: disable=pointless-statement
+
+            # The connection is still usable after errors.
+            assert client.get_dog(SLUG) == get_dog(SLUG)
+
+    def test_map_slugs(self, server):
+        with connect(server) as client:
+            results = client.map_slugs(client.get_dog, [SLUG, "unknown", SLUG], 3)
+        assert [result.data for result in results] == [
+            get_dog(SLUG),
+            None,
+            get_dog(SLUG),
+        ]
+        assert isinstance(results[1].error, ServerError)
+
+    def test_get_dogs(self, server):
+        with connect(server) as client:
+            results = client.get_dogs([SLUG, "unknown"])
+            assert [result.slug for result in results] == [SLUG, "unknown"]
+            assert results[0].data == get_dog(SLUG)
+            assert results[0].error is None
+            assert results[1].data is None
+            assert isinstance(results[1].error, ServerError)
+            assert results[1].error.kind == "HTTPError"
+            assert results[1].error.status == 404
+
+    def test_unix_socket(self, api, tmp_path):
+        path = str(tmp_path / "pyfitbark.sock")
+        with QueryServer(api, path) as server:
+            assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+            with pytest.raises(OSError):
+                QueryServer(api, path)
+        assert not os.path.exists(path)
+
+        # A socket left by a server which died is replaced.
+        stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stale.bind(path)
+        stale.close()
+        with QueryServer(api, path) as server:
+            assert server.address == path
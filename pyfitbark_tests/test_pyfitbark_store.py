@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+"""PyFitBark Store Tests."""
+import datetime
+import json
+import time
+
+import httpretty
+
+import pytest
+
+from pyfitbark.api import BASE_URL, FitbarkApi
+from pyfitbark.cache import CachePolicy, MemoryCache
+from pyfitbark.store import ActivityStore
+
+SLUG = "09659a8a-24c9-4246-92a8-7ecd0650368c"
+
+
+def day(offset):
+    """Return the date offset days from today as a string."""
+    return (datetime.date.today() + datetime.timedelta(days=offset)).isoformat()
+
+
+def record(date, value=1):
+    """Return an activity_series record."""
+    return {"date": date, "activity_value": value, "min_play": 1, "min_rest": 2}
+
+
+class MockApi:
+    """Stand-in for FitbarkApi.get_activity_series()."""
+
+    def __init__(self):
+        self.calls = []
+
+    def get_activity_series(self, slug, date_from, date_to, resolution):
+        self.calls.append((date_from, date_to, resolution))
+        start = datetime.datetime.strptime(date_from, "%Y-%m-%d").date()
+        end = datetime.datetime.strptime(date_to, "%Y-%m-%d").date()
+        records = []
+        while start <= end:
+            records.append(record(start.isoformat(), len(self.calls)))
+            start += datetime.timedelta(days=1)
+        return {"activity_series": {"slug": slug, "records": records}}
+
+
+class TestActivityStore:
+    """Unit tests for pyfitbark.store.ActivityStore."""
+
+    @pytest.fixture
+    def store(self, tmp_path):
+        return ActivityStore(str(tmp_path / "activity.sqlite"))
+
+    def test_wal(self, store):
+        mode = store._conn.execute("PRAGMA journal_mode").fetchone()[0]
+        assert mode == "wal"
+
+    def test_add_records(self, store):
+        assert store.last_date(SLUG) is None
+        written = store.add_records(
+            SLUG, [record("2019-12-26"), record("2019-12-25"), record("2019-12-27")]
+        )
+        assert written == 3
+        store.add_records(SLUG, [record("2019-12-26", 5)])
+        store.add_records(SLUG, [record("2019-12-28 01:00:00")], "HOURLY")
+
+        records = store.records(SLUG)
+        assert [r["date"] for r in records] == [
+            "2019-12-25",
+            "2019-12-26",
+            "2019-12-27",
+        ]
+        assert records[1]["activity_value"] == 5
+        assert store.records(SLUG, "2019-12-26", "2019-12-26") == [
+            record("2019-12-26", 5)
+        ]
+        assert store.records("other") == []
+        assert store.last_date(SLUG) == "2019-12-27"
+        assert store.last_date(SLUG, "HOURLY") == "2019-12-28"
+        assert list(store.series(SLUG).activity_value) == [1, 5, 1]
+        assert len(store.records(SLUG, "2019-12-28", "2019-12-28", "HOURLY")) == 1
+
+    def test_sync(self, store):
+        api = MockApi()
+
+        assert store.sync(api, SLUG) == 42
+        assert api.calls[-1] == (day(-41), day(0), "DAILY")
+
+        assert store.sync(api, SLUG) == 1
+        assert api.calls[-1] == (day(0), day(0), "DAILY")
+        assert store.records(SLUG, day(0), day(0))[0]["activity_value"] == 2
+
+        store.add_records("other", [record(day(-3))])
+        assert store.sync(api, "other") == 4
+        assert api.calls[-1] == (day(-3), day(0), "DAILY")
+
+        store.sync(api, "new", "HOURLY", since=day(-1))
+        assert api.calls[-1] == (day(-1), day(0), "HOURLY")
+
+    def test_sync_write_through(self, store, monkeypatch):
+        api = MockApi()
+        api.store = store
+        writes = []
+        monkeypatch.setattr(store, "add_records", lambda *args: writes.append(args))
+
+        assert store.sync(api, SLUG, since=day(-2)) == 3
+        assert writes == []
+
+    def test_covered(self, store, monkeypatch):
+        store.add_records(SLUG, [record(day(-5)), record(day(-4)), record(day(-3))])
+        assert len(store.covered(SLUG, day(-5), day(-3))) == 3
+        assert store.covered(SLUG, day(-6), day(-3)) is None
+
+        store.add_records(SLUG, [record(day(-2)), record(day(-1)), record(day(0))])
+        assert len(store.covered(SLUG, day(-5), day(0))) == 6
+
+        now = time.time()
+        monkeypatch.setattr(time, "time", lambda: now + 600)
+        assert store.covered(SLUG, day(-5), day(0)) is None
+        assert store.covered(SLUG, day(-5), day(-2)) is not None
+        assert store.covered(SLUG, day(-5), day(-1), max_age=900) is not None
+
+    def test_covered_partial_day(self, store, monkeypatch):
+        # Written at noon of the day itself, while it was still in progress.
+        date = day(-3)
+        noon = datetime.datetime.strptime(date, "%Y-%m-%d").replace(hour=12)
+        monkeypatch.setattr(time, "time", lambda: time.mktime(noon.timetuple()))
+        store.add_records(SLUG, [record(date)])
+        monkeypatch.undo()
+        assert store.covered(SLUG, date, date) is None
+
+        # Written again once settled, the day is final.
+        store.add_records(SLUG, [record(date)])
+        assert store.covered(SLUG, date, date) is not None
+
+    def test_persists(self, tmp_path):
+        path = str(tmp_path / "activity.sqlite")
+        store = ActivityStore(path)
+        store.add_records(SLUG, [record("2019-12-25")])
+        store.close()
+
+        assert ActivityStore(path).last_date(SLUG) == "2019-12-25"
+
+
+class TestFitbarkApiStore:
+    """Tests for FitbarkApi answering from an ActivityStore."""
+
+    @pytest.fixture
+    def api(self):
+        """Return MOCK Fitbark API with a store."""
+        return FitbarkApi("foo", "faa", store=ActivityStore())
+
+    @httpretty.activate
+    def test_local_totals(self, api):
+        records = [dict(record(day(i), 10 * -i), min_active=3) for i in range(-7, 1)]
+        body = {"activity_series": {"slug": SLUG, "records": records}}
+        httpretty.register_uri(
+            httpretty.POST, f"{BASE_URL}/activity_series", body=json.dumps(body)
+        )
+        httpretty.register_uri(
+            httpretty.POST, f"{BASE_URL}/activity_totals", body='{"activity_value": 1}'
+        )
+
+        api.get_activity_series(SLUG, day(-7), day(0))
+        assert api.store.last_date(SLUG) == day(0)
+        httpretty.reset()
+
+        assert api.get_activity_totals(SLUG, day(-7), day(0)) == {"activity_value": 280}
+        assert api.get_time_breakdown(SLUG, day(-1), day(0)) == {
+            "activity_level": {"min_play": 2, "min_active": 6, "min_rest": 4}
+        }
+        assert not httpretty.latest_requests()
+
+        httpretty.register_uri(
+            httpretty.POST, f"{BASE_URL}/activity_totals", body='{"activity_value": 1}'
+        )
+        assert api.get_activity_totals(SLUG, day(-8), day(0)) == {"activity_value": 1}
+
+    @httpretty.activate
+    def test_cached_not_written(self, monkeypatch):
+        date = day(-3)
+        body = {"activity_series": {"slug": SLUG, "records": [record(date)]}}
+        httpretty.register_uri(
+            httpretty.POST, f"{BASE_URL}/activity_series", body=json.dumps(body)
+        )
+        api = FitbarkApi(
+            "foo",
+            "faa",
+            cache=MemoryCache(),
+            cache_policy=CachePolicy(activity_ttl=10**9),
+            store=ActivityStore(),
+        )
+
+        # Fetched and cached at noon of the day itself, while it was in progress.
+        noon = datetime.datetime.strptime(date, "%Y-%m-%d").replace(hour=12)
+        monkeypatch.setattr(time, "time", lambda: time.mktime(noon.timetuple()))
+        api.get_activity_series(SLUG, date, date)
+        monkeypatch.undo()
+        requests = len(httpretty.latest_requests())
+
+        # Served from the cache once settled, it must not be stored as final.
+        api.get_activity_series(SLUG, date, date)
+        assert len(httpretty.latest_requests()) == requests
+        assert api.store.records(SLUG, date, date) == [record(date)]
+        assert api.store.covered(SLUG, date, date) is None
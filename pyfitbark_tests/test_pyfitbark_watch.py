@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""PyFitBark Watch Tests."""
+import collections
+import itertools
+
+import pytest
+
+from pyfitbark.api import FitbarkApi
+from pyfitbark.watch import TokenBucket, Watcher
+
+ACTIVE = "21d131d5-9616-4e95-bbb2-02c631ef4268"
+IDLE = "036aa64a-96cc-4fec-bee9-2e3c843208a0"
+OFFLINE = "09659a8a-24c9-4246-92a8-7ecd0650368c"
+
+
+class Clock:
+    """A clock advanced by sleeping."""
+
+    def __init__(self):
+        """Init."""
+        self.now = 1000.0
+
+    def __call__(self):
+        """Return the current time."""
+        return self.now
+
+    def sleep(self, seconds):
+        """Advance the clock."""
+        assert seconds > 0
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    """Return a fake clock."""
+    return Clock()
+
+
+@pytest.fixture
+def api(monkeypatch, clock):
+    """Return a client whose ACTIVE dog changes every minute."""
+    client = FitbarkApi("foo", "faa")
+    calls = collections.Counter()
+
+    def get_activity_series(slug, date_from=None, date_to=None, resolution="DAILY"):
+        calls[slug] += 1
+        if slug == OFFLINE:
+            raise ConnectionError("offline")
+        value = int(clock.now // 60) if slug == ACTIVE else 0
+        records = [{"date": "2019-12-31 10:00:00", "activity_value": value}]
+        return {"activity_series": {"slug": slug, "records": records}}
+
+    monkeypatch.setattr(client, "get_activity_series", get_activity_series)
+    monkeypatch.setattr(client, "get_time_breakdown", lambda slug: {})
+    client.calls = calls
+    return client
+
+
+def watcher(api, clock, slugs, **kwargs):
+    """Return a watcher using the fake clock."""
+    kwargs.setdefault("rand", lambda: 0.5)
+    return Watcher(api, slugs, clock=clock, sleep=clock.sleep, **kwargs)
+
+
+class TestTokenBucket:
+    """Unit tests for pyfitbark.watch.TokenBucket."""
+
+    def test_take(self, clock):
+        bucket = TokenBucket(1, 2, clock)
+        assert bucket.take() == 0
+        assert bucket.take() == 0
+        assert bucket.take() == 1
+        assert bucket.take() == 2
+
+        clock.now += 10
+        assert bucket.take(2) == 0
+
+        with pytest.raises(ValueError):
+            TokenBucket(0, 1)
+
+
+class TestWatcher:
+    """Unit tests for pyfitbark.watch.Watcher."""
+
+    def test_adaptive(self, api, clock):
+        watch = watcher(api, clock, [ACTIVE, IDLE, OFFLINE, IDLE], jitter=0)
+        start = clock.now
+        polls = []
+        while clock.now < start + 6 * 3600:
+            polls.append(watch.step())
+
+        assert watch.intervals == {ACTIVE: 60, IDLE: 3600, OFFLINE: 3600}
+        assert api.calls[ACTIVE] > 300
+        assert api.calls[IDLE] < 12
+        assert api.calls[OFFLINE] < 12
+
+        idle = [poll for poll in polls if poll.slug == IDLE]
+        assert [poll.changed for poll in idle[:3]] == [True, False, False]
+        assert [poll.interval for poll in idle[:3]] == [300, 600, 1200]
+        assert all(
+            poll.error is not None and poll.data is None
+            for poll in polls
+            if poll.slug == OFFLINE
+        )
+
+    def test_jitter(self, api, clock):
+        # Three first polls, then the next poll of ACTIVE.
+        values = itertools.chain([0.0, 0.5, 0.999, 0.0], itertools.repeat(0.5))
+        watch = watcher(api, clock, [ACTIVE, IDLE, OFFLINE], rand=lambda: next(values))
+        start = clock.now
+        assert [watch.step().slug for _ in range(3)] == [ACTIVE, IDLE, OFFLINE]
+        assert clock.now == pytest.approx(start + 0.999 * 30)
+        # The next poll of ACTIVE moved 10% earlier.
+        assert watch.step().slug == ACTIVE
+        assert clock.now == pytest.approx(start + 270)
+
+    def test_budget(self, api, clock):
+        watch = watcher(
+            api,
+            clock,
+            [ACTIVE, IDLE],
+            interval=60,
+            min_interval=1,
+            budget=360,
+            burst=4,
+        )
+        start = clock.now
+        for _ in range(12):
+            watch.step()
+        # 4 requests at once, then one every 10 seconds.
+        elapsed = clock.now - start
+        assert elapsed >= (12 * 2 - 4) * 10
+
+        with pytest.raises(ValueError):
+            watcher(api, clock, [ACTIVE], interval=10, min_interval=60)
+        with pytest.raises(ValueError):
+            watcher(api, clock, []).step()
@@ -21,7 +21,11 @@ REQUIRES_PYTHON = ">=3.4"
 # What packages are required for this module to be executed?
 REQUIRED = ["requests-oauthlib", 'typing;python_version<"3.5"']
 
-EXTRAS = {}
+EXTRAS = {
+    "async": ["aiohttp>=3.6.2"],
+    "numpy": ["numpy>=1.16"],
+    "orjson": ["orjson>=2.0"],
+}
 
 here = os.path.abspath(os.path.dirname(__file__))
 